@@ -0,0 +1,213 @@
+# =================================================================================
+# South-Plus 异步抓取引擎 (asyncio + httpx)
+# 与 pure_scraper_v12_actions.py 中的线程池引擎可互换：产出相同的 data.json 结构，
+# 并向 progress.db 写入相同的记录。通过 SCRAPER_ENGINE=async 或 --engine async 启用。
+# =================================================================================
+import asyncio
+import concurrent.futures
+import importlib.util
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install {e.name}")
+    exit()
+
+from metrics import stage_timer, observe_http, increment
+from page_parser import make_soup, release_tree
+from notifier import send_pushplus_notification
+from scrape_common import (
+    DETAIL_RETRY_DELAY, sanitize_filename, collect_image_jobs,
+    find_buy_url, parse_article_details, article_source_url, build_article_record, save_article_record, check_duplicate_post,
+)
+
+# 安装了 h2 时启用 HTTP/2（对 https 站点可在单连接上多路复用）
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+def _write_bytes(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+class AsyncScrapeEngine:
+    """在后台线程里运行一个事件循环，所有详情页与图片请求都作为协程并发执行。
+
+    submit() 返回 concurrent.futures.Future，因此 main() 可以像使用线程池一样
+    用 as_completed 收集结果。全局并发由 concurrency 限制，单个域名的并发由
+    per_host_limit 限制，请求节奏仍由与索引扫描共享的令牌桶控制。
+    """
+
+    def __init__(self, limiter, headers, cookies, concurrency=20, per_host_limit=8, image_store=None, http_cache=None):
+        self.limiter = limiter
+        self.image_store = image_store
+        self.http_cache = http_cache
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self._headers = dict(headers)
+        self._cookies = {cookie.name: cookie.value for cookie in cookies} if hasattr(cookies, 'set_cookie') else dict(cookies or {})
+        self._futures = []
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-scraper", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            headers=self._headers,
+            cookies=self._cookies,
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self._global_limit = asyncio.Semaphore(self.concurrency)
+        self._host_limits = {}
+        self._image_tasks = {}
+
+    async def _get(self, url, headers=None):
+        host = urlparse(url).netloc
+        host_limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        async with self._global_limit, host_limit:
+            if self.limiter is not None:
+                await self.limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                response = await self._client.get(url, headers=headers)
+            except Exception:
+                observe_http('error', time.perf_counter() - started)
+                raise
+        observe_http(response.status_code, time.perf_counter() - started, len(response.content))
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    async def _get_text(self, url):
+        """获取页面文本；配置了 HTTP 缓存时发送条件请求，304 直接使用缓存正文。"""
+        if self.http_cache is None:
+            response = await self._get(url)
+            response.encoding = 'utf-8'
+            return response.text
+        entry, conditional = await asyncio.to_thread(self.http_cache.lookup, url)
+        response = await self._get(url, headers=conditional)
+        if response.status_code == 304 and entry:
+            body = await asyncio.to_thread(self.http_cache.load_body, url, entry)
+        else:
+            response.raise_for_status()
+            body = response.content
+            await asyncio.to_thread(self.http_cache.store, url, response.headers, body, 'utf-8')
+        return body.decode('utf-8', errors='replace')
+
+    async def _get_soup(self, url):
+        text = await self._get_text(url)
+        # 解析是 CPU 密集操作，放到线程里执行以免阻塞事件循环上的其它请求
+        return await asyncio.to_thread(make_soup, text)
+
+    async def get_full_article_details(self, url):
+        for attempt in range(3):
+            try:
+                with stage_timer('detail_fetch'):
+                    soup = await self._get_soup(url)
+                if buy_url_full := find_buy_url(soup):
+                    with stage_timer('purchase'):
+                        send_pushplus_notification("Debug: 购买文章", f"正在尝试购买文章：{url}")
+                        await self._get(buy_url_full)
+                        await asyncio.sleep(2) # 购买后等待一下
+                        soup = await self._get_soup(url)
+                return parse_article_details(soup, url)
+            except Exception as e:
+                if attempt < 2:
+                    increment('retries', stage='detail_fetch')
+                    print(f"  [警告] 访问详情页失败 ({e.__class__.__name__})，将在{DETAIL_RETRY_DELAY}秒后重试...")
+                    await asyncio.sleep(DETAIL_RETRY_DELAY)
+                else:
+                    return {'error': f"访问详情页失败: {e.__class__.__name__}"}
+        return {'error': "访问详情页在多次重试后仍然失败"}
+
+    async def _fetch_into_store(self, full_url, ext):
+        if record := await asyncio.to_thread(self.image_store.lookup, full_url):
+            return record
+        with stage_timer('image_fetch'):
+            response = await self._get(full_url)
+            return await asyncio.to_thread(self.image_store.put_bytes, full_url, response.content, ext)
+
+    async def _download_image(self, img, full_url, local_filepath, safe_filename):
+        if self.image_store is None:
+            response = await self._get(full_url)
+            await asyncio.to_thread(_write_bytes, local_filepath, response.content)
+        else:
+            # 同一 URL 在本次运行中只下载一次，其它文章等待同一个任务；失败的任务不缓存
+            shared = (task := self._image_tasks.get(full_url)) is not None and not (task.done() and task.exception())
+            if not shared:
+                task = self._image_tasks[full_url] = asyncio.ensure_future(self._fetch_into_store(full_url, os.path.splitext(safe_filename)[1]))
+            sha256, ext = await asyncio.shield(task)
+            if shared:
+                self.image_store.record_shared(sha256, ext)
+            await asyncio.to_thread(self.image_store.link_into, sha256, ext, local_filepath)
+        img['src'] = f"images/{safe_filename}"
+
+    async def download_images_and_update_html(self, content_node, asset_folder, article_title):
+        image_jobs = collect_image_jobs(content_node)
+        if not image_jobs: return str(content_node), []
+        print(f"      - {article_title[:15]}...: 本地化 {len(image_jobs)} 张图片...")
+        os.makedirs(asset_folder, exist_ok=True)
+        outcomes = await asyncio.gather(
+            *(self._download_image(img, full_url, os.path.join(asset_folder, safe_filename), safe_filename)
+              for img, full_url, safe_filename in image_jobs),
+            return_exceptions=True,
+        )
+        failed_images = [{'url': full_url, 'src': img.get('src'), 'filename': safe_filename,
+                          'reason': f"下载失败: {outcome.__class__.__name__}"}
+                         for (img, full_url, safe_filename), outcome in zip(image_jobs, outcomes) if isinstance(outcome, BaseException)]
+        return str(content_node), failed_images
+
+    async def process_single_article(self, article_info, output_today_folder):
+        original_title = article_info.title
+        safe_foldername = sanitize_filename(original_title)
+        print(f"-> 开始处理: {original_title[:50]}...")
+
+        full_url = article_source_url(article_info)
+        details = await self.get_full_article_details(full_url)
+
+        if details and 'error' not in details:
+            # 指纹计算与查询都很快，直接在事件循环中完成；skip 时不再下载图片
+            if skipped := check_duplicate_post(article_info, details, f"{os.path.basename(output_today_folder)}/{safe_foldername}"):
+                return skipped
+            article_output_path = os.path.join(output_today_folder, safe_foldername)
+            os.makedirs(article_output_path, exist_ok=True)
+            content_html, failed_images = await self.download_images_and_update_html(details['content_node'], os.path.join(article_output_path, 'images'), original_title)
+            release_tree(details['content_node'])
+
+            data_to_save = build_article_record(article_info, full_url, details, content_html)
+            if save_error := await asyncio.to_thread(save_article_record, article_output_path, data_to_save, safe_foldername, details['fingerprint']):
+                return {'status': 'error', 'title': original_title, 'reason': save_error}
+
+            return {'status': 'partial_success' if failed_images else 'success', 'title': original_title,
+                    'article_path': article_output_path, 'failed_images': failed_images}
+
+        return {'status': 'error', 'title': original_title, 'reason': details.get('error', '未知详情页错误')}
+
+    def submit(self, article_info, output_today_folder):
+        """投递一篇文章，返回可用于 as_completed 的 concurrent.futures.Future。"""
+        future = asyncio.run_coroutine_threadsafe(self.process_single_article(article_info, output_today_folder), self._loop)
+        self._futures.append(future)
+        return future
+
+    def shutdown(self, wait=True):
+        if wait:
+            concurrent.futures.wait(self._futures)
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+        return False
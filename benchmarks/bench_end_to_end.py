@@ -0,0 +1,157 @@
+# benchmarks/bench_end_to_end.py
+# 端到端基准：在本地模拟论坛（mock_forum.py）与 Gemini 桩服务（mock_gemini.py）上完整运行
+# pure_scraper_v12_actions.main() 与 optimize_front_matter.main()，报告文章/秒、请求/秒、峰值 RSS 与 API 调用次数。
+#
+# 两个脚本都在临时工作目录中的独立子进程里运行：它们在导入时读取环境变量配置，峰值 RSS 也因此互不干扰。
+# 优化阶段的输入默认是仓库中录制的 South-Plus-Articles，可用 --article-copies 复制出更多（正文各不相同的）文章。
+#
+# 用法: python benchmarks/bench_end_to_end.py [--pages 5] [--latency 0.02] [--forbidden-rate 0.02] [--buy-every 7]
+#       [--fixtures-dir 录制的论坛页面] [--gemini-latency 0.2] [--batch-mode] [--output 结果.json]
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from mock_forum import MockForumServer
+from mock_gemini import MockGeminiServer
+
+
+def run_child(name):
+    """子进程入口：在当前目录运行对应脚本的 main()，返回耗时与峰值 RSS。"""
+    sys.argv = [name]
+    if name == 'scraper':
+        import pure_scraper_v12_actions as script
+    else:
+        import optimize_front_matter as script
+    start = time.perf_counter()
+    try:
+        script.main()
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code or 0
+    elapsed = time.perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    rss_mb = max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024
+    return {'elapsed': elapsed, 'peak_rss_mb': rss_mb, 'exit_code': exit_code}
+
+
+def spawn(name, workdir, env, verbose):
+    result_path = os.path.join(workdir, f"{name}-result.json")
+    output = None if verbose else subprocess.DEVNULL
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name, '--result', result_path],
+                   cwd=workdir, env=env, stdout=output, stderr=output, check=False)
+    with open(result_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def base_env(workdir):
+    env = {k: v for k, v in os.environ.items() if k not in ('PUSHPLUS_TOKEN', 'SHARD')}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    env['METRICS_FOLDER'] = os.path.join(workdir, 'metrics')
+    return env
+
+
+def prepare_articles(articles_dir, target_dir, copies):
+    """把录制的 Markdown 文章复制到工作目录，每份副本追加一行标记，保证正文不同、不会命中元数据缓存。"""
+    sources = sorted(glob.glob(os.path.join(articles_dir, '*', '*.md')))
+    for copy in range(copies):
+        for path in sources:
+            date_dir = os.path.basename(os.path.dirname(path))
+            dest_dir = os.path.join(target_dir, date_dir if copy == 0 else f"{date_dir}-copy{copy}")
+            os.makedirs(dest_dir, exist_ok=True)
+            dest = os.path.join(dest_dir, os.path.basename(path))
+            shutil.copyfile(path, dest)
+            if copy:
+                with open(dest, 'a', encoding='utf-8') as f:
+                    f.write(f"\n\n<!-- benchmark copy {copy} -->\n")
+    return len(sources) * copies
+
+
+def bench_scraper(args, workdir):
+    with MockForumServer(args.pages, args.threads_per_page, args.images, args.latency, buy_every=args.buy_every,
+                         forbidden_rate=args.forbidden_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                         fixtures_dir=args.fixtures_dir) as server:
+        env = base_env(workdir)
+        env.update(SPLUS_BASE_URL=server.base_url, SPLUS_COOKIE='bench=1', REQUESTS_PER_SECOND='100000',
+                   REQUEST_BURST='1000', REQUEST_JITTER='0', DETAIL_RETRY_DELAY='0', SCRAPER_ENGINE=args.engine)
+        result = spawn('scraper', workdir, env, args.verbose)
+        result.update(articles=len(glob.glob(os.path.join(workdir, 'South-Plus-Raw-Data', '*', '*', 'data.json'))),
+                      requests=server.request_count, forbidden=server.forbidden_count, purchases=server.purchase_count)
+    return result
+
+
+def bench_optimizer(args, workdir):
+    article_count = prepare_articles(args.articles_dir, os.path.join(workdir, 'South-Plus-Articles'), args.article_copies)
+    with MockGeminiServer(args.gemini_latency, args.quota_error_rate) as gemini:
+        env = base_env(workdir)
+        env.update(GEMINI_API_KEY='bench', GEMINI_API_ENDPOINT=gemini.base_url, OPTIMIZE_BATCH_SIZE=str(article_count),
+                   GEMINI_RPM='100000', GEMINI_TPM='1000000000', GEMINI_BACKOFF_BASE='0.05',
+                   GEMINI_BATCH_MODE='1' if args.batch_mode else '0')
+        result = spawn('optimizer', workdir, env, args.verbose)
+        result.update(articles=len(glob.glob(os.path.join(workdir, 'ai-optimized-articles', '*', '*.md'))),
+                      requests=gemini.request_count, api_calls=gemini.request_count, quota_errors=gemini.quota_error_count,
+                      prompt_chars=gemini.prompt_chars)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟服务上端到端运行抓取与优化脚本")
+    parser.add_argument('--child', choices=('scraper', 'optimizer'), help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--threads-per-page', type=int, default=20)
+    parser.add_argument('--images', type=int, default=3, help="每篇文章的图片数")
+    parser.add_argument('--latency', type=float, default=0.02, help="模拟论坛每个请求的延迟（秒）")
+    parser.add_argument('--forbidden-rate', type=float, default=0.0, help="随机返回 403 的请求比例")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="随机慢响应的请求比例")
+    parser.add_argument('--slow-latency', type=float, default=1.0, help="慢响应额外延迟（秒）")
+    parser.add_argument('--buy-every', type=int, default=0, help="帖子ID能被 N 整除的帖子需要购买")
+    parser.add_argument('--fixtures-dir', help="录制的论坛页面目录（thread-<页码>.html / read-<帖子ID>.html）")
+    parser.add_argument('--engine', choices=('threads', 'async'), default='threads')
+    parser.add_argument('--articles-dir', default=os.path.join(REPO_DIR, 'South-Plus-Articles'), help="优化阶段使用的 Markdown 文章")
+    parser.add_argument('--article-copies', type=int, default=1)
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help="Gemini 桩服务每个请求的延迟（秒）")
+    parser.add_argument('--quota-error-rate', type=float, default=0.0, help="Gemini 桩服务返回 429 的比例")
+    parser.add_argument('--batch-mode', action='store_true', help="优化阶段使用多篇一请求的批量模式")
+    parser.add_argument('--only', choices=('scraper', 'optimizer'), help="只运行其中一个脚本")
+    parser.add_argument('--output', help="把结果另存为 JSON，便于比较不同版本")
+    parser.add_argument('--verbose', action='store_true', help="显示脚本自身的输出")
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(run_child(args.child), f)
+        return
+
+    results = {}
+    for name, bench in (('scraper', bench_scraper), ('optimizer', bench_optimizer)):
+        if args.only and args.only != name: continue
+        with tempfile.TemporaryDirectory() as workdir:
+            results[name] = bench(args, workdir)
+
+    print(f"{'脚本':<10}{'文章数':>8}{'耗时(s)':>10}{'文章/秒':>10}{'请求/秒':>10}{'峰值RSS(MB)':>13}{'API调用':>9}{'退出码':>7}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['articles']:>8}{r['elapsed']:>10.2f}{r['articles'] / r['elapsed']:>10.1f}"
+              f"{r['requests'] / r['elapsed']:>10.1f}{r['peak_rss_mb']:>13.1f}{r.get('api_calls', 0):>9}{r['exit_code']:>7}")
+    if scraper := results.get('scraper'):
+        print(f"模拟论坛: 注入 403 {scraper['forbidden']} 次, 购买 {scraper['purchases']} 次")
+    if optimizer := results.get('optimizer'):
+        print(f"Gemini 桩服务: 注入 429 {optimizer['quota_errors']} 次, 提示词共 {optimizer['prompt_chars']} 字符")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
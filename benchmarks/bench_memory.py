@@ -0,0 +1,79 @@
+# benchmarks/bench_memory.py
+# 用 tracemalloc 测量扫描大量索引页时的内存峰值：
+#   旧方式：完整解析每一页，并在待抓取列表中保留索引页里的 <tr> 节点（整棵解析树随之常驻内存）
+#   新方式：只解析帖子表格行，产出 ArticleItem 后立即释放解析树
+#
+# 用法: python benchmarks/bench_memory.py [--pages 300] [--threads-per-page 40]
+import argparse
+import gc
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_forum import render_index_page
+
+
+def legacy_parse_index_page(soup):
+    """旧版 parse_index_page：工作项中引用了索引页的 row 节点。"""
+    new_articles = []
+    separator_td = soup.find('td', string=re.compile(r'普通主题'))
+    normal_thread_rows = separator_td.find_parent('tr').find_next_siblings('tr') if separator_td else soup.select('tr.tr3.t_one')
+    for row in normal_thread_rows:
+        if (link_tag := row.select_one('a[id^="a_ajax_"]')):
+            date_tag = row.select_one('td.author em span') or row.select_one('td.author em')
+            new_articles.append({'title': link_tag.get_text(strip=True), 'row': row,
+                                 'date_str': date_tag.get_text(strip=True) if date_tag else None})
+    return new_articles
+
+
+def measure(scan_page, pages):
+    """逐页扫描并累积全部工作项（与 main() 中等待详情页完成前的状态一致），返回 (峰值MB, 工作项数, 耗时)。"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    work_items = []
+    for html in pages:
+        work_items.extend(scan_page(html))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(work_items)
+    del work_items
+    gc.collect()
+    return peak / 1024 / 1024, count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比旧/新工作项在扫描大量索引页时的内存峰值")
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--threads-per-page', type=int, default=40)
+    args = parser.parse_args()
+
+    import pure_scraper_v12_actions as scraper
+    from page_parser import PARSER_BACKEND, make_soup, make_index_soup
+
+    pages = [render_index_page(n, args.pages, args.threads_per_page) for n in range(1, args.pages + 1)]
+
+    def legacy_scan(html):
+        return legacy_parse_index_page(make_soup(html, backend='html.parser'))
+
+    def compact_scan(html):
+        soup = make_index_soup(html)
+        try:
+            return scraper.parse_index_page(soup)
+        finally:
+            soup.decompose()
+
+    print(f"合成论坛: {args.pages} 页 x {args.threads_per_page} 帖, 当前解析后端: {PARSER_BACKEND}")
+    print(f"{'方式':<28}{'峰值内存(MB)':>14}{'工作项':>8}{'耗时(s)':>9}")
+    for name, scan_page in (("旧: html.parser + 保留 row 节点", legacy_scan), ("新: ArticleItem + 释放解析树", compact_scan)):
+        peak, count, elapsed = measure(scan_page, pages)
+        print(f"{name:<28}{peak:>14.1f}{count:>8}{elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
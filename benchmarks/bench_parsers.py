@@ -0,0 +1,87 @@
+# benchmarks/bench_parsers.py
+# 对比各 HTML 解析后端处理索引页与详情页的速度（页/秒）。
+#
+# 索引页：完整建树 vs 只构建帖子表格行（SoupStrainer）。
+# 详情页：旧流程（解析整页 -> 正文转字符串 -> 再解析一次改写图片）vs 单次解析直接在节点上改写图片。
+#
+# 用法: python benchmarks/bench_parsers.py [--pages-dir 保存的论坛页面目录] [--seconds 2]
+#   --pages-dir 下的 *.html 中含有 read_tpc 的视为详情页，其余视为索引页；不指定时使用 mock_forum 生成的页面。
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_forum import render_index_page, render_detail_page
+
+
+def load_pages(pages_dir):
+    if not pages_dir:
+        index_pages = [render_index_page(n, 20, 40) for n in range(1, 6)]
+        detail_pages = [render_detail_page(1_000_000 - n, 8, paragraphs=120) for n in range(10)]
+        return index_pages, detail_pages
+    index_pages, detail_pages = [], []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        (detail_pages if 'read_tpc' in html else index_pages).append(html)
+    return index_pages, detail_pages
+
+
+def pages_per_second(func, pages, seconds):
+    """循环处理 pages 直到至少经过 seconds 秒，返回平均每秒处理的页数。"""
+    count, start = 0, time.perf_counter()
+    while True:
+        for html in pages:
+            func(html)
+        count += len(pages)
+        if (elapsed := time.perf_counter() - start) >= seconds:
+            return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 HTML 解析后端的索引页/详情页处理速度")
+    parser.add_argument('--pages-dir', help="保存的论坛页面目录（*.html）")
+    parser.add_argument('--seconds', type=float, default=2.0, help="每项测试的最短运行时间")
+    args = parser.parse_args()
+
+    import pure_scraper_v12_actions as scraper
+    from page_parser import available_backends, make_soup, make_index_soup
+
+    index_pages, detail_pages = load_pages(args.pages_dir)
+
+    def rewrite_images(content_node):
+        for img, _, safe_filename in scraper.collect_image_jobs(content_node):
+            img['src'] = f"images/{safe_filename}"
+        return str(content_node)
+
+    def cases(backend):
+        def index_full(html):
+            return scraper.parse_index_page(make_soup(html, backend=backend))
+
+        def index_strained(html):
+            return scraper.parse_index_page(make_index_soup(html, backend=backend))
+
+        def detail_double_parse(html):
+            details = scraper.parse_article_details(make_soup(html, backend=backend), scraper.BASE_URL)
+            return rewrite_images(make_soup(str(details['content_node']), backend=backend))
+
+        def detail_single_parse(html):
+            details = scraper.parse_article_details(make_soup(html, backend=backend), scraper.BASE_URL)
+            return rewrite_images(details['content_node'])
+
+        return [('索引页/完整建树', index_full, index_pages), ('索引页/只建表格行', index_strained, index_pages),
+                ('详情页/两次解析', detail_double_parse, detail_pages), ('详情页/单次解析', detail_single_parse, detail_pages)]
+
+    print(f"索引页 {len(index_pages)} 个, 详情页 {len(detail_pages)} 个, 可用后端: {', '.join(available_backends())}")
+    print(f"{'后端':<14}{'场景':<18}{'页/秒':>10}")
+    for backend in available_backends():
+        for name, func, pages in cases(backend):
+            if pages:
+                print(f"{backend:<14}{name:<18}{pages_per_second(func, pages, args.seconds):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_scrape_engines.py
+# 在本地模拟论坛上对比线程池引擎与异步引擎的详情页+图片抓取吞吐量。
+#
+# 用法: python benchmarks/bench_scrape_engines.py [--pages 5] [--latency 0.05] [--concurrency 5 20 100]
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_forum import MockForumServer
+
+
+def run_engine(scraper, engine, article_infos, concurrency):
+    from database import initialize_database
+    from rate_limiter import RateLimiter, RateLimitedSession
+    from image_store import ImageStore
+
+    limiter = RateLimiter(1e9, capacity=1e9)
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            initialize_database()
+            image_store = ImageStore(os.path.join(workdir, 'image-store'), max_workers=concurrency)
+            if engine == 'async':
+                from async_scraper import AsyncScrapeEngine
+                executor = AsyncScrapeEngine(limiter, scraper.HEADERS, {}, concurrency, concurrency, image_store)
+                submit = lambda info: executor.submit(info, workdir)
+            else:
+                import concurrent.futures
+                session = RateLimitedSession(limiter)
+                session.headers.update(scraper.HEADERS)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+                session.mount('http://', adapter)
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+                submit = lambda info: executor.submit(scraper.process_single_article, info, session, workdir, image_store)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), executor:
+                results = [future.result() for future in [submit(info) for info in article_infos]]
+            image_store.shutdown()
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    failures = sum(1 for r in results if r['status'] == 'error')
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比线程池引擎与异步引擎的抓取吞吐量")
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--threads-per-page', type=int, default=20)
+    parser.add_argument('--images', type=int, default=3, help="每篇文章的图片数")
+    parser.add_argument('--latency', type=float, default=0.05, help="模拟服务器每个请求的延迟（秒）")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[5, 20, 100])
+    args = parser.parse_args()
+
+    with MockForumServer(args.pages, args.threads_per_page, args.images, args.latency) as server:
+        os.environ['SPLUS_BASE_URL'] = server.base_url
+        import pure_scraper_v12_actions as scraper
+        from page_parser import make_index_soup
+
+        article_infos = []
+        for page_num in range(1, args.pages + 1):
+            html = requests.get(f"{server.base_url}thread.php?fid-{scraper.FID}-page-{page_num}.html").text
+            article_infos.extend(scraper.parse_index_page(make_index_soup(html)))
+
+        print(f"模拟论坛: {len(article_infos)} 篇文章, 每篇 {args.images} 张图片, 单请求延迟 {args.latency * 1000:.0f}ms")
+        print(f"{'引擎':<8}{'并发':>6}{'耗时(s)':>10}{'文章/秒':>10}{'请求/秒':>10}{'失败':>6}")
+        for concurrency in args.concurrency:
+            for engine in ('threads', 'async'):
+                requests_before = server.request_count
+                elapsed, failures = run_engine(scraper, engine, article_infos, concurrency)
+                request_total = server.request_count - requests_before
+                print(f"{engine:<8}{concurrency:>6}{elapsed:>10.2f}{len(article_infos) / elapsed:>10.1f}"
+                      f"{request_total / elapsed:>10.1f}{failures:>6}")
+
+
+if __name__ == "__main__":
+    main()
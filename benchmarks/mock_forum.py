@@ -0,0 +1,175 @@
+# benchmarks/mock_forum.py
+# 本地模拟 South-Plus 论坛：生成 thread.php 索引页、read.php 详情页与图片，
+# 供基准测试在不访问真实论坛的情况下驱动抓取流程。
+# 可选：需要购买的帖子（job.php?action=buytopic 流程）、按比例注入的 403 与慢响应，
+# 以及从目录回放录制下来的真实页面（thread-<页码>.html / read-<帖子ID>.html）、总是返回 500 的索引页、
+# 返回 200 但没有帖子列表的索引页（模拟登录页或验证页）。
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def render_index_page(page_num, total_pages, threads_per_page):
+    rows = []
+    for i in range(threads_per_page):
+        tid = 1_000_000 - (page_num - 1) * threads_per_page - i
+        rows.append(
+            f'<tr class="tr3 t_one"><td class="tal"><h3><a href="read.php?tid-{tid}.html" id="a_ajax_{tid}">'
+            f'[测试] 模拟帖子 {tid} 汉化硬盘版</a></h3></td>'
+            f'<td class="author"><a href="#">作者{tid % 17}</a><br><em><span>2024-07-{1 + tid % 28:02d} 10:{tid % 60:02d}</span></em></td>'
+            f'<td>{tid % 100}</td></tr>'
+        )
+    return (
+        '<html><head><meta charset="utf-8"><title>模拟版块</title></head><body>'
+        f'<div class="pages"><ul><li class="pagesone">Pages: {page_num}/{total_pages}</li></ul></div>'
+        '<table id="ajaxtable"><tr class="tr2"><td colspan="3">置顶帖</td></tr>'
+        '<tr class="tr3 t_one"><td><a href="read.php?tid-1.html" id="a_ajax_1">版规</a></td></tr>'
+        '<tr class="tr2"><td colspan="3">普通主题</td></tr>'
+        + ''.join(rows) + '</table></body></html>'
+    )
+
+
+def render_detail_page(tid, images_per_article, paragraphs=30, locked=False):
+    images = ''.join(f'<img src="/images/{(tid + n) % 50}.jpg" border="0"><br>' for n in range(images_per_article))
+    body = ''.join(f'<p>第 {n} 段：这是模拟帖子 {tid} 的正文内容，包含下载说明与汉化信息。</p><br>' for n in range(paragraphs))
+    if locked:
+        images, body = '', ('<p>此帖售价 1 SP币，购买后可查看全部内容。</p>'
+                            f'<input type="button" value="购买" onclick="location.href=\'job.php?action=buytopic&tid={tid}&pid=tpc\'">')
+    return (
+        '<html><head><meta charset="utf-8"></head><body>'
+        f'<table><tr><th class="r_two"><strong>作者{tid % 17}</strong></th></tr></table>'
+        '<div class="tiptop"><span class="fl gray">2024-07-13 00:43</span></div>'
+        f'<div class="f14" id="read_tpc">{images}{body}</div></body></html>'
+    )
+
+
+class MockForumServer:
+    """在后台线程中运行的模拟论坛。latency 为每个请求额外的响应延迟（秒）。
+
+    buy_every=N 时帖子ID能被 N 整除的帖子需要先购买；forbidden_rate / slow_rate 为随机返回 403
+    或额外延迟 slow_latency 秒的请求比例（固定随机种子，结果可复现）；fixtures_dir 中存在对应文件时
+    用录制的页面代替合成页面；failing_pages 中的索引页总是返回 500，empty_pages 中的索引页返回没有帖子的登录页。
+    """
+
+    def __init__(self, total_pages=5, threads_per_page=20, images_per_article=3, latency=0.0, image_size=20_000, etags=True,
+                 buy_every=0, forbidden_rate=0.0, slow_rate=0.0, slow_latency=1.0, fixtures_dir=None, failing_pages=(), empty_pages=(), seed=0):
+        self.total_pages = total_pages
+        self.threads_per_page = threads_per_page
+        self.images_per_article = images_per_article
+        self.latency = latency
+        self.etags = etags
+        self.buy_every = buy_every
+        self.forbidden_rate = forbidden_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fixtures_dir = fixtures_dir
+        self.failing_pages = set(failing_pages)
+        self.empty_pages = set(empty_pages)
+        self.not_modified_count = 0
+        self.forbidden_count = 0
+        self.purchase_count = 0
+        self.image_body = b'\xff\xd8\xff\xe0' + b'\0' * image_size
+        self.request_count = 0
+        self.request_log = []
+        self._purchased = set()
+        self._random = random.Random(seed)
+        self._count_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+
+    def _fixture(self, name):
+        if self.fixtures_dir and os.path.exists(path := os.path.join(self.fixtures_dir, name)):
+            with open(path, 'rb') as f:
+                return f.read()
+        return None
+
+    def index_page(self, page_num):
+        if page_num in self.empty_pages:
+            return '<html><head><meta charset="utf-8"></head><body><form action="login.php">您还没有登录</form></body></html>'.encode('utf-8')
+        return self._fixture(f"thread-{page_num}.html") or render_index_page(
+            page_num, self.total_pages, self.threads_per_page).encode('utf-8')
+
+    def detail_page(self, tid):
+        locked = bool(self.buy_every) and tid % self.buy_every == 0 and tid not in self._purchased
+        return self._fixture(f"read-{tid}.html") or render_detail_page(tid, self.images_per_article, locked=locked).encode('utf-8')
+
+    def _roll(self, path):
+        """记录请求路径（request_log 按到达顺序保存）并为它抽签，返回 (是否返回 403, 是否慢响应)。"""
+        with self._count_lock:
+            self.request_count += 1
+            self.request_log.append(path)
+            forbidden = self._random.random() < self.forbidden_rate
+            slow = self._random.random() < self.slow_rate
+            if forbidden: self.forbidden_count += 1
+        return forbidden, slow
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                etag = f'"{hashlib.md5(body).hexdigest()}"' if server.etags and status == 200 else None
+                if etag and self.headers.get('If-None-Match') == etag:
+                    with server._count_lock:
+                        server.not_modified_count += 1
+                    status, body = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if etag: self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                forbidden, slow = server._roll(self.path)
+                if server.latency or slow:
+                    time.sleep(server.latency + (server.slow_latency if slow else 0))
+                if forbidden:
+                    self._send(403, b'<html><body>403 Forbidden</body></html>', 'text/html')
+                elif (match := re.match(r'/thread\.php\?fid-\d+(?:-page-(\d+))?\.html', self.path)) and \
+                        int(match.group(1) or 1) in server.failing_pages:
+                    self._send(500, b'<html><body>500 Internal Server Error</body></html>', 'text/html')
+                elif match:
+                    self._send(200, server.index_page(int(match.group(1) or 1)), 'text/html; charset=utf-8')
+                elif match := re.match(r'/read\.php\?tid-(\d+)\.html', self.path):
+                    self._send(200, server.detail_page(int(match.group(1))), 'text/html; charset=utf-8')
+                elif match := re.match(r'/job\.php\?action=buytopic&tid=(\d+)', self.path):
+                    with server._count_lock:
+                        server._purchased.add(int(match.group(1)))
+                        server.purchase_count += 1
+                    self._send(200, '<html><body>购买成功</body></html>'.encode('utf-8'), 'text/html; charset=utf-8')
+                elif self.path.startswith('/images/'):
+                    self._send(200, server.image_body, 'image/jpeg')
+                else:
+                    self._send(404, b'not found', 'text/plain')
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,107 @@
+# benchmarks/mock_gemini.py
+# 本地 Gemini REST 桩服务：实现 models/<模型>:generateContent，按提示词返回合成的元数据 JSON，
+# 供基准测试在不调用真实 API 的情况下驱动 optimize_front_matter.py。
+# 把 GEMINI_API_ENDPOINT 指向 base_url 即可（优化脚本会改用 REST 传输）。
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_BATCH_ID = re.compile(r'\[文章 id=(\d+) 正文开始\]')
+
+
+def render_metadata(seed):
+    return {
+        "title": f"模拟标题 {seed}",
+        "seo_title": f"模拟 SEO 标题 {seed}",
+        "description": f"这是第 {seed} 篇文章的模拟元描述。",
+        "tags": ["汉化", "硬盘版", "GalGame", "模拟", "基准测试"],
+        "categories": ["游戏"],
+    }
+
+
+def render_response(prompt):
+    """单篇提示词返回一个对象，批量提示词（含多个文章 id）返回数组。"""
+    if ids := _BATCH_ID.findall(prompt):
+        return json.dumps([{"id": article_id, **render_metadata(article_id)} for article_id in ids], ensure_ascii=False)
+    return json.dumps(render_metadata(len(prompt)), ensure_ascii=False)
+
+
+class MockGeminiServer:
+    """在后台线程中运行的 Gemini 桩服务。latency 为每个请求的响应延迟，quota_error_rate 为返回 429 的比例。"""
+
+    def __init__(self, latency=0.0, quota_error_rate=0.0, seed=0):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.request_count = 0
+        self.quota_error_count = 0
+        self.prompt_chars = 0
+        self._random = random.Random(seed)
+        self._count_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not re.search(r'/models/[^/:]+:generateContent', self.path):
+                    self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+                    return
+                prompt = "".join(part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', []))
+                with server._count_lock:
+                    server.request_count += 1
+                    server.prompt_chars += len(prompt)
+                    quota_error = server._random.random() < server.quota_error_rate
+                    if quota_error: server.quota_error_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if quota_error:
+                    self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}})
+                    return
+                text = render_response(prompt)
+                prompt_tokens = len(prompt) // 2 + 1
+                self._send_json(200, {
+                    "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                    "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 2 + 1,
+                                      "totalTokenCount": prompt_tokens + len(text) // 2 + 1},
+                })
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
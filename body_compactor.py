@@ -0,0 +1,116 @@
+# body_compactor.py
+# 发送给 Gemini 之前的正文压缩：去掉对生成元数据没有帮助、却占用大量 token 的内容
+# （链接地址、图片、引用标记、下载表格、重复行），再按 token 预算挑选信息量最高的段落。
+import re
+
+from gemini_client import estimate_tokens
+
+_SCRIPT = re.compile(r'<(script|style)\b.*?</\1>', re.IGNORECASE | re.DOTALL)
+_HTML_TAG = re.compile(r'</?[a-zA-Z][^>\n]*>')
+_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+# [文字](地址) 只保留文字；文字本身可能带一层方括号，例如 [[Lass] 标题](...)
+_LINK = re.compile(r'\[((?:[^\[\]]|\[[^\[\]]*\])*)\]\([^)]*\)')
+_AUTOLINK = re.compile(r'<(?:https?|ftp|magnet):[^>\s]*>')
+_BARE_URL = re.compile(r'(?:https?|ftp)://\S+|magnet:\?\S+')
+_QUOTE_PREFIX = re.compile(r'^(?:\s*>)+ ?')
+_HEADING = re.compile(r'^#{1,6}\s*')
+_EMPHASIS = re.compile(r'\*\*|__|(?<!\w)[*_](?=\S)|(?<=\S)[*_](?!\w)')
+_TABLE_RULE = re.compile(r'^\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?$')
+_RULE = re.compile(r'^(?:[-*_]\s*){3,}$')
+# 下载与购买相关的行：提取码、解压密码、售价提示等，对标题、标签和描述没有帮助
+_NOISE = re.compile(r'提取码|解压密码|解压码|此帖售价|人购买|复制代码|恢复记录|^引用$|^Source:', re.IGNORECASE)
+_ESCAPE = re.compile(r'\\([\\`*_{}\[\]()#+\-.!|>])')
+_UNIT = re.compile(r'[⺀-￿]|[A-Za-z0-9]+')
+
+
+def clean_line(line):
+    """去掉一行中的图片、链接地址、引用前缀、强调标记与表格竖线，返回剩余文字。"""
+    line = _QUOTE_PREFIX.sub('', line)
+    if _TABLE_RULE.match(line.strip()) or _RULE.match(line.strip()):
+        return ''
+    line = _IMAGE.sub('', line)
+    line = _LINK.sub(r'\1', line)
+    line = _BARE_URL.sub('', _AUTOLINK.sub('', line))
+    line = _HTML_TAG.sub('', line)
+    line = _EMPHASIS.sub('', _HEADING.sub('', line.strip()))
+    if '|' in line:
+        line = ' '.join(cell.strip() for cell in line.strip('| ').split('|') if cell.strip())
+    line = re.sub(r'\s+', ' ', _ESCAPE.sub(r'\1', line)).strip()
+    return '' if _NOISE.search(line) else line
+
+
+def split_sections(body):
+    """清理正文并按空行、标题、分隔线切分为段落；全文中重复出现的行只保留第一次。"""
+    sections, current, seen = [], [], set()
+    for raw_line in _SCRIPT.sub('', body.replace('\r\n', '\n').replace('\r', '\n')).split('\n'):
+        stripped = _QUOTE_PREFIX.sub('', raw_line).strip()
+        boundary = not stripped or stripped.startswith('#') or _RULE.match(stripped)
+        line = clean_line(raw_line)
+        # 只剩标点或冒号的行（例如 "VNDB介紹頁："）在链接被去掉后已没有意义
+        if line and not _UNIT.search(line.rstrip('：:')):
+            line = ''
+        if boundary and current:
+            sections.append(current)
+            current = []
+        if not line:
+            continue
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        current.append(line)
+    if current:
+        sections.append(current)
+    # 只剩一行 "xxx：" 的段落是链接被去掉后留下的标签（例如 "VNDB介紹頁："、"BD："）
+    return ["\n".join(lines) for lines in sections if len(lines) > 1 or not lines[0].endswith(('：', ':'))]
+
+
+def section_score(index, text, tokens):
+    """段落的信息密度：不同字词数 / token 数，越靠前的段落权重越高（标题与简介通常在开头）。"""
+    units = set(_UNIT.findall(text.lower()))
+    return len(units) / (tokens + 1) / (1 + 0.05 * index)
+
+
+def truncate_to_budget(text, budget):
+    """按行截断到 token 预算以内，单行过长时按字符截断。"""
+    lines, used = [], 0
+    for line in text.split('\n'):
+        tokens = estimate_tokens(line)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining > 8:
+                # estimate_tokens 对中文约 1 字 1 token，按字符截取不会超出太多
+                lines.append(line[:remaining])
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines)
+
+
+def compact_body(body, budget):
+    """返回不超过 budget 个（估算）token 的压缩正文。
+
+    第一个段落（通常是标题与作者）总是保留；其余段落按信息密度从高到低装入预算，
+    最后按原文顺序拼接，装不下的第一个高分段落截断后填满剩余预算。
+    """
+    sections = split_sections(body)
+    if not sections:
+        return ""
+    costs = [estimate_tokens(text) for text in sections]
+    if sum(costs) <= budget:
+        return "\n\n".join(sections)
+
+    chosen = {0: truncate_to_budget(sections[0], budget)}
+    remaining = budget - estimate_tokens(chosen[0])
+    ranked = sorted(range(1, len(sections)), key=lambda i: section_score(i, sections[i], costs[i]), reverse=True)
+    for index in ranked:
+        if remaining <= 8:
+            break
+        if costs[index] <= remaining:
+            chosen[index] = sections[index]
+            remaining -= costs[index]
+        else:
+            # 例如合集帖的超长作品列表：截断后用它填满剩余预算，而不是整个跳过
+            chosen[index] = truncate_to_budget(sections[index], remaining)
+            break
+    return "\n\n".join(chosen[index] for index in sorted(chosen) if chosen[index])
@@ -0,0 +1,187 @@
+# =================================================================================
+# South-Plus 原始数据 -> Hexo Markdown 构建脚本
+# 把 South-Plus-Raw-Data/<日期>/<文章>/data.json 转换为 South-Plus-Articles/<日期>/<文章>.md，
+# 供 optimize_front_matter.py 继续处理。
+#
+# - 增量：只重建 data.json 内容哈希与上次构建时不同的文章（哈希来自 manifest.py 的 raw 清单）。
+# - 并行：HTML -> Markdown 转换是 CPU 密集操作，放在进程池中执行。
+# - 流式：按路径分页读取待构建列表，同时在途的文章数有上限；data.json 只在工作进程中读取，
+#   主进程从不把整个归档载入内存。
+# - 图片：文章的本地图片以硬链接放进与文章同名的资源文件夹（Hexo 的 post_asset_folder），
+#   正文中的 images/image_N.ext 改写为 image_N.ext。
+# =================================================================================
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    import html2text
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install html2text")
+    exit()
+
+from database import get_store
+from manifest import STAGE_RAW, STAGE_SOURCE, RAW_DATA_FILENAME, refresh_stage, record_entry
+from image_store import link_tree
+from metrics import stage_timer, increment, run_instrumented
+
+RAW_FOLDER = "South-Plus-Raw-Data"
+OUTPUT_FOLDER = "South-Plus-Articles"
+BUILD_WORKERS = int(os.getenv('BUILD_WORKERS', str(os.cpu_count() or 2)))
+# 每个工作进程同时排队的文章数，决定主进程最多持有多少个未完成的任务
+BUILD_QUEUE_FACTOR = 4
+BUILD_PAGE_SIZE = 500
+HEXO_CATEGORY = os.getenv('HEXO_CATEGORY', '资源贴')
+HEXO_DEFAULT_TAGS = [tag for tag in os.getenv('HEXO_DEFAULT_TAGS', 'GALGAME').split(',') if tag]
+DESCRIPTION_LIMIT = 150
+
+_BRACKETS = re.compile(r'\[([^\[\]]+)\]')
+_SIZE_TAG = re.compile(r'^\d+(?:\.\d+)?\s*[KMGT]i?B?$', re.IGNORECASE)
+_LOCAL_IMAGE = re.compile(r'\]\(images/([^)\s]+)\)')
+_MARKDOWN_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+
+
+def quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def title_tags(title, author):
+    """从标题的方括号中提取标签（忽略 [4.50GB] 这类体积），再加上作者与默认标签，保持出现顺序并去重。"""
+    tags = list(HEXO_DEFAULT_TAGS)
+    tags += [part.strip() for part in _BRACKETS.findall(title) if not _SIZE_TAG.match(part.strip())]
+    if '汉化' in title: tags.append('汉化')
+    if author and author != '未知作者': tags.append(author)
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+
+def describe(markdown):
+    """去掉图片与多余空白后截取正文开头作为描述。"""
+    text = re.sub(r'\s+', ' ', _MARKDOWN_IMAGE.sub('', markdown)).strip()
+    return text if len(text) <= DESCRIPTION_LIMIT else text[:DESCRIPTION_LIMIT] + '...'
+
+
+def render_post(record, markdown):
+    title = record.get('original_title', '').strip()
+    author = record.get('author') or '未知作者'
+    lines = ["---", f"title: {quote(title)}", f"seo_title: {quote(_BRACKETS.sub('', title).strip() or title)}"]
+    if cover := record.get('cover_image_url'):
+        lines.append(f"cover: {quote(cover)}")
+    lines += [f"description: {quote(describe(markdown))}", "categories:", f"  - {HEXO_CATEGORY}", "tags:"]
+    lines += [f"  - {tag}" for tag in title_tags(title, author)]
+    lines += [f"date: {record.get('hexo_date')}", f"author: {quote(author)}", f"source_url: {quote(record.get('source_url', ''))}", "---"]
+    header = f"# {title}\n\n**{author}** - {record.get('publish_date', '')}\n\n"
+    return "\n".join(lines) + "\n\n" + header + markdown
+
+
+def convert_article(raw_dir, output_path):
+    """（在工作进程中运行）读取 data.json，写出 Hexo 文章与资源文件夹，返回 (data.json 的哈希, 图片数)。"""
+    with open(os.path.join(raw_dir, RAW_DATA_FILENAME), 'rb') as f:
+        raw = f.read()
+    record = json.loads(raw)
+    converter = html2text.HTML2Text()
+    converter.body_width = 0
+    markdown = _LOCAL_IMAGE.sub(r'](\1)', converter.handle(record.get('content_html', '')))
+    images = link_tree(os.path.join(raw_dir, 'images'), os.path.splitext(output_path)[0])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_post(record, markdown))
+    os.replace(tmp_path, output_path)
+    return hashlib.sha256(raw).hexdigest(), images
+
+
+def iter_pending_builds(force=False):
+    """按路径分页列出需要构建的原始条目 (路径, 内容哈希)：从未构建过，或 data.json 哈希已变化。"""
+    store = get_store()
+    last_path = ''
+    while True:
+        rows = store.query('''
+            SELECT r.path, r.content_hash FROM manifest_files r
+            LEFT JOIN markdown_builds b ON b.raw_path = r.path
+            WHERE r.stage = ? AND r.path > ? AND (? OR b.raw_hash IS NULL OR b.raw_hash != r.content_hash)
+            ORDER BY r.path LIMIT ?
+        ''', (STAGE_RAW, last_path, force, BUILD_PAGE_SIZE))
+        yield from rows
+        if len(rows) < BUILD_PAGE_SIZE: return
+        last_path = rows[-1][0]
+
+
+def is_foreign_file(raw_path, output_path):
+    """输出位置已有文件、但不是本脚本构建的（例如手工整理的文章），默认不覆盖。"""
+    return os.path.exists(output_path) and get_store().query_one(
+        "SELECT 1 FROM markdown_builds WHERE raw_path = ?", (raw_path,)) is None
+
+
+def record_build(raw_path, raw_hash, md_path):
+    get_store().write('''
+        INSERT INTO markdown_builds (raw_path, raw_hash, md_path, built_at) VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT(raw_path) DO UPDATE SET raw_hash = excluded.raw_hash, md_path = excluded.md_path, built_at = excluded.built_at
+    ''', (raw_path, raw_hash, md_path))
+
+
+def build(raw_folder=RAW_FOLDER, output_folder=OUTPUT_FOLDER, workers=BUILD_WORKERS, force=False):
+    """增量构建全部待更新的文章，返回 (构建数, 跳过数, 失败数)。"""
+    with stage_timer('manifest_refresh'):
+        changed, removed = refresh_stage(STAGE_RAW, raw_folder, leaf_dirs=True)
+    print(f"原始数据清单已刷新：{changed} 个条目有变化，{removed} 个条目已删除。")
+    built = skipped = failed = 0
+    in_flight = {}
+    max_in_flight = max(1, workers) * BUILD_QUEUE_FACTOR
+
+    def collect(done):
+        nonlocal built, failed
+        for future in done:
+            raw_path, md_path = in_flight.pop(future)
+            try:
+                raw_hash, images = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  [错误] 转换 {raw_path} 失败: {e.__class__.__name__}: {e}")
+                continue
+            # 记录实际读到的内容哈希：转换期间 data.json 又被改写时，下次运行会再次构建
+            record_build(raw_path, raw_hash, md_path)
+            record_entry(STAGE_SOURCE, output_folder, md_path)
+            increment('articles_built')
+            built += 1
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for raw_path, _ in iter_pending_builds(force):
+            date_dir, name = raw_path.split('/', 1)
+            md_path = f"{date_dir}/{name}.md"
+            output_path = os.path.join(output_folder, date_dir, f"{name}.md")
+            if not force and is_foreign_file(raw_path, output_path):
+                skipped += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(convert_article, os.path.join(raw_folder, date_dir, name), output_path)
+            in_flight[future] = (raw_path, md_path)
+        collect(concurrent.futures.wait(in_flight).done)
+    get_store().flush()
+    return built, skipped, failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="把抓取的原始 JSON 构建为 Hexo Markdown 文章")
+    parser.add_argument('--workers', type=int, default=BUILD_WORKERS, help="转换进程数")
+    parser.add_argument('--force', action='store_true', help="忽略构建记录，重建全部文章（包括覆盖手工整理的文件）")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(RAW_FOLDER):
+        print(f"[严重错误] 原始数据文件夹 '{RAW_FOLDER}' 不存在。")
+        exit(1)
+    start = time.time()
+    built, skipped, failed = build(workers=args.workers, force=args.force)
+    print(f"构建完成：生成 {built} 篇，跳过 {skipped} 篇已存在的非构建文件，失败 {failed} 篇，耗时 {time.time() - start:.2f} 秒。")
+
+
+if __name__ == "__main__":
+    run_instrumented('builder', main)
@@ -1,65 +1,539 @@
 # database.py
+# 抓取与优化流水线的进度存储。
+# 一个长期存活的写连接（WAL 模式）+ 后台写线程：所有写操作先进入队列，按条数或时间批量提交，
+# 读操作使用每个线程各自的连接，互不阻塞。
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
 
 DB_FILE = "progress.db"
+WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '200'))
+WRITE_FLUSH_INTERVAL = float(os.getenv('DB_WRITE_FLUSH_INTERVAL', '1.0'))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=10000",
+)
+
+SCHEMA = (
+    # 每篇文章一行：抓取状态、来源、内容哈希与失败原因
+    '''CREATE TABLE IF NOT EXISTS articles (
+        folder_name TEXT PRIMARY KEY,
+        thread_id INTEGER,
+        url TEXT,
+        status TEXT NOT NULL DEFAULT 'scraped',
+        content_hash TEXT,
+        error_reason TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_articles_status ON articles (status, updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_articles_thread_id ON articles (thread_id)",
+    # 旧版本的已抓取列表，仅用于迁移
+    "CREATE TABLE IF NOT EXISTS scraped_articles (folder_name TEXT PRIMARY KEY)",
+    # 已成功优化处理的文章路径
+    '''CREATE TABLE IF NOT EXISTS processed_articles (
+        folder_path TEXT PRIMARY KEY
+    )''',
+    # 每个版块的增量抓取高水位线（已完整抓取到的最大帖子ID）
+    '''CREATE TABLE IF NOT EXISTS forum_state (
+        fid TEXT PRIMARY KEY,
+        max_thread_id INTEGER NOT NULL DEFAULT 0,
+        newest_date TEXT,
+        updated_at TEXT
+    )''',
+    # 图片URL到内容哈希的索引，已下载过的图片不再重复抓取
+    '''CREATE TABLE IF NOT EXISTS image_index (
+        url TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        ext TEXT NOT NULL,
+        size INTEGER,
+        fetched_at TEXT
+    )''',
+    # 文件清单：各流水线阶段（raw/source/optimized）下的文件及其大小、mtime、内容哈希，见 manifest.py
+    '''CREATE TABLE IF NOT EXISTS manifest_files (
+        stage TEXT NOT NULL,
+        path TEXT NOT NULL,
+        parent TEXT NOT NULL,
+        key TEXT NOT NULL,
+        size INTEGER,
+        mtime_ns INTEGER,
+        content_hash TEXT,
+        updated_at TEXT,
+        PRIMARY KEY (stage, path)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_manifest_files_parent ON manifest_files (stage, parent)",
+    "CREATE INDEX IF NOT EXISTS idx_manifest_files_key ON manifest_files (stage, key)",
+    # AI 元数据缓存：键为 模型 + 提示词指纹 + 发送给模型的正文 的哈希，值为模型返回的 JSON
+    '''CREATE TABLE IF NOT EXISTS metadata_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        created_at TEXT
+    )''',
+    # 已扫描过的目录及其 mtime；目录 mtime 未变说明其中没有增删条目，可跳过 listdir
+    '''CREATE TABLE IF NOT EXISTS manifest_dirs (
+        stage TEXT NOT NULL,
+        path TEXT NOT NULL,
+        mtime_ns INTEGER,
+        PRIMARY KEY (stage, path)
+    )''',
+    # 持久化任务队列（抓取 / 图片补抓 / AI 优化），带租约、重试次数与失败原因，见 job_queue.py
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        kind TEXT NOT NULL,
+        job_key TEXT NOT NULL,
+        payload TEXT,
+        sort_key INTEGER,
+        shard_hash INTEGER NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error_reason TEXT,
+        lease_owner TEXT,
+        lease_expires REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        updated_at TEXT,
+        PRIMARY KEY (kind, job_key)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (kind, state, sort_key)",
+    # build_articles.py 的构建记录：每篇原始数据（raw 清单路径）上次构建时的 data.json 哈希
+    '''CREATE TABLE IF NOT EXISTS markdown_builds (
+        raw_path TEXT PRIMARY KEY,
+        raw_hash TEXT NOT NULL,
+        md_path TEXT NOT NULL,
+        built_at TEXT
+    )''',
+    # 正文的 SimHash 指纹（拆成 4 段 16 位，各自建索引以便按段查找候选），见 near_duplicates.py
+    '''CREATE TABLE IF NOT EXISTS fingerprints (
+        namespace TEXT NOT NULL,
+        item_key TEXT NOT NULL,
+        simhash INTEGER NOT NULL,
+        band0 INTEGER NOT NULL,
+        band1 INTEGER NOT NULL,
+        band2 INTEGER NOT NULL,
+        band3 INTEGER NOT NULL,
+        ref TEXT,
+        created_at TEXT,
+        PRIMARY KEY (namespace, item_key)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_fingerprints_band0 ON fingerprints (namespace, band0)",
+    "CREATE INDEX IF NOT EXISTS idx_fingerprints_band1 ON fingerprints (namespace, band1)",
+    "CREATE INDEX IF NOT EXISTS idx_fingerprints_band2 ON fingerprints (namespace, band2)",
+    "CREATE INDEX IF NOT EXISTS idx_fingerprints_band3 ON fingerprints (namespace, band3)",
+    # optimize_images.py 为每张原图（按 SHA-256）生成的版本，版本名形如 webp-1600；sha256 指向图片仓库中的文件
+    '''CREATE TABLE IF NOT EXISTS image_variants (
+        source_sha256 TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        size INTEGER,
+        created_at TEXT,
+        PRIMARY KEY (source_sha256, variant)
+    )''',
+    # optimize_images.py 的处理记录：每篇原始数据处理后的 data.json 哈希与图片体积变化
+    '''CREATE TABLE IF NOT EXISTS image_passes (
+        raw_path TEXT PRIMARY KEY,
+        raw_hash TEXT NOT NULL,
+        bytes_before INTEGER,
+        bytes_after INTEGER,
+        updated_at TEXT
+    )''',
+    # search_index.py 的倒排索引：已索引的文章（编号即前端使用的文章编号）与每篇文章的词项权重
+    '''CREATE TABLE IF NOT EXISTS search_docs (
+        path TEXT PRIMARY KEY,
+        doc_id INTEGER NOT NULL UNIQUE,
+        content_hash TEXT NOT NULL,
+        title TEXT,
+        url TEXT,
+        description TEXT,
+        indexed_at TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS search_postings (
+        term TEXT NOT NULL,
+        doc_id INTEGER NOT NULL,
+        weight INTEGER NOT NULL,
+        shard INTEGER NOT NULL,
+        PRIMARY KEY (term, doc_id)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_search_postings_shard ON search_postings (shard, term)",
+    "CREATE INDEX IF NOT EXISTS idx_search_postings_doc ON search_postings (doc_id)",
+    # raw_archive.py 的偏移索引：每篇原始数据（键同 raw 清单路径）最新版本所在的段文件、偏移与压缩后长度，
+    # record_hash 为对应 data.json 内容的哈希
+    '''CREATE TABLE IF NOT EXISTS archive_records (
+        item_key TEXT PRIMARY KEY,
+        thread_id INTEGER,
+        segment TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        record_hash TEXT NOT NULL,
+        updated_at TEXT
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_archive_records_thread ON archive_records (thread_id)",
+)
+
+# 旧库升级：(表, 列, 语句)，列不存在时执行
+MIGRATIONS = (
+    ("processed_articles", "status", "ALTER TABLE processed_articles ADD COLUMN status TEXT NOT NULL DEFAULT 'processed'"),
+    ("processed_articles", "content_hash", "ALTER TABLE processed_articles ADD COLUMN content_hash TEXT"),
+    ("processed_articles", "error_reason", "ALTER TABLE processed_articles ADD COLUMN error_reason TEXT"),
+    ("processed_articles", "updated_at", "ALTER TABLE processed_articles ADD COLUMN updated_at TEXT"),
+)
+
+_FLUSH, _STOP = object(), object()
+
+
+class ProgressStore:
+    """单写连接 + 批量提交队列的 SQLite 存储（线程安全）。
+
+    write()/write_many() 只是把语句放进队列，由后台线程按 batch_size 条或
+    flush_interval 秒合并为一个事务提交；flush() 等待队列中已有的写入全部落盘。
+    需要立即拿到结果的写操作（例如 job_queue 的租约抢占）使用 execute_now()。
+    """
+
+    def __init__(self, path=DB_FILE, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._writer = self._connect()
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name="progress-db-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+        return con
+
+    # --- 写入 ---
+
+    def write(self, sql, params=()):
+        self._queue.put((sql, params, False))
+
+    def write_many(self, sql, seq_of_params):
+        self._queue.put((sql, list(seq_of_params), True))
+
+    def flush(self):
+        """阻塞直到此前入队的写入全部提交。"""
+        if self._closed: return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done, False))
+        done.wait()
+
+    def execute_now(self, sql, params=()):
+        """先清空写队列，再同步执行一条写语句并提交，返回结果行。"""
+        self.flush()
+        with self._write_lock:
+            try:
+                rows = self._writer.execute(sql, params).fetchall()
+                self._writer.commit()
+                return rows
+            except sqlite3.Error:
+                self._writer.rollback()
+                raise
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] not in (_FLUSH, _STOP):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            finally:
+                # 无论提交是否出错都要唤醒等待方并计数，否则 flush()/execute_now() 会永远阻塞
+                for sql, waiter, _ in batch:
+                    if sql is _FLUSH: waiter.set()
+                    self._queue.task_done()
+            if batch[-1][0] is _STOP:
+                return
+
+    def _commit(self, batch):
+        statements = [item for item in batch if item[0] is not _FLUSH and item[0] is not _STOP]
+        if not statements: return
+        with self._write_lock:
+            for sql, params, many in statements:
+                try:
+                    if many: self._writer.executemany(sql, params)
+                    else: self._writer.execute(sql, params)
+                except Exception as e:
+                    # 不只是 sqlite3.Error：调用方传入的参数类型有误等错误同样只丢弃这一条，写线程必须继续运行
+                    print(f"[DB错误] 写入失败: {e.__class__.__name__}: {e} ({sql.split()[0]} ...)")
+            try:
+                self._writer.commit()
+            except Exception as e:
+                print(f"[DB错误] 提交失败: {e.__class__.__name__}: {e}")
+
+    # --- 读取 ---
+
+    def _reader(self):
+        if (con := getattr(self._local, 'con', None)) is None:
+            con = self._local.con = self._connect()
+            with self._readers_lock:
+                self._readers.append(con)
+        return con
+
+    def query(self, sql, params=()):
+        return self._reader().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self._reader().execute(sql, params).fetchone()
+
+    def close(self):
+        if self._closed: return
+        self._queue.put((_STOP, None, False))
+        self._thread.join()
+        self._closed = True
+        with self._write_lock:
+            self._writer.close()
+        with self._readers_lock:
+            for con in self._readers:
+                con.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _initialize_schema(store):
+    with store._write_lock:
+        con = store._writer
+        for statement in SCHEMA:
+            con.execute(statement)
+        for table, column, statement in MIGRATIONS:
+            if column not in {row[1] for row in con.execute(f"PRAGMA table_info({table})")}:
+                con.execute(statement)
+        con.execute("INSERT OR IGNORE INTO articles (folder_name, status) SELECT folder_name, 'scraped' FROM scraped_articles")
+        con.commit()
+
+
+def get_store():
+    """返回当前工作目录下 progress.db 的共享存储，必要时自动初始化。"""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != os.path.abspath(DB_FILE):
+            if _store is not None: _store.close()
+            _store = ProgressStore(DB_FILE)
+            _initialize_schema(_store)
+        return _store
+
+
+def close_database():
+    """提交所有排队中的写入并关闭连接（进程退出时自动调用）。"""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+
+atexit.register(close_database)
+
 
 def initialize_database():
     """初始化数据库，创建必要的表（如果不存在）。"""
-    with sqlite3.connect(DB_FILE) as con:
-        cur = con.cursor()
-        # 存储已成功抓取的文章的唯一标识（文件夹名）
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS scraped_articles (
-                folder_name TEXT PRIMARY KEY
-            )
-        ''')
-        # 存储已成功优化处理的原始数据文件夹的路径
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS processed_articles (
-                folder_path TEXT PRIMARY KEY
-            )
-        ''')
-        con.commit()
+    get_store()
+
 
-def add_scraped_article(folder_name):
+# --- 文章抓取状态 ---
+
+def add_scraped_article(folder_name, url=None, thread_id=None, content_hash=None):
     """记录一篇已成功抓取的文章。"""
-    try:
-        with sqlite3.connect(DB_FILE) as con:
-            cur = con.cursor()
-            cur.execute("INSERT OR IGNORE INTO scraped_articles (folder_name) VALUES (?)", (folder_name,))
-            con.commit()
-    except sqlite3.Error as e:
-        print(f"[DB错误] 写入scraped_articles失败: {e}")
+    get_store().write('''
+        INSERT INTO articles (folder_name, thread_id, url, status, content_hash, attempts)
+        VALUES (?, ?, ?, 'scraped', ?, 1)
+        ON CONFLICT(folder_name) DO UPDATE SET
+            thread_id = COALESCE(excluded.thread_id, articles.thread_id),
+            url = COALESCE(excluded.url, articles.url),
+            status = 'scraped',
+            content_hash = COALESCE(excluded.content_hash, articles.content_hash),
+            error_reason = NULL,
+            attempts = articles.attempts + 1,
+            updated_at = datetime('now')
+    ''', (folder_name, thread_id, url, content_hash))
+
+
+def mark_article_failed(folder_name, reason, url=None, thread_id=None):
+    """记录一篇抓取失败的文章及失败原因，已成功的记录不会被覆盖。"""
+    get_store().write('''
+        INSERT INTO articles (folder_name, thread_id, url, status, error_reason, attempts)
+        VALUES (?, ?, ?, 'failed', ?, 1)
+        ON CONFLICT(folder_name) DO UPDATE SET
+            thread_id = COALESCE(excluded.thread_id, articles.thread_id),
+            url = COALESCE(excluded.url, articles.url),
+            status = 'failed',
+            error_reason = excluded.error_reason,
+            attempts = articles.attempts + 1,
+            updated_at = datetime('now')
+        WHERE articles.status != 'scraped'
+    ''', (folder_name, thread_id, url, reason))
+
+
+def mark_article_duplicate(folder_name, reason, url=None, thread_id=None):
+    """记录一篇因与已抓取帖子近似重复而跳过的文章（NEAR_DUP_POLICY=skip），之后的扫描不再把它当作新帖子。"""
+    get_store().write('''
+        INSERT INTO articles (folder_name, thread_id, url, status, error_reason, attempts)
+        VALUES (?, ?, ?, 'duplicate', ?, 1)
+        ON CONFLICT(folder_name) DO UPDATE SET
+            thread_id = COALESCE(excluded.thread_id, articles.thread_id),
+            url = COALESCE(excluded.url, articles.url),
+            status = 'duplicate',
+            error_reason = excluded.error_reason,
+            attempts = articles.attempts + 1,
+            updated_at = datetime('now')
+        WHERE articles.status != 'scraped'
+    ''', (folder_name, thread_id, url, reason))
+
 
 def get_scraped_articles():
-    """获取所有已抓取文章的文件夹名集合，用于快速查找。"""
+    """获取所有已抓取文章的文件夹名集合。"""
     try:
-        with sqlite3.connect(DB_FILE) as con:
-            cur = con.cursor()
-            cur.execute("SELECT folder_name FROM scraped_articles")
-            return {row[0] for row in cur.fetchall()}
+        return {row[0] for row in get_store().query("SELECT folder_name FROM articles WHERE status = 'scraped'")}
     except sqlite3.Error as e:
-        print(f"[DB错误] 读取scraped_articles失败: {e}")
+        print(f"[DB错误] 读取articles失败: {e}")
         return set()
 
-def add_processed_article(folder_path):
-    """记录一个已成功优化的原始数据文件夹。"""
+
+def find_scraped_articles(folder_names):
+    """在给定的文件夹名中找出已抓取的部分（走主键索引，不加载整张表）。"""
+    folder_names = list(folder_names)
+    found = set()
+    try:
+        for start in range(0, len(folder_names), 500):
+            chunk = folder_names[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(row[0] for row in get_store().query(
+                f"SELECT folder_name FROM articles WHERE status IN ('scraped', 'duplicate') AND folder_name IN ({placeholders})", chunk))
+    except sqlite3.Error as e:
+        print(f"[DB错误] 读取articles失败: {e}")
+    return found
+
+
+def get_articles_by_status(status, limit=None):
+    """按状态列出文章 (folder_name, thread_id, url, error_reason, attempts)，最早更新的在前。"""
+    sql = "SELECT folder_name, thread_id, url, error_reason, attempts FROM articles WHERE status = ? ORDER BY updated_at"
+    try:
+        if limit: return get_store().query(sql + " LIMIT ?", (status, limit))
+        return get_store().query(sql, (status,))
+    except sqlite3.Error as e:
+        print(f"[DB错误] 读取articles失败: {e}")
+        return []
+
+
+def count_articles(status='scraped'):
+    """统计某个状态的文章数量。"""
     try:
-        with sqlite3.connect(DB_FILE) as con:
-            cur = con.cursor()
-            cur.execute("INSERT OR IGNORE INTO processed_articles (folder_path) VALUES (?)", (folder_path,))
-            con.commit()
+        return get_store().query_one("SELECT COUNT(*) FROM articles WHERE status = ?", (status,))[0]
     except sqlite3.Error as e:
-        print(f"[DB错误] 写入processed_articles失败: {e}")
+        print(f"[DB错误] 读取articles失败: {e}")
+        return 0
+
+
+# --- 优化状态 ---
+
+def add_processed_article(folder_path, content_hash=None):
+    """记录一个已成功优化的文章路径。"""
+    get_store().write('''
+        INSERT INTO processed_articles (folder_path, status, content_hash, error_reason, updated_at)
+        VALUES (?, 'processed', ?, NULL, datetime('now'))
+        ON CONFLICT(folder_path) DO UPDATE SET
+            status = 'processed', content_hash = excluded.content_hash, error_reason = NULL, updated_at = excluded.updated_at
+    ''', (folder_path, content_hash))
+
+
+def mark_processed_failed(folder_path, reason):
+    """记录一次优化失败及原因，已成功的记录不会被覆盖。"""
+    get_store().write('''
+        INSERT INTO processed_articles (folder_path, status, error_reason, updated_at)
+        VALUES (?, 'failed', ?, datetime('now'))
+        ON CONFLICT(folder_path) DO UPDATE SET
+            status = 'failed', error_reason = excluded.error_reason, updated_at = excluded.updated_at
+        WHERE processed_articles.status != 'processed'
+    ''', (folder_path, reason))
 
 
 def get_processed_articles():
-    """获取所有已优化文件夹的路径集合。"""
+    """获取所有已优化文章路径的集合。"""
     try:
-        with sqlite3.connect(DB_FILE) as con:
-            cur = con.cursor()
-            cur.execute("SELECT folder_path FROM processed_articles")
-            return {row[0] for row in cur.fetchall()}
+        return {row[0] for row in get_store().query("SELECT folder_path FROM processed_articles WHERE status = 'processed'")}
     except sqlite3.Error as e:
         print(f"[DB错误] 读取processed_articles失败: {e}")
         return set()
+
+
+# --- 版块高水位线 ---
+
+def get_forum_high_water_mark(fid):
+    """获取某个版块已完整抓取到的最大帖子ID（高水位线），没有记录时返回0。"""
+    try:
+        row = get_store().query_one("SELECT max_thread_id FROM forum_state WHERE fid = ?", (str(fid),))
+        return row[0] if row else 0
+    except sqlite3.Error as e:
+        print(f"[DB错误] 读取forum_state失败: {e}")
+        return 0
+
+
+def set_forum_high_water_mark(fid, max_thread_id, newest_date=None):
+    """更新某个版块的高水位线（只会向前推进）。"""
+    get_store().write('''
+        INSERT INTO forum_state (fid, max_thread_id, newest_date, updated_at)
+        VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT(fid) DO UPDATE SET
+            max_thread_id = excluded.max_thread_id,
+            newest_date = COALESCE(excluded.newest_date, forum_state.newest_date),
+            updated_at = excluded.updated_at
+        WHERE excluded.max_thread_id > forum_state.max_thread_id
+    ''', (str(fid), max_thread_id, newest_date))
+
+
+# --- 图片索引 ---
+
+def get_image_record(url):
+    """按URL查找已下载图片的内容哈希，返回 (sha256, ext) 或 None。"""
+    try:
+        return get_store().query_one("SELECT sha256, ext FROM image_index WHERE url = ?", (url,))
+    except sqlite3.Error as e:
+        print(f"[DB错误] 读取image_index失败: {e}")
+        return None
+
+
+def add_image_record(url, sha256, ext, size):
+    """记录一张图片URL与其内容哈希的对应关系。"""
+    get_store().write("INSERT OR REPLACE INTO image_index (url, sha256, ext, size, fetched_at) VALUES (?, ?, ?, ?, datetime('now'))",
+                      (url, sha256, ext, size))
+
+
+# --- AI 元数据缓存 ---
+
+def get_cached_metadata(cache_key):
+    """读取缓存的 AI 元数据（JSON 字符串），不存在时返回 None。"""
+    try:
+        row = get_store().query_one("SELECT metadata FROM metadata_cache WHERE cache_key = ?", (cache_key,))
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"[DB错误] 读取metadata_cache失败: {e}")
+        return None
+
+
+def add_cached_metadata(cache_key, model, prompt_version, metadata):
+    """保存一条 AI 元数据缓存，metadata 为 JSON 字符串。"""
+    get_store().write("INSERT OR REPLACE INTO metadata_cache (cache_key, model, prompt_version, metadata, created_at) VALUES (?, ?, ?, ?, datetime('now'))",
+                      (cache_key, model, prompt_version, metadata))
@@ -0,0 +1,111 @@
+# gemini_client.py
+# Gemini API 调用封装：按每分钟请求数(RPM)与每分钟 token 数(TPM)双重限速，
+# 对 429/5xx 做带抖动的指数退避，遇到配额错误时自适应降速，成功后再逐步恢复。
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    import google.generativeai as genai
+    from google.api_core import exceptions as google_exceptions
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install google-generativeai")
+    exit()
+
+from metrics import stage_timer
+from rate_limiter import AdaptiveRateLimiter
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'models/gemini-2.5-flash-lite')
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', '15'))
+GEMINI_TPM = float(os.getenv('GEMINI_TPM', '250000'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '6'))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '2'))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', '60'))
+# 预订 TPM 额度时为模型输出预留的 token 数，调用完成后按 usage_metadata 多退少补
+GEMINI_OUTPUT_TOKENS = 512
+
+QUOTA_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+TRANSIENT_ERRORS = (google_exceptions.ServerError,)
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符约 1 字 1 token，其余约 4 字符 1 token。"""
+    cjk = sum(1 for ch in text if ch >= '⺀')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def _server_retry_delay(error):
+    """配额错误里常带有服务端建议的等待时间（retry_delay { seconds: N }）。"""
+    match = re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(error))
+    return float(match.group(1)) if match else 0.0
+
+
+class GeminiClient:
+    """线程安全的 Gemini 调用器，多个工作线程共享同一组 RPM/TPM 令牌桶。"""
+
+    def __init__(self, model_name=GEMINI_MODEL, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_retries=GEMINI_MAX_RETRIES):
+        self.model = genai.GenerativeModel(model_name)
+        # 桶容量都取得较小（RPM 为 1 个请求，TPM 为 15 秒的额度），保证任意一分钟窗口内都不会明显超出配额
+        self.rpm = AdaptiveRateLimiter(rpm / 60, capacity=1)
+        self.tpm = AdaptiveRateLimiter(tpm / 60, capacity=tpm / 4)
+        self.max_retries = max_retries
+        self.stats = {'requests': 0, 'succeeded': 0, 'failed': 0, 'throttled': 0, 'retried': 0, 'tokens': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _backoff(self, attempt, error=None):
+        delay = random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+        return max(delay, _server_retry_delay(error)) if error is not None else delay
+
+    def generate(self, prompt, output_tokens=GEMINI_OUTPUT_TOKENS, **kwargs):
+        """调用 generate_content；配额与服务端错误会自动重试，重试耗尽后抛出最后一次的异常。
+
+        output_tokens 为预计的输出长度，仅用于预订 TPM 额度。
+        """
+        estimate = estimate_tokens(prompt) + output_tokens
+        for attempt in range(self.max_retries + 1):
+            self.rpm.acquire()
+            self.tpm.acquire(estimate)
+            self._count('requests')
+            try:
+                with stage_timer('ai_call'):
+                    response = self.model.generate_content(prompt, **kwargs)
+            except QUOTA_ERRORS as e:
+                # 被拒绝的请求不计入 token 配额；两个桶一起降速，因为无法区分是哪一项配额耗尽
+                self.tpm.refund(estimate)
+                if self.rpm.throttle() | self.tpm.throttle():
+                    print(f"  [AI警告] 触发配额限制，请求速率降至 {self.rpm.rate * 60:.1f} 次/分钟。")
+                self._count('throttled')
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                delay, error = self._backoff(attempt, e), e
+            except TRANSIENT_ERRORS as e:
+                self._count('retried')
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                delay, error = self._backoff(attempt, e), e
+            else:
+                self.rpm.recover()
+                self.tpm.recover()
+                used = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', 0) or estimate
+                if used < estimate:
+                    self.tpm.refund(estimate - used)
+                elif used > estimate:
+                    self.tpm.reserve(used - estimate)
+                self._count('succeeded')
+                self._count('tokens', used)
+                return response
+            print(f"  [AI警告] {error.__class__.__name__}，{delay:.1f}秒后进行第 {attempt + 1} 次重试...")
+            time.sleep(delay)
+
+    def summary(self):
+        return (f"Gemini: 请求 {self.stats['requests']} 次 (成功 {self.stats['succeeded']}, 失败 {self.stats['failed']}, "
+                f"限流 {self.stats['throttled']}, 重试 {self.stats['retried']}), 消耗 {self.stats['tokens']} tokens, "
+                f"当前速率 {self.rpm.rate * 60:.1f} 次/分钟")
@@ -0,0 +1,157 @@
+# http_cache.py
+# 磁盘 HTTP 缓存：保存 ETag/Last-Modified 与 zlib 压缩后的正文，发送条件请求，
+# 服务器返回 304 时直接用缓存内容构造响应。总大小超过上限时按最近最少使用淘汰。
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from rate_limiter import RateLimitedSession
+except ImportError:
+    requests = None
+
+HTTP_CACHE_FOLDER = os.getenv('HTTP_CACHE_FOLDER', ".http-cache")
+HTTP_CACHE_MAX_MB = float(os.getenv('HTTP_CACHE_MAX_MB', '200'))
+# 这些响应头会随缓存一起保存，304 时用于还原响应
+_KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class HttpCache:
+    """以 SQLite 为索引、按 URL 存储压缩正文的 HTTP 缓存（线程安全）。"""
+
+    def __init__(self, folder=HTTP_CACHE_FOLDER, max_bytes=int(HTTP_CACHE_MAX_MB * 1024 * 1024)):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._con = sqlite3.connect(os.path.join(folder, "index.sqlite"), check_same_thread=False)
+        self._con.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT,
+                encoding TEXT,
+                body_file TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                body_size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._con.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._con.commit()
+
+    def _body_path(self, body_file):
+        return os.path.join(self.folder, body_file[:2], body_file)
+
+    def lookup(self, url):
+        """返回缓存条目（不含正文）及应附加的条件请求头。"""
+        with self._lock:
+            row = self._con.execute(
+                "SELECT etag, last_modified, headers, encoding, body_file, body_size FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if not row or not os.path.exists(self._body_path(row[4])):
+            return None, {}
+        entry = dict(zip(('etag', 'last_modified', 'headers', 'encoding', 'body_file', 'body_size'), row))
+        conditional = {}
+        if entry['etag']: conditional['If-None-Match'] = entry['etag']
+        if entry['last_modified']: conditional['If-Modified-Since'] = entry['last_modified']
+        return entry, conditional
+
+    def load_body(self, url, entry):
+        """服务器返回 304 时读取缓存正文，并记一次命中。"""
+        with open(self._body_path(entry['body_file']), 'rb') as f:
+            body = zlib.decompress(f.read())
+        with self._lock:
+            self._con.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._con.commit()
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += len(body)
+        return body
+
+    def store(self, url, headers, body, encoding=None):
+        """记一次未命中；响应带有校验器时保存到缓存。"""
+        with self._lock:
+            self.stats['misses'] += 1
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if not (etag or last_modified) or 'no-store' in headers.get('Cache-Control', ''):
+            return
+        body_file = hashlib.sha1(url.encode('utf-8')).hexdigest() + ".z"
+        compressed = zlib.compress(body, 6)
+        os.makedirs(os.path.dirname(self._body_path(body_file)), exist_ok=True)
+        with open(self._body_path(body_file), 'wb') as f:
+            f.write(compressed)
+        kept = json.dumps({name: headers[name] for name in _KEPT_HEADERS if name in headers})
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO entries (url, etag, last_modified, headers, encoding, body_file, size, body_size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, kept, encoding, body_file, len(compressed), len(body), time.time()),
+            )
+            self.stats['stored'] += 1
+            self._evict()
+            self._con.commit()
+
+    def _evict(self):
+        total = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, body_file, size in self._con.execute("SELECT url, body_file, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes: break
+            self._con.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if os.path.exists(path := self._body_path(body_file)): os.remove(path)
+            total -= size
+            self.stats['evicted'] += 1
+
+    def summary(self):
+        requests_total = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / requests_total * 100 if requests_total else 0
+        return (f"HTTP缓存: 命中 {self.stats['hits']} / 未命中 {self.stats['misses']} ({hit_rate:.1f}%), "
+                f"节省 {self.stats['bytes_saved'] / 1024 / 1024:.2f} MB, 淘汰 {self.stats['evicted']} 条")
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+
+if requests is not None:
+    class CachingSession(RateLimitedSession):
+        """在限速 Session 之上对普通 GET 请求发送条件请求，304 时返回缓存内容。
+
+        流式请求（图片下载）不经过缓存，图片由 image_store 负责去重。
+        """
+
+        def __init__(self, limiter=None, cache=None):
+            super().__init__(limiter)
+            self.cache = cache
+
+        def request(self, method, url, *args, **kwargs):
+            if self.cache is None or method.upper() != 'GET' or kwargs.get('stream'):
+                return super().request(method, url, *args, **kwargs)
+            entry, conditional = self.cache.lookup(url)
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **conditional}
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code == 304 and entry:
+                return self._from_cache(url, entry, response)
+            if response.status_code == 200:
+                self.cache.store(url, response.headers, response.content, response.encoding)
+            return response
+
+        def _from_cache(self, url, entry, not_modified):
+            response = requests.Response()
+            response.status_code = 200
+            response.reason = 'OK (cached)'
+            response.url = not_modified.url
+            response.request = not_modified.request
+            response.headers = CaseInsensitiveDict(json.loads(entry['headers'] or '{}'))
+            response.encoding = entry['encoding']
+            response._content = self.cache.load_body(url, entry)
+            response.from_cache = True
+            return response
@@ -0,0 +1,142 @@
+# image_store.py
+# 内容寻址的图片仓库：图片按 SHA-256 存一份，文章目录里的 images/image_N.ext 只是指向它的硬链接。
+# 已下载过的 URL 通过 progress.db 中的 image_index 表直接复用，不再重复请求。
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from database import get_image_record, add_image_record
+from metrics import stage_timer
+
+IMAGE_STORE_FOLDER = os.getenv('IMAGE_STORE_FOLDER', "South-Plus-Image-Store")
+IMAGE_THREADS = int(os.getenv('IMAGE_THREADS', '8'))
+
+
+def blob_path(root, sha256, ext):
+    return os.path.join(root, sha256[:2], f"{sha256}{ext}")
+
+
+def link_file(src, dest):
+    """硬链接 src 到 dest（已存在的 dest 会被替换），跨文件系统时退回复制。"""
+    if os.path.exists(dest): os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def link_tree(src_dir, dest_dir):
+    """把 src_dir 下的文件硬链接到 dest_dir（已存在的同名文件会被替换），跨文件系统时退回复制，返回文件数。"""
+    if not os.path.isdir(src_dir): return 0
+    os.makedirs(dest_dir, exist_ok=True)
+    count = 0
+    for name in os.listdir(src_dir):
+        src, dest = os.path.join(src_dir, name), os.path.join(dest_dir, name)
+        if not os.path.isfile(src): continue
+        link_file(src, dest)
+        count += 1
+    return count
+
+
+class ImageStore:
+    """共享的图片下载子系统：有界线程池 + 内容寻址存储 + URL 索引。"""
+
+    def __init__(self, root=IMAGE_STORE_FOLDER, max_workers=IMAGE_THREADS):
+        self.root = root
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {'downloaded': 0, 'reused': 0, 'bytes_downloaded': 0, 'bytes_reused': 0}
+        os.makedirs(root, exist_ok=True)
+
+    def blob_path(self, sha256, ext):
+        return blob_path(self.root, sha256, ext)
+
+    def _count(self, key, size):
+        with self._lock:
+            self.stats[key] += 1
+            self.stats['bytes_downloaded' if key == 'downloaded' else 'bytes_reused'] += size
+
+    def lookup(self, url):
+        """URL 已在仓库中且文件仍存在时返回 (sha256, ext)，否则返回 None。"""
+        if (record := get_image_record(url)) and os.path.exists(path := self.blob_path(*record)):
+            self._count('reused', os.path.getsize(path))
+            return tuple(record)
+        return None
+
+    def _store_stream(self, url, chunks, ext):
+        """把数据块流式写入临时文件并同时计算哈希，完成后移动到内容寻址路径。"""
+        digest, size = hashlib.sha256(), 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            sha256 = digest.hexdigest()
+            final_path = self.blob_path(sha256, ext)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.chmod(tmp_path, 0o644) # mkstemp 默认只有属主可读
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+        add_image_record(url, sha256, ext, size)
+        self._count('downloaded', size)
+        return sha256, ext
+
+    def put_bytes(self, url, content, ext):
+        """登记已经下载到内存中的图片（供异步引擎使用）。"""
+        return self._store_stream(url, [content], ext)
+
+    def _download(self, url, ext, session):
+        if record := self.lookup(url):
+            return record
+        with stage_timer('image_fetch'):
+            response = session.get(url, timeout=30, stream=True)
+            response.raise_for_status()
+            return self._store_stream(url, response.iter_content(chunk_size=8192), ext)
+
+    def submit(self, url, ext, session):
+        """提交一张图片的下载，返回 Future[(sha256, ext)]。同一 URL 的并发请求只会下载一次。"""
+        with self._lock:
+            shared = (future := self._inflight.get(url)) is not None
+            if not shared:
+                future = self._inflight[url] = self._executor.submit(self._download, url, ext, session)
+        # 回调可能在当前线程立即执行，必须在释放锁之后注册
+        if shared:
+            future.add_done_callback(self._count_shared)
+        else:
+            future.add_done_callback(lambda f: f.exception() and self._forget(url))
+        return future
+
+    def _count_shared(self, future):
+        if not future.exception():
+            self.record_shared(*future.result())
+
+    def record_shared(self, sha256, ext):
+        """统计一次本轮运行内的共享命中（另一篇文章已经下载过同一 URL）。"""
+        self._count('reused', os.path.getsize(self.blob_path(sha256, ext)))
+
+    def _forget(self, url):
+        # 失败的下载不缓存，让后续文章可以重试
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def link_into(self, sha256, ext, dest_path):
+        """在文章目录中为仓库里的图片创建硬链接，跨文件系统时退回复制。"""
+        link_file(self.blob_path(sha256, ext), dest_path)
+
+    def summary(self):
+        saved_mb = self.stats['bytes_reused'] / 1024 / 1024
+        return f"图片: 下载 {self.stats['downloaded']} 张, 复用 {self.stats['reused']} 张 (节省 {saved_mb:.2f} MB)"
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
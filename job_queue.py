@@ -0,0 +1,156 @@
+# job_queue.py
+# 持久化、可续跑的任务队列，保存在 progress.db 的 jobs 表中。
+#
+# 每个任务由 (kind, job_key) 唯一确定，kind 为 scrape / image / optimize。状态流转：
+#   pending --claim--> leased --complete--> done
+#                         \--fail--> pending（未超过重试上限）或 failed（放弃，需 --retry-failed 才会重试）
+# 租约到期仍未完成的任务（进程被杀、Actions 超时）会被下一次 claim 重新领取，因此运行可以从中断处继续。
+#
+# 分片：每个任务按 job_key 的稳定哈希分配到 shard_hash % N == i 的分片，--shard i/N 的进程只领取
+# 自己分片里的任务，多个进程或 Actions matrix 任务之间不会重叠。
+import hashlib
+import json
+import os
+import socket
+import time
+
+from database import get_store
+
+KIND_SCRAPE = 'scrape'
+KIND_IMAGE = 'image'
+KIND_OPTIMIZE = 'optimize'
+
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '1800'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+# 形如 "i/N" 的默认分片，i 从 0 开始
+SHARD = os.getenv('SHARD', '0/1')
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def parse_shard(value):
+    """把 'i/N' 解析为 (i, N)，要求 0 <= i < N。可直接用作 argparse 的 type。"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N: {value}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片编号超出范围: {value}")
+    return index, count
+
+
+def shard_hash(job_key):
+    return int(hashlib.sha1(job_key.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def in_shard(job_key, shard):
+    index, count = shard
+    return shard_hash(job_key) % count == index
+
+
+def enqueue_jobs(kind, jobs):
+    """登记一批任务，jobs 为 (job_key, payload, sort_key) 列表，返回登记的条数。
+
+    已存在的未完成任务保持原状（只更新 payload）；状态为 done 的任务说明之前的产物已不存在，重新置为 pending。
+    """
+    rows = [(kind, key, json.dumps(payload, ensure_ascii=False), sort_key, shard_hash(key)) for key, payload, sort_key in jobs]
+    if not rows: return 0
+    store = get_store()
+    store.write_many('''
+        INSERT INTO jobs (kind, job_key, payload, sort_key, shard_hash, state, attempts, updated_at)
+        VALUES (?, ?, ?, ?, ?, 'pending', 0, datetime('now'))
+        ON CONFLICT(kind, job_key) DO UPDATE SET
+            payload = excluded.payload,
+            sort_key = COALESCE(excluded.sort_key, jobs.sort_key),
+            state = CASE WHEN jobs.state = 'done' THEN 'pending' ELSE jobs.state END,
+            attempts = CASE WHEN jobs.state = 'done' THEN 0 ELSE jobs.attempts END,
+            error_reason = CASE WHEN jobs.state = 'done' THEN NULL ELSE jobs.error_reason END,
+            updated_at = excluded.updated_at
+    ''', rows)
+    store.flush()
+    return len(rows)
+
+
+def claim_jobs(kind, shard=(0, 1), limit=1, lease_seconds=JOB_LEASE_SECONDS, owner=WORKER_ID):
+    """领取本分片中最多 limit 个待处理或租约已过期的任务，返回 [(job_key, payload)]。"""
+    if limit <= 0: return []
+    now = time.time()
+    index, count = shard
+    rows = get_store().execute_now('''
+        UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = datetime('now')
+        WHERE rowid IN (
+            SELECT rowid FROM jobs
+            WHERE kind = ? AND shard_hash % ? = ?
+              AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+            ORDER BY sort_key, job_key
+            LIMIT ?
+        )
+        RETURNING job_key, payload, sort_key
+    ''', (owner, now + lease_seconds, kind, count, index, now, limit))
+    # RETURNING 不保证顺序，按领取时的排序重新排一次
+    rows.sort(key=lambda row: (row[2] is not None, row[2], row[0]))
+    return [(key, json.loads(payload)) for key, payload, _ in rows]
+
+
+def complete_job(kind, job_key):
+    get_store().write('''
+        UPDATE jobs SET state = 'done', error_reason = NULL, lease_owner = NULL, lease_expires = NULL, updated_at = datetime('now')
+        WHERE kind = ? AND job_key = ?
+    ''', (kind, job_key))
+
+
+def fail_job(kind, job_key, reason, max_attempts=JOB_MAX_ATTEMPTS):
+    """记录一次失败；未达到重试上限时放回 pending，否则标记为 failed。"""
+    get_store().write('''
+        UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+            error_reason = ?, lease_owner = NULL, lease_expires = NULL, updated_at = datetime('now')
+        WHERE kind = ? AND job_key = ?
+    ''', (max_attempts, reason, kind, job_key))
+
+
+def release_jobs(kind, owner=WORKER_ID):
+    """把本进程仍持有租约的任务放回 pending（不计入重试次数），用于提前退出时交还未处理的任务。"""
+    get_store().write('''
+        UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires = NULL,
+            updated_at = datetime('now')
+        WHERE kind = ? AND state = 'leased' AND lease_owner = ?
+    ''', (kind, owner))
+    get_store().flush()
+
+
+def retry_failed_jobs(kind, shard=(0, 1)):
+    """把本分片中已放弃的任务重新置为 pending 并清零重试次数，返回受影响的条数。"""
+    index, count = shard
+    return len(get_store().execute_now('''
+        UPDATE jobs SET state = 'pending', attempts = 0, updated_at = datetime('now')
+        WHERE kind = ? AND state = 'failed' AND shard_hash % ? = ?
+        RETURNING job_key
+    ''', (kind, count, index)))
+
+
+def count_jobs(kind, shard=None):
+    """按状态统计任务数，返回 {state: count}；shard 为 None 时统计所有分片。"""
+    get_store().flush()
+    if shard is None:
+        rows = get_store().query("SELECT state, COUNT(*) FROM jobs WHERE kind = ? GROUP BY state", (kind,))
+    else:
+        index, count = shard
+        rows = get_store().query("SELECT state, COUNT(*) FROM jobs WHERE kind = ? AND shard_hash % ? = ? GROUP BY state",
+                                 (kind, count, index))
+    return dict(rows)
+
+
+def unfinished_sort_keys(kind, shard=(0, 1)):
+    """本分片中尚未完成的任务（待处理、正在处理或已放弃）的 sort_key（例如尚未抓取成功的帖子ID）。
+
+    已放弃的任务本次不会被领取，却仍需要 --retry-failed 之后重新抓取，同样不能让高水位线越过它们。
+    """
+    get_store().flush()
+    index, count = shard
+    return [row[0] for row in get_store().query(
+        "SELECT sort_key FROM jobs WHERE kind = ? AND state IN ('pending', 'leased', 'failed') AND sort_key IS NOT NULL AND shard_hash % ? = ?",
+        (kind, count, index))]
+
+
+def describe_counts(counts):
+    return ", ".join(f"{state} {counts.get(state, 0)}" for state in ('pending', 'leased', 'done', 'failed'))
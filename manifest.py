@@ -0,0 +1,154 @@
+# manifest.py
+# 持久化的文件清单：记录各流水线阶段目录下每个条目的路径、大小、mtime 与内容哈希。
+#
+# 目录布局都是 <根目录>/<日期>/<条目>。刷新时先比较目录的 mtime：目录 mtime 没变说明其中
+# 没有增删条目，直接跳过 listdir；变了才列出该目录，并且只对大小或 mtime 变化的文件计算哈希。
+# 脚本自己写出的文件通过 record_entry() 直接登记，因此日常运行的开销与变化量成正比，而不是与归档总量成正比。
+# 只有 mtime 变了而大小不变的文件不重新计算哈希，只更新记录的 mtime：git checkout（例如 CI 中每次检出）
+# 会重置所有文件的 mtime，否则每次运行都要把整个目录重新哈希一遍。
+# 在仓库外手动修改了已有文件（且大小恰好不变）时，可设置 MANIFEST_VERIFY=1 做一次完整校验。
+import hashlib
+import os
+
+from database import get_store
+
+STAGE_RAW = 'raw'              # South-Plus-Raw-Data/<日期>/<文章文件夹>/data.json
+STAGE_SOURCE = 'source'        # South-Plus-Articles/<日期>/<文章>.md
+STAGE_OPTIMIZED = 'optimized'  # ai-optimized-articles/<日期>/<文章>.md
+
+MANIFEST_VERIFY = os.getenv('MANIFEST_VERIFY', '').lower() in ('1', 'true', 'yes')
+RAW_DATA_FILENAME = "data.json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_target(root, path, leaf_dirs):
+    """条目对应的实际文件：文件型条目是它本身，目录型条目（原始数据）是其中的 data.json。"""
+    target = os.path.join(root, *path.split('/'))
+    return os.path.join(target, RAW_DATA_FILENAME) if leaf_dirs else target
+
+
+def _entry_row(stage, root, path, leaf_dirs, st=None):
+    target = _entry_target(root, path, leaf_dirs)
+    st = st or os.stat(target)
+    parent, name = path.split('/', 1)
+    key = name if leaf_dirs else path
+    return (stage, path, parent, key, st.st_size, st.st_mtime_ns, file_sha256(target))
+
+
+_UPSERT_SQL = '''
+    INSERT INTO manifest_files (stage, path, parent, key, size, mtime_ns, content_hash, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+    ON CONFLICT(stage, path) DO UPDATE SET
+        size = excluded.size, mtime_ns = excluded.mtime_ns,
+        content_hash = excluded.content_hash, updated_at = excluded.updated_at
+'''
+
+
+def refresh_stage(stage, root, suffix='.md', leaf_dirs=False, verify=MANIFEST_VERIFY):
+    """增量刷新某个阶段的清单，返回 (新增或变化的条目数, 删除的条目数)。
+
+    leaf_dirs=True 时每个条目是一个文件夹（以其中的 data.json 为准），否则是以 suffix 结尾的文件。
+    """
+    store = get_store()
+    if not os.path.isdir(root):
+        removed = store.query_one("SELECT COUNT(*) FROM manifest_files WHERE stage = ?", (stage,))[0]
+        store.write("DELETE FROM manifest_files WHERE stage = ?", (stage,))
+        store.write("DELETE FROM manifest_dirs WHERE stage = ?", (stage,))
+        store.flush()
+        return 0, removed
+    known_dirs = dict(store.query("SELECT path, mtime_ns FROM manifest_dirs WHERE stage = ?", (stage,)))
+    upserts, touches, deletes, dir_updates, dir_deletes = [], [], [], [], []
+
+    root_mtime = os.stat(root).st_mtime_ns
+    if verify or known_dirs.get('') != root_mtime:
+        date_dirs = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+        # record_entry() 登记的条目所在目录不一定出现在 manifest_dirs 中，因此同时参考 manifest_files 的 parent
+        known_parents = set(known_dirs) | {row[0] for row in store.query("SELECT DISTINCT parent FROM manifest_files WHERE stage = ?", (stage,))}
+        for vanished in known_parents - set(date_dirs) - {''}:
+            deletes.extend(store.query("SELECT stage, path FROM manifest_files WHERE stage = ? AND parent = ?", (stage, vanished)))
+            if vanished in known_dirs:
+                dir_deletes.append((stage, vanished))
+        dir_updates.append((stage, '', root_mtime))
+    else:
+        date_dirs = sorted(d for d in known_dirs if d)
+
+    for date_dir in date_dirs:
+        abs_dir = os.path.join(root, date_dir)
+        try:
+            dir_mtime = os.stat(abs_dir).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if not verify and known_dirs.get(date_dir) == dir_mtime:
+            continue
+        known = {path: (size, mtime_ns, content_hash) for path, size, mtime_ns, content_hash in store.query(
+            "SELECT path, size, mtime_ns, content_hash FROM manifest_files WHERE stage = ? AND parent = ?", (stage, date_dir))}
+        seen = set()
+        for name in os.listdir(abs_dir):
+            if not leaf_dirs and not name.endswith(suffix):
+                continue
+            path = f"{date_dir}/{name}"
+            try:
+                st = os.stat(_entry_target(root, path, leaf_dirs))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            seen.add(path)
+            size, mtime_ns, content_hash = known.get(path, (None, None, None))
+            if (size, mtime_ns) == (st.st_size, st.st_mtime_ns):
+                continue
+            if not verify and size == st.st_size and content_hash:
+                touches.append((st.st_mtime_ns, stage, path))
+            else:
+                upserts.append(_entry_row(stage, root, path, leaf_dirs, st))
+        deletes.extend((stage, path) for path in set(known) - seen)
+        dir_updates.append((stage, date_dir, dir_mtime))
+
+    store.write_many(_UPSERT_SQL, upserts)
+    store.write_many("UPDATE manifest_files SET mtime_ns = ? WHERE stage = ? AND path = ?", touches)
+    store.write_many("DELETE FROM manifest_files WHERE stage = ? AND path = ?", deletes)
+    store.write_many("DELETE FROM manifest_dirs WHERE stage = ? AND path = ?", dir_deletes)
+    store.write_many("INSERT OR REPLACE INTO manifest_dirs (stage, path, mtime_ns) VALUES (?, ?, ?)", dir_updates)
+    store.flush()
+    return len(upserts), len(deletes)
+
+
+def record_entry(stage, root, path, leaf_dirs=False):
+    """登记脚本刚写出的条目（path 为相对 root 的 '<日期>/<名称>'），无需等下一次刷新。"""
+    try:
+        get_store().write(_UPSERT_SQL, _entry_row(stage, root, path.replace(os.sep, '/'), leaf_dirs))
+    except OSError as e:
+        print(f"[清单错误] 无法登记 {path}: {e}")
+
+
+def find_keys(stage, keys):
+    """在给定的 key 中找出清单里已存在的部分。"""
+    keys = list(keys)
+    found = set()
+    store = get_store()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(row[0] for row in store.query(
+            f"SELECT key FROM manifest_files WHERE stage = ? AND key IN ({placeholders})", (stage, *chunk)))
+    return found
+
+
+def get_entry_hash(stage, path):
+    row = get_store().query_one("SELECT content_hash FROM manifest_files WHERE stage = ? AND path = ?", (stage, path))
+    return row[0] if row else None
+
+
+def pending_paths(source_stage, target_stage):
+    """列出 source_stage 中存在、而 target_stage 中还没有对应路径的条目（按路径排序）。"""
+    return [row[0] for row in get_store().query('''
+        SELECT s.path FROM manifest_files s
+        LEFT JOIN manifest_files t ON t.stage = ? AND t.path = s.path
+        WHERE s.stage = ? AND t.path IS NULL
+        ORDER BY s.path
+    ''', (target_stage, source_stage))]
@@ -0,0 +1,234 @@
+# metrics.py
+# 运行指标：分阶段计时、按状态码划分的 HTTP 延迟直方图，以及字节数、重试次数、缓存命中等计数器。
+# 每次运行结束在 METRICS_FOLDER 下写出 <任务>.json 与 <任务>.prom（Prometheus textfile 格式，
+# 可直接交给 node_exporter 的 textfile collector）。
+# 设置 PROFILER=cprofile 或 PROFILER=pyinstrument 时，同时对整次运行做性能剖析，结果写在同一目录。
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+METRICS_ENABLED = os.getenv('METRICS', '1') != '0'
+METRICS_FOLDER = os.getenv('METRICS_FOLDER', "metrics")
+PROFILER = os.getenv('PROFILER', '').lower()
+METRIC_PREFIX = "splus"
+
+# 直方图的桶上限（秒），覆盖从本地文件写入到慢速详情页、AI 调用的范围
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count, self.sum, self.max = 0, 0.0, 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            total += n
+            result.append(('+Inf' if bound == math.inf else repr(float(bound)), total))
+        return result
+
+
+class Metrics:
+    """线程安全的指标注册表。直方图与计数器都以 (名称, 排序后的标签) 为键。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._stats_sources = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if (histogram := self._histograms.get(key)) is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_stats(self, prefix, stats):
+        """登记一个已有的统计字典（例如 HttpCache.stats），写报告时读取其当前值作为计数器。"""
+        with self._lock:
+            self._stats_sources[prefix] = stats
+
+    def _all_counters(self):
+        counters = dict(self._counters)
+        for prefix, stats in self._stats_sources.items():
+            for name, value in stats.items():
+                if isinstance(value, (int, float)):
+                    counters[self._key(f"{prefix}_{name}", {})] = value
+        return counters
+
+    def snapshot(self, job):
+        with self._lock:
+            histograms = {key: (h.cumulative(), h.count, h.sum, h.max) for key, h in self._histograms.items()}
+            counters = self._all_counters()
+        report = {
+            'job': job,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'duration_seconds': round(time.perf_counter() - self._started, 3),
+            'histograms': {},
+            'counters': {},
+        }
+        for (name, labels), (buckets, count, total, maximum) in sorted(histograms.items()):
+            report['histograms'].setdefault(name, []).append({
+                'labels': dict(labels), 'count': count, 'sum': round(total, 6), 'max': round(maximum, 6),
+                'mean': round(total / count, 6) if count else 0, 'buckets': dict(buckets),
+            })
+        for (name, labels), value in sorted(counters.items()):
+            report['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        return report
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_labels(labels):
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_prometheus(report):
+    """把 snapshot() 的结果渲染为 Prometheus textfile 格式。"""
+    job = {'job': report['job']}
+    lines = [f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+             f"{METRIC_PREFIX}_run_duration_seconds{_prom_labels(job)} {report['duration_seconds']}"]
+    for name, series in report['histograms'].items():
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# TYPE {metric} histogram")
+        for item in series:
+            labels = {**job, **item['labels']}
+            for bound, count in item['buckets'].items():
+                lines.append(f"{metric}_bucket{_prom_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{metric}_sum{_prom_labels(labels)} {item['sum']}")
+            lines.append(f"{metric}_count{_prom_labels(labels)} {item['count']}")
+    for name, series in report['counters'].items():
+        metric = f"{METRIC_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for item in series:
+            lines.append(f"{metric}{_prom_labels({**job, **item['labels']})} {item['value']}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+
+
+def observe(name, seconds, **labels):
+    if METRICS_ENABLED: _metrics.observe(name, seconds, **labels)
+
+
+def increment(name, amount=1, **labels):
+    if METRICS_ENABLED: _metrics.increment(name, amount, **labels)
+
+
+def register_stats(prefix, stats):
+    if METRICS_ENABLED: _metrics.register_stats(prefix, stats)
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """记录一个流水线阶段的耗时（stage_seconds 直方图），阶段内抛出异常时同样计时。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_seconds', time.perf_counter() - started, stage=stage)
+
+
+def observe_http(status, seconds, size=None):
+    """记录一次 HTTP 请求的延迟（按状态码划分）与响应字节数；请求异常时 status 传 'error'。"""
+    observe('http_request_seconds', seconds, status=status)
+    if size:
+        increment('http_response_bytes', size, status=status)
+
+
+def write_report(job, folder=None):
+    """写出本次运行的 JSON 与 Prometheus textfile 报告，返回 JSON 报告路径。"""
+    if not METRICS_ENABLED: return None
+    folder = folder or METRICS_FOLDER
+    report = _metrics.snapshot(job)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        json_path = os.path.join(folder, f"{job}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        # 先写临时文件再替换，避免 textfile collector 读到写了一半的文件
+        prom_path = os.path.join(folder, f"{job}.prom")
+        with open(prom_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(render_prometheus(report))
+        os.replace(prom_path + '.tmp', prom_path)
+    except OSError as e:
+        print(f"[指标错误] 无法写出指标报告: {e}")
+        return None
+    print(f"[指标] 运行指标已写入 {json_path}")
+    return json_path
+
+
+@contextlib.contextmanager
+def _profiler(job, folder):
+    if PROFILER == 'cprofile':
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(folder, exist_ok=True)
+            profile.dump_stats(path := os.path.join(folder, f"{job}.prof"))
+            print(f"[指标] cProfile 结果已写入 {path}（可用 python -m pstats 或 snakeviz 查看）")
+    elif PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("[警告] 未安装 pyinstrument，已跳过性能剖析。请运行: pip install pyinstrument")
+            yield
+            return
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            os.makedirs(folder, exist_ok=True)
+            with open(path := os.path.join(folder, f"{job}-profile.html"), 'w', encoding='utf-8') as f:
+                f.write(profile.output_html())
+            print(f"[指标] pyinstrument 结果已写入 {path}")
+    else:
+        yield
+
+
+def run_instrumented(job, func, folder=None):
+    """运行 func（脚本的 main），按 PROFILER 开启性能剖析；无论正常结束、异常还是 exit()，都会写出指标报告。"""
+    folder = folder or METRICS_FOLDER
+    try:
+        with _profiler(job, folder):
+            return func()
+    finally:
+        write_report(job, folder)
@@ -0,0 +1,115 @@
+# near_duplicates.py
+# 近似重复文章检测：对正文文本计算 64 位 SimHash 指纹，保存在 progress.db 的 fingerprints 表中。
+#
+# 查询不扫描全表：指纹被切成 4 段 16 位，每段各有索引。两个指纹的海明距离不超过 3 时，
+# 按抽屉原理至少有一段完全相同，因此只需取出任一段相同的候选，再精确计算海明距离。
+#
+# 命名空间沿用 manifest 的阶段名：raw 为抓取到的帖子（键为 日期/文件夹），
+# source 为优化脚本的输入文章（键为相对路径，ref 为其元数据缓存键）。
+import collections
+import hashlib
+import os
+import re
+
+from database import get_store
+from manifest import STAGE_RAW, STAGE_SOURCE
+
+# off（默认）：不检测；skip：跳过近似重复的文章；reuse：抓取照常保存并标记，优化时复用已有元数据。
+# skip 与 reuse 都会改变输出（少了文章，或标签与分类不再由 AI 单独生成），需要显式开启
+NEAR_DUP_POLICIES = ('off', 'skip', 'reuse')
+NEAR_DUP_POLICY = os.getenv('NEAR_DUP_POLICY', 'off').lower()
+# 海明距离阈值，分段索引只能保证找全距离不超过 SIMHASH_BANDS - 1 的指纹
+NEAR_DUP_DISTANCE = int(os.getenv('NEAR_DUP_DISTANCE', '3'))
+# 有效文字少于这么多时不计算指纹，太短的正文容易误判
+NEAR_DUP_MIN_CHARS = int(os.getenv('NEAR_DUP_MIN_CHARS', '200'))
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SHINGLE_SIZE = 3
+
+if NEAR_DUP_POLICY not in NEAR_DUP_POLICIES:
+    print(f"[警告] 未知的 NEAR_DUP_POLICY={NEAR_DUP_POLICY}，可选值为 {'/'.join(NEAR_DUP_POLICIES)}，本次不做近似重复检测。")
+    NEAR_DUP_POLICY = 'off'
+if not 0 <= NEAR_DUP_DISTANCE <= SIMHASH_BANDS - 1:
+    print(f"[警告] NEAR_DUP_DISTANCE={NEAR_DUP_DISTANCE} 超出分段索引能找全的范围 0-{SIMHASH_BANDS - 1}，改用 {SIMHASH_BANDS - 1}。")
+    NEAR_DUP_DISTANCE = min(max(NEAR_DUP_DISTANCE, 0), SIMHASH_BANDS - 1)
+
+_TAG = re.compile(r'<[^>]+>')
+_URL = re.compile(r'(?:https?|ftp)://\S+|magnet:\?\S+')
+_UNIT = re.compile(r'[⺀-￿]|[a-z0-9]+')
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def text_units(text):
+    """去掉 HTML 标签与链接后切成字词单元：中日韩文字逐字，其余按字母数字串。"""
+    return _UNIT.findall(_URL.sub(' ', _TAG.sub(' ', text)).lower())
+
+
+def simhash(text):
+    """按连续 SHINGLE_SIZE 个字词的组合计算 SimHash；有效文字不足 NEAR_DUP_MIN_CHARS 时返回 None。"""
+    units = text_units(text)
+    if sum(len(unit) for unit in units) < NEAR_DUP_MIN_CHARS:
+        return None
+    shingles = collections.Counter("\x1f".join(units[i:i + SHINGLE_SIZE]) for i in range(max(1, len(units) - SHINGLE_SIZE + 1)))
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def _bands(fingerprint):
+    return [fingerprint >> (_BAND_BITS * i) & _BAND_MASK for i in range(SIMHASH_BANDS)]
+
+
+def _to_signed(fingerprint):
+    # SQLite 的 INTEGER 是有符号 64 位
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def find_near_duplicate(namespace, key, fingerprint, max_distance=NEAR_DUP_DISTANCE):
+    """在命名空间中查找与指纹最接近的其它条目，返回 (键, 海明距离, ref) 或 None。"""
+    if fingerprint is None: return None
+    bands = _bands(fingerprint)
+    # 先提交排队中的写入，同一次运行中刚登记的指纹也能查到
+    get_store().flush()
+    # 每段单独走各自的索引再 UNION；写成一条 OR 查询时 SQLite 只会按 namespace 扫描
+    rows = get_store().query(" UNION ".join(
+        f"SELECT item_key, simhash, ref FROM fingerprints WHERE namespace = ? AND band{i} = ? AND item_key != ?"
+        for i in range(SIMHASH_BANDS)), [value for band in bands for value in (namespace, band, key)])
+    best = None
+    for other_key, other, ref in rows:
+        distance = hamming_distance(fingerprint, other & (1 << 64) - 1)
+        if distance <= max_distance and (best is None or distance < best[1]):
+            best = (other_key, distance, ref)
+    return best
+
+
+def record_fingerprint(namespace, key, fingerprint, ref=None):
+    if fingerprint is None: return
+    get_store().write(f'''
+        INSERT INTO fingerprints (namespace, item_key, simhash, {", ".join(f"band{i}" for i in range(SIMHASH_BANDS))}, ref, created_at)
+        VALUES (?, ?, ?, {", ".join("?" * SIMHASH_BANDS)}, ?, datetime('now'))
+        ON CONFLICT(namespace, item_key) DO UPDATE SET
+            simhash = excluded.simhash, {", ".join(f"band{i} = excluded.band{i}" for i in range(SIMHASH_BANDS))},
+            ref = COALESCE(excluded.ref, fingerprints.ref)
+    ''', (namespace, key, _to_signed(fingerprint), *_bands(fingerprint), ref))
+
+
+def check_post(key, content_html):
+    """（抓取阶段）在下载图片之前检查帖子是否与已抓取的帖子近似重复，返回 (指纹, 匹配或 None)。"""
+    if NEAR_DUP_POLICY == 'off': return None, None
+    fingerprint = simhash(content_html)
+    return fingerprint, find_near_duplicate(STAGE_RAW, key, fingerprint)
+
+
+def check_article(relative_path, text):
+    """（优化阶段）在调用 AI 之前检查文章是否与已优化的文章近似重复，返回 (指纹, 匹配或 None)。"""
+    if NEAR_DUP_POLICY == 'off': return None, None
+    fingerprint = simhash(text)
+    return fingerprint, find_near_duplicate(STAGE_SOURCE, relative_path, fingerprint)
@@ -0,0 +1,177 @@
+# notifier.py
+# PushPlus 通知的后台发送器：调用方只把消息放进队列立即返回，由后台线程发送。
+# 一个时间窗口内连续到达的消息合并为一条摘要（按标题分组），发送失败时带抖动指数退避重试，
+# 进程退出前把队列中剩余的消息全部发出（最多等待 NOTIFY_FLUSH_TIMEOUT 秒）。
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+
+from metrics import increment, register_stats
+
+PUSHPLUS_TOKEN = os.getenv('PUSHPLUS_TOKEN')
+PUSHPLUS_URL = 'http://www.pushplus.plus/send'
+# 第一条消息到达后再等待这么多秒，期间到达的消息合并为一条摘要
+NOTIFY_COALESCE_SECONDS = float(os.getenv('NOTIFY_COALESCE_SECONDS', '10'))
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '3'))
+NOTIFY_BACKOFF_BASE = float(os.getenv('NOTIFY_BACKOFF_BASE', '2'))
+NOTIFY_FLUSH_TIMEOUT = float(os.getenv('NOTIFY_FLUSH_TIMEOUT', '30'))
+NOTIFY_DIGEST_MAX = 20
+NOTIFY_REQUEST_TIMEOUT = 10
+
+_STOP = object()
+
+
+def merge_messages(batch):
+    """把 [(标题, 内容)] 合并为一条消息：单条原样返回，多条按标题分组、保持首次出现的顺序。"""
+    if len(batch) == 1:
+        return batch[0]
+    groups = {}
+    for title, content in batch:
+        groups.setdefault(title, []).append(content)
+    sections = []
+    for title, contents in groups.items():
+        heading = f"【{title}】" if len(contents) == 1 else f"【{title}】×{len(contents)}"
+        sections.append(heading + "\n" + "\n".join(contents))
+    return f"{batch[0][0]} 等 {len(batch)} 条通知", "\n\n".join(sections)
+
+
+class NotificationDispatcher:
+    """在后台线程中合并并发送 PushPlus 通知，notify() 从不等待网络 I/O（线程安全）。"""
+
+    def __init__(self, token, url=PUSHPLUS_URL, window=NOTIFY_COALESCE_SECONDS, max_retries=NOTIFY_MAX_RETRIES):
+        self.token = token
+        self.url = url
+        self.window = window
+        self.max_retries = max_retries
+        self.stats = {'queued': 0, 'sent': 0, 'digests': 0, 'retried': 0, 'failed': 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="pushplus-notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, title, content):
+        if self._closed: return
+        with self._lock:
+            self.stats['queued'] += 1
+        self._queue.put((title, content))
+
+    def flush(self, timeout=NOTIFY_FLUSH_TIMEOUT):
+        """立即发送已排队的消息（不再等待合并窗口），最多阻塞 timeout 秒。"""
+        if self._closed: return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=NOTIFY_FLUSH_TIMEOUT):
+        if self._closed: return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"[通知错误] 退出前 {timeout:.0f} 秒内未能发完全部通知，剩余通知已丢弃。")
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP: return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            batch, control = [item], None
+            deadline = time.monotonic() + self.window
+            while len(batch) < NOTIFY_DIGEST_MAX:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP or isinstance(item, threading.Event):
+                    control = item
+                    break
+                batch.append(item)
+            self._deliver(batch)
+            if control is _STOP:
+                self._drain()
+                return
+            if control is not None:
+                # flush 之前入队的消息可能还没取出，一并发送后再通知等待方
+                self._drain()
+                control.set()
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event): item.set()
+            elif item is not _STOP: batch.append(item)
+        for start in range(0, len(batch), NOTIFY_DIGEST_MAX):
+            self._deliver(batch[start:start + NOTIFY_DIGEST_MAX])
+
+    def _deliver(self, batch):
+        title, content = merge_messages(batch)
+        if len(batch) > 1: self.stats['digests'] += 1
+        data = {"token": self.token, "title": title, "content": content.replace('\n', '<br>'), "template": "html"}
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.post(self.url, json=data, timeout=NOTIFY_REQUEST_TIMEOUT)
+                if response.json().get('code') == 200:
+                    print(f"[通知] 成功发送到PushPlus: {title}")
+                    self.stats['sent'] += len(batch)
+                    increment('notifications', len(batch), status='sent')
+                    return
+                error = response.text
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+            if attempt < self.max_retries:
+                self.stats['retried'] += 1
+                time.sleep(random.uniform(0, NOTIFY_BACKOFF_BASE * 2 ** attempt))
+        self.stats['failed'] += len(batch)
+        increment('notifications', len(batch), status='failed')
+        print(f"[通知错误] PushPlus发送失败（已重试 {self.max_retries} 次）: {title}: {error}")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_notifier():
+    """返回进程共享的通知发送器；未配置 PUSHPLUS_TOKEN 时返回 None。"""
+    global _dispatcher
+    if not PUSHPLUS_TOKEN: return None
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher(PUSHPLUS_TOKEN)
+            register_stats('notifications', _dispatcher.stats)
+        return _dispatcher
+
+
+def send_pushplus_notification(title, content):
+    """把通知放进后台队列后立即返回；未配置 Token 时直接打印到日志。"""
+    if notifier := get_notifier():
+        notifier.notify(title, content)
+    else:
+        print(f"[通知] PushPlus Token未配置...\n--- {title} ---\n{content}\n---")
+
+
+def close_notifier():
+    """发送队列中剩余的通知并停止后台线程（进程退出时自动调用）。"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.close()
+            _dispatcher = None
+
+
+atexit.register(close_notifier)
@@ -15,49 +15,53 @@
 import os
 import re
 import json
-import time
-import google.generativeai as genai
+import argparse
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import google.generativeai as genai
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install google-generativeai")
+    exit()
+
+from database import add_processed_article, mark_processed_failed, get_cached_metadata, add_cached_metadata
+from gemini_client import GeminiClient, GEMINI_MODEL, GEMINI_OUTPUT_TOKENS, estimate_tokens
+from body_compactor import compact_body
+from near_duplicates import NEAR_DUP_POLICY, NEAR_DUP_DISTANCE, check_article, record_fingerprint, simhash, hamming_distance
+from image_store import link_tree
+from metrics import stage_timer, increment, register_stats, run_instrumented
+from manifest import STAGE_SOURCE, STAGE_OPTIMIZED, refresh_stage, record_entry, get_entry_hash, pending_paths
+from job_queue import (KIND_OPTIMIZE, JOB_MAX_ATTEMPTS, SHARD, parse_shard, enqueue_jobs, claim_jobs, complete_job, fail_job, release_jobs,
+                       retry_failed_jobs, count_jobs, describe_counts)
 
 # --- 用户配置 ---
 API_KEY = os.getenv("GEMINI_API_KEY")
+# 指定时改用 REST 传输访问该地址（例如 benchmarks/mock_gemini.py 的本地桩服务）
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 INPUT_FOLDER = "South-Plus-Articles"
 OUTPUT_FOLDER = "ai-optimized-articles"
-BATCH_SIZE = 30
+BATCH_SIZE = int(os.getenv('OPTIMIZE_BATCH_SIZE', '30'))
+# 同时进行的 AI 请求数；实际请求节奏由 gemini_client 中的 RPM/TPM 令牌桶控制
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '8'))
+# 批量模式：把多篇文章打包进同一个请求，单个请求的正文 token 预算与篇数上限如下
+GEMINI_BATCH_MODE = os.getenv('GEMINI_BATCH_MODE', '').lower() in ('1', 'true', 'yes')
+GEMINI_BATCH_TOKENS = int(os.getenv('GEMINI_BATCH_TOKENS', '24000'))
+GEMINI_BATCH_MAX_ITEMS = int(os.getenv('GEMINI_BATCH_MAX_ITEMS', '10'))
+gemini_client = None
 
 # --- AI 与模型配置 ---
 
-def configure_gemini():
-    """配置并验证Gemini API。"""
-    if not API_KEY:
-        print("[严重错误] 未找到 GEMINI_API_KEY 环境变量。请在 GitHub Secrets 中设置它。")
-        exit(1)
-    try:
-        genai.configure(api_key=API_KEY)
-        print("[信息] Gemini API 配置成功。")
-    except Exception as e:
-        print(f"[严重错误] Gemini API 配置失败: {e}")
-        exit(1)
-
-def generate_metadata_with_gemini(content: str):
-    """
-    调用 Gemini API，根据文章内容生成元数据。
-    """
-    model = genai.GenerativeModel('models/gemini-2.5-flash-lite')
-    generation_config = genai.GenerationConfig()
-
-    # ==============================================================================
-    # 【已修正】
-    # 添加 safety_settings 来放宽内容审查策略。
-    # 这可以防止因文章内容（如 GALGAME 相关术语）触发安全机制而导致请求失败。
-    # ==============================================================================
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-    ]
-
-    prompt = f"""
+# 修改提示词语义时递增版本号；提示词文本本身也参与缓存键，改动后旧缓存自动失效
+PROMPT_VERSION = "3"
+# 压缩前的正文截取长度（字符），仅作为对比基准：旧版本直接发送这部分原文
+PROMPT_BODY_LIMIT = 8000
+# 压缩后发送给模型的正文 token 预算，见 body_compactor.py
+PROMPT_BODY_TOKENS = int(os.getenv('GEMINI_BODY_TOKENS', '2000'))
+# 压缩后不足这么多 token 时（例如只有封面图与链接的帖子）改为发送截取的原文，避免模型面对空白正文凭空编造
+PROMPT_MIN_EXCERPT_TOKENS = int(os.getenv('GEMINI_MIN_EXCERPT_TOKENS', '50'))
+METADATA_PROMPT = """
     你是一名专业的SEO编辑和博客内容分析师。你的任务是根据下面提供的文章正文，生成优化的元数据（metadata）。
     请严格按照以下JSON格式返回结果，不要包含任何额外的解释或Markdown的代码块标记。
 
@@ -71,27 +75,201 @@ def generate_metadata_with_gemini(content: str):
 
     ---
     [文章正文内容开始]
-    {content[:8000]}
+    {content}
     [文章正文内容结束]
     ---
     """
+BATCH_METADATA_PROMPT = """
+    你是一名专业的SEO编辑和博客内容分析师。下面提供了多篇文章的正文，每篇都带有一个 id。
+    请分别为每一篇生成优化的元数据（metadata），以JSON数组返回，数组中每个元素对应一篇文章，
+    不要包含任何额外的解释或Markdown的代码块标记。每个元素的格式如下：
 
+    {{
+      "id": "与输入中相同的文章 id",
+      "title": "一个引人入胜、信息丰富、符合原文主旨的中文标题",
+      "seo_title": "一个为搜索引擎优化的、更简短的中文标题（建议60个汉字以内）",
+      "description": "一段吸引人的元描述（meta description），精准概括文章核心内容，用于搜索结果展示（建议150个汉字以内）",
+      "tags": ["5到8个最相关的关键词标签（列表形式）"],
+      "categories": ["文章的主要分类（通常只有一个）"]
+    }}
+
+    {articles}
+    """
+BATCH_ARTICLE_TEMPLATE = """---
+    [文章 id={id} 正文开始]
+    {content}
+    [文章 id={id} 正文结束]
+    ---"""
+# 单篇与批量提示词产出的元数据格式相同，共用一个指纹，因此两种模式的缓存可以互相复用
+PROMPT_FINGERPRINT = hashlib.sha256(
+    f"{PROMPT_VERSION}\n{METADATA_PROMPT}\n{BATCH_METADATA_PROMPT}\n{BATCH_ARTICLE_TEMPLATE}".encode('utf-8')).hexdigest()[:16]
+
+# ==============================================================================
+# 【已修正】
+# 添加 safety_settings 来放宽内容审查策略。
+# 这可以防止因文章内容（如 GALGAME 相关术语）触发安全机制而导致请求失败。
+# ==============================================================================
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+cache_stats = {'hits': 0, 'misses': 0}
+cache_stats_lock = threading.Lock()
+# 实际调用了 API 的文章数，以及按单篇模式估算的 token 数，用于对比两种模式的开销
+usage_stats = {'articles': 0, 'single_mode_tokens': 0, 'batched': 0, 'fallback': 0, 'near_duplicates': 0}
+# NEAR_DUP_POLICY=skip 时跳过原因的前缀；这类任务不再重试
+DUPLICATE_REASON = "近似重复"
+# 正文压缩前后的估算 token 数（压缩前按旧版本的截取方式计算）
+compaction_stats = {'articles': 0, 'raw_tokens': 0, 'sent_tokens': 0}
+
+def configure_gemini():
+    """配置并验证Gemini API。"""
+    global gemini_client
+    if not API_KEY:
+        print("[严重错误] 未找到 GEMINI_API_KEY 环境变量。请在 GitHub Secrets 中设置它。")
+        exit(1)
     try:
-        # 在API调用时传入 safety_settings
-        response = model.generate_content(
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=API_KEY, transport='rest', client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=API_KEY)
+        gemini_client = GeminiClient()
+        print("[信息] Gemini API 配置成功。")
+    except Exception as e:
+        print(f"[严重错误] Gemini API 配置失败: {e}")
+        exit(1)
+
+def prompt_excerpt(body: str):
+    """压缩正文（去掉链接地址、图片、引用标记与重复行，按 token 预算挑选段落），返回实际发送给模型的部分。
+    压缩后几乎没有剩余文字时退回旧版本的做法，直接截取原文。"""
+    excerpt = compact_body(body, PROMPT_BODY_TOKENS)
+    lines = body.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    truncated = "\n".join(line.rstrip() for line in lines).strip()[:PROMPT_BODY_LIMIT]
+    raw_tokens = estimate_tokens(truncated)
+    if estimate_tokens(excerpt) < PROMPT_MIN_EXCERPT_TOKENS:
+        print(f"  - 正文压缩后不足 {PROMPT_MIN_EXCERPT_TOKENS} tokens，改为发送截取的原文。")
+        excerpt = truncated
+    sent_tokens = estimate_tokens(excerpt)
+    with cache_stats_lock:
+        compaction_stats['articles'] += 1
+        compaction_stats['raw_tokens'] += raw_tokens
+        compaction_stats['sent_tokens'] += sent_tokens
+    if raw_tokens:
+        print(f"  - 正文压缩: {raw_tokens} -> {sent_tokens} tokens ({1 - sent_tokens / raw_tokens:.0%} 减少)")
+    return excerpt
+
+
+def metadata_cache_key(excerpt: str):
+    return hashlib.sha256(f"{GEMINI_MODEL}\n{PROMPT_FINGERPRINT}\n{excerpt}".encode('utf-8')).hexdigest()
+
+
+def lookup_cached_metadata(excerpt: str):
+    """查询元数据缓存，返回 (缓存键, 元数据或 None)，并统计命中情况。"""
+    cache_key = metadata_cache_key(excerpt)
+    cached = get_cached_metadata(cache_key)
+    with cache_stats_lock:
+        cache_stats['hits' if cached else 'misses'] += 1
+    if cached:
+        print("  - 命中元数据缓存，跳过 AI 调用。")
+    return cache_key, json.loads(cached) if cached else None
+
+
+def count_api_article(excerpt: str):
+    """记录一篇确实需要调用 API 的文章，以及按单篇模式估算的 token 数。"""
+    with cache_stats_lock:
+        usage_stats['articles'] += 1
+        usage_stats['single_mode_tokens'] += estimate_tokens(METADATA_PROMPT.format(content=excerpt)) + GEMINI_OUTPUT_TOKENS
+
+
+def read_front_matter(filepath: str):
+    """读取文章原有 front matter 中的单行字段（title、seo_title、description 等）。"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        match = re.match(r'^---\s*\n(.*?)\n---\s*\n', f.read(), re.DOTALL)
+    fields = {}
+    for line in match.group(1).split('\n') if match else []:
+        if field := re.match(r'^(\w+):\s*"?(.*?)"?\s*$', line):
+            if field.group(2): fields[field.group(1)] = field.group(2).replace('\\"', '"')
+    return fields
+
+
+def resolve_near_duplicate(relative_path: str, excerpt: str):
+    """
+    调用 AI 之前的近似重复检测，返回 (指纹, 复用的元数据或 None, 跳过原因或 None)。
+    复用时标签与分类取自相似文章，标题与描述仍用本文原有的 front matter，避免出现同名文章。
+    """
+    fingerprint, match = check_article(relative_path.replace(os.sep, '/'), excerpt)
+    if not match:
+        return fingerprint, None, None
+    other_key, distance, ref = match
+    increment('near_duplicates', stage='optimize')
+    with cache_stats_lock:
+        usage_stats['near_duplicates'] += 1
+    print(f"  - [近似重复] 与已优化的 {other_key} 相似（海明距离 {distance}），策略: {NEAR_DUP_POLICY}")
+    if NEAR_DUP_POLICY == 'skip':
+        return fingerprint, None, f"{DUPLICATE_REASON}: {other_key}"
+    cached = get_cached_metadata(ref) if ref else None
+    if not cached:
+        return fingerprint, None, None
+    own = read_front_matter(os.path.join(INPUT_FOLDER, relative_path))
+    reused = json.loads(cached)
+    reused.update({field: own[field] for field in ('title', 'seo_title', 'description') if own.get(field)})
+    return fingerprint, reused, None
+
+
+def remember_article(relative_path: str, fingerprint, cache_key: str, metadata):
+    """元数据有效时登记文章指纹，之后的近似重复文章可以复用这份元数据。"""
+    if isinstance(metadata, dict):
+        record_fingerprint(STAGE_SOURCE, relative_path.replace(os.sep, '/'), fingerprint, cache_key)
+
+
+def store_cached_metadata(cache_key: str, metadata):
+    if isinstance(metadata, dict):
+        add_cached_metadata(cache_key, GEMINI_MODEL, PROMPT_VERSION, json.dumps(metadata, ensure_ascii=False))
+    return metadata
+
+
+def generate_metadata_cached(relative_path: str, body: str):
+    """
+    先按 (模型, 提示词指纹, 正文摘录) 查询元数据缓存，再查找近似重复的已优化文章，都未命中时才调用 Gemini 并写入缓存。
+    返回 (元数据或 None, 跳过原因或 None)。
+    """
+    excerpt = prompt_excerpt(body)
+    cache_key, metadata = lookup_cached_metadata(excerpt)
+    if metadata is not None:
+        return metadata, None
+    fingerprint, metadata, skip_reason = resolve_near_duplicate(relative_path, excerpt)
+    if skip_reason:
+        return None, skip_reason
+    if metadata is None:
+        count_api_article(excerpt)
+        metadata = generate_metadata_with_gemini(excerpt)
+    remember_article(relative_path, fingerprint, cache_key, metadata)
+    return store_cached_metadata(cache_key, metadata), None
+
+
+def request_json(prompt: str, generation_config=None, output_tokens=GEMINI_OUTPUT_TOKENS):
+    """
+    发送提示词并把返回内容解析为 JSON；任何错误都打印后返回 None。
+    """
+    try:
+        # 在API调用时传入 safety_settings；限速、退避与重试由 gemini_client 负责
+        response = gemini_client.generate(
             prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
+            output_tokens=output_tokens,
+            generation_config=generation_config or genai.GenerationConfig(),
+            safety_settings=SAFETY_SETTINGS
         )
-        
+
         # 在访问 response.text 之前，先检查是否有内容返回
         if not response.candidates:
              print(f"  [AI错误] AI返回了空结果。可能是被其他未知原因阻止。反馈: {response.prompt_feedback}")
              return None
 
         cleaned_text = response.text.strip().replace("```json", "").replace("```", "").strip()
-        metadata = json.loads(cleaned_text)
-        return metadata
+        return json.loads(cleaned_text)
 
     except json.JSONDecodeError:
         print(f"  [AI错误] AI返回的不是有效的JSON格式。返回内容:\n{response.text}")
@@ -107,34 +285,101 @@ def generate_metadata_with_gemini(content: str):
         return None
 
 
-def process_file(filepath: str, relative_path: str, output_dir: str):
+def generate_metadata_with_gemini(content: str):
     """
-    处理单个 Markdown 文件：读取、调用AI、重写。
+    调用 Gemini API，根据文章内容生成元数据。content 应为 prompt_excerpt() 截取后的正文。
     """
-    print(f"\n[处理中] -> {relative_path}")
-
+    return request_json(METADATA_PROMPT.format(content=content))
+
+
+def is_valid_metadata(item):
+    """检查一条元数据的字段与类型是否齐全，批量结果中不合格的条目会退回单篇模式重做。"""
+    return (isinstance(item, dict)
+            and isinstance(item.get('title'), str) and item['title'].strip() != ''
+            and isinstance(item.get('seo_title', ''), str)
+            and isinstance(item.get('description'), str)
+            and all(isinstance(item.get(field, []), list) and all(isinstance(v, str) for v in item.get(field, []))
+                    for field in ('tags', 'categories')))
+
+
+def pack_batches(items):
+    """按正文 token 预算与篇数上限，把 (路径, 正文, 摘录) 列表依次装入若干批。"""
+    batches, current, current_tokens = [], [], 0
+    for item in items:
+        tokens = estimate_tokens(item[2])
+        if current and (current_tokens + tokens > GEMINI_BATCH_TOKENS or len(current) >= GEMINI_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def generate_metadata_batch(excerpts):
+    """
+    在一个请求中为多篇文章生成元数据，返回与 excerpts 对齐的列表，缺失或不合格的条目为 None。
+    """
+    articles = "\n".join(BATCH_ARTICLE_TEMPLATE.format(id=index, content=excerpt) for index, excerpt in enumerate(excerpts, 1))
+    result = request_json(BATCH_METADATA_PROMPT.format(articles=articles),
+                          generation_config=genai.GenerationConfig(response_mime_type="application/json"),
+                          output_tokens=GEMINI_OUTPUT_TOKENS * len(excerpts))
+    if isinstance(result, dict):
+        result = result.get('articles', [result])
+    by_id = {}
+    for item in result if isinstance(result, list) else []:
+        if isinstance(item, dict) and is_valid_metadata(item):
+            by_id.setdefault(str(item.get('id')).strip(), {k: v for k, v in item.items() if k != 'id'})
+    return [by_id.get(str(index)) for index in range(1, len(excerpts) + 1)]
+
+
+def load_article_body(filepath: str):
+    """读取 Markdown 文件并去掉原有的 front matter，失败或正文为空时返回 None。"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             full_content = f.read()
     except Exception as e:
         print(f"  [文件错误] 无法读取文件: {e}")
-        return
+        return None
 
     match = re.match(r'^---\s*\n(.*?)\n---\s*\n(.*)', full_content, re.DOTALL)
     body_content = match.group(2).strip() if match else full_content
 
     if not body_content:
         print("  [警告] 文章正文内容为空，已跳过。")
-        return
+        return None
+    return body_content
 
-    print("  - 正在调用 AI 生成元数据...")
-    new_metadata = generate_metadata_with_gemini(body_content)
+
+def process_file(filepath: str, relative_path: str, output_dir: str):
+    """
+    处理单个 Markdown 文件：读取、调用AI、重写。成功时返回 None，失败时返回失败原因。
+    """
+    print(f"\n[处理中] -> {relative_path}")
+
+    body_content = load_article_body(filepath)
+    if body_content is None:
+        return "无法读取文件或正文为空"
+
+    print("  - 正在生成元数据...")
+    new_metadata, skip_reason = generate_metadata_cached(relative_path, body_content)
+    if skip_reason:
+        print(f"  [跳过] {skip_reason}")
+        return skip_reason
 
     if not new_metadata:
         print("  [失败] 未能从 AI 获取有效的元数据，已跳过此文件。")
-        return
-    
-    print("  - 成功获取 AI 元数据，正在构建新文件...")
+        return "未能从 AI 获取有效的元数据"
+
+    return write_optimized_file(relative_path, output_dir, body_content, new_metadata)
+
+
+def write_optimized_file(relative_path: str, output_dir: str, body_content: str, new_metadata: dict):
+    """
+    用 AI 元数据构建新的 front matter，并写入输出目录中的镜像路径。成功时返回 None，失败时返回失败原因。
+    """
+    print(f"  - {relative_path}: 成功获取 AI 元数据，正在构建新文件...")
     
     title = new_metadata.get('title', 'AI Generated Title').replace('"', '\\"')
     seo_title = new_metadata.get('seo_title', '').replace('"', '\\"')
@@ -165,40 +410,169 @@ def process_file(filepath: str, relative_path: str, output_dir: str):
     os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
     
     try:
-        with open(output_filepath, 'w', encoding='utf-8') as f:
+        with stage_timer('file_write'), open(output_filepath, 'w', encoding='utf-8') as f:
             f.write(new_full_content)
         print(f"  [成功] 已将优化后的文件保存至: {output_filepath}")
+        # build_articles.py 生成的文章带有同名资源文件夹（本地图片），一并镜像到输出目录
+        link_tree(os.path.join(INPUT_FOLDER, os.path.splitext(relative_path)[0]), os.path.splitext(output_filepath)[0])
+        record_entry(STAGE_OPTIMIZED, output_dir, relative_path)
+        add_processed_article(relative_path, get_entry_hash(STAGE_SOURCE, relative_path.replace(os.sep, '/')))
     except Exception as e:
         print(f"  [文件错误] 无法写入新文件: {e}")
+        return f"无法写入新文件: {e}"
+    return None
+
+def process_files_batched(relative_paths, input_dir: str, output_dir: str, executor):
+    """
+    批量模式：缓存未命中的文章按 token 预算打包成多篇一请求，批量结果中缺失或不合格的文章退回单篇模式。
+    返回 {失败的路径: 失败原因}。
+    """
+    failures = {}
+    pending = []
+    fingerprints = {}
+    for relative_path in relative_paths:
+        body_content = load_article_body(os.path.join(input_dir, relative_path))
+        if body_content is None:
+            failures[relative_path] = "无法读取文件或正文为空"
+            continue
+        excerpt = prompt_excerpt(body_content)
+        cache_key, metadata = lookup_cached_metadata(excerpt)
+        if metadata is None:
+            fingerprints[relative_path], metadata, skip_reason = resolve_near_duplicate(relative_path, excerpt)
+            if skip_reason:
+                failures[relative_path] = skip_reason
+                continue
+            if metadata is None:
+                count_api_article(excerpt)
+                pending.append((relative_path, body_content, excerpt, cache_key))
+                continue
+            remember_article(relative_path, fingerprints[relative_path], cache_key, store_cached_metadata(cache_key, metadata))
+        if error := write_optimized_file(relative_path, output_dir, body_content, metadata):
+            failures[relative_path] = error
+
+    batches = pack_batches(pending)
+    if batches:
+        print(f"[信息] {len(pending)} 篇文章需要调用 AI，已打包为 {len(batches)} 个批量请求。")
+    fallback = []
+    futures = {executor.submit(generate_metadata_batch, [item[2] for item in batch]): batch for batch in batches}
+    for future in as_completed(futures):
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"  [错误] 批量请求发生意外错误: {e}")
+            results = [None] * len(futures[future])
+        for (relative_path, body_content, excerpt, cache_key), metadata in zip(futures[future], results):
+            if metadata is None:
+                fallback.append((relative_path, body_content, excerpt, cache_key))
+                continue
+            usage_stats['batched'] += 1
+            remember_article(relative_path, fingerprints[relative_path], cache_key, metadata)
+            if error := write_optimized_file(relative_path, output_dir, body_content, store_cached_metadata(cache_key, metadata)):
+                failures[relative_path] = error
+
+    if fallback:
+        print(f"[信息] {len(fallback)} 篇文章的批量结果缺失或无效，改为逐篇处理。")
+    usage_stats['fallback'] += len(fallback)
+
+    def process_single(relative_path, body_content, excerpt, cache_key):
+        if metadata := store_cached_metadata(cache_key, generate_metadata_with_gemini(excerpt)):
+            remember_article(relative_path, fingerprints[relative_path], cache_key, metadata)
+            return write_optimized_file(relative_path, output_dir, body_content, metadata)
+        print(f"  [失败] {relative_path}: 未能从 AI 获取有效的元数据，已跳过此文件。")
+        return "未能从 AI 获取有效的元数据"
+
+    futures = {executor.submit(process_single, *item): item[0] for item in fallback}
+    for future in as_completed(futures):
+        try:
+            if error := future.result():
+                failures[futures[future]] = error
+        except Exception as e:
+            print(f"  [错误] 逐篇处理时发生意外错误: {e}")
+            failures[futures[future]] = f"意外错误: {e.__class__.__name__}"
+    return failures
+
+
+def process_wave(relative_paths, executor):
+    """处理一组文章（批量模式或逐篇并发），返回 {失败的路径: 失败原因}。"""
+    if GEMINI_BATCH_MODE:
+        return process_files_batched(relative_paths, INPUT_FOLDER, OUTPUT_FOLDER, executor)
+    failures = {}
+    futures = {executor.submit(process_file, os.path.join(INPUT_FOLDER, relative_path), relative_path, OUTPUT_FOLDER): relative_path
+               for relative_path in relative_paths}
+    for future in as_completed(futures):
+        try:
+            if error := future.result():
+                failures[futures[future]] = error
+        except Exception as e:
+            print(f"  [错误] 处理 {futures[future]} 时发生意外错误: {e}")
+            failures[futures[future]] = f"意外错误: {e.__class__.__name__}"
+    return failures
+
+
+def split_near_duplicate_waves(relative_paths):
+    """
+    同一批次中彼此近似重复的文章分两轮处理：并发处理时它们都查不到对方的指纹，
+    放到第二轮后，第一轮生成的元数据已经登记，可以直接复用或跳过。
+    """
+    if NEAR_DUP_POLICY == 'off':
+        return [relative_paths]
+    leaders, followers, seen = [], [], []
+    for relative_path in relative_paths:
+        body_content = load_article_body(os.path.join(INPUT_FOLDER, relative_path))
+        fingerprint = simhash(compact_body(body_content, PROMPT_BODY_TOKENS)) if body_content else None
+        if fingerprint is not None and any(hamming_distance(fingerprint, other) <= NEAR_DUP_DISTANCE for other in seen):
+            followers.append(relative_path)
+            continue
+        leaders.append(relative_path)
+        if fingerprint is not None: seen.append(fingerprint)
+    if followers:
+        print(f"[信息] 本批次中有 {len(followers)} 篇文章与其它文章近似重复，将在第二轮处理。")
+    return [wave for wave in (leaders, followers) if wave]
+
+
+def usage_report():
+    """每篇文章的平均请求数与 token 数，并与单篇模式的估算开销对比。"""
+    articles = usage_stats['articles']
+    if not articles:
+        return "AI 用量: 本批次没有调用 API。"
+    report = (f"AI 用量: {articles} 篇文章调用了 API, 平均每篇 {gemini_client.stats['requests'] / articles:.2f} 次请求, "
+              f"{gemini_client.stats['tokens'] / articles:.0f} tokens")
+    if GEMINI_BATCH_MODE:
+        report += (f"\n  单篇模式估算: 每篇 1.00 次请求, {usage_stats['single_mode_tokens'] / articles:.0f} tokens | "
+                   f"批量成功 {usage_stats['batched']} 篇, 退回单篇 {usage_stats['fallback']} 篇")
+    return report
+
 
 def find_unprocessed_files(input_dir: str, output_dir: str):
-    """对比输入和输出目录，返回尚未处理的文件列表。"""
-    source_files = set()
-    for root, _, files in os.walk(input_dir):
-        for file in files:
-            if file.endswith(".md"):
-                relative_path = os.path.relpath(os.path.join(root, file), input_dir)
-                source_files.add(relative_path)
-
-    processed_files = set()
-    if os.path.exists(output_dir):
-        for root, _, files in os.walk(output_dir):
-            for file in files:
-                if file.endswith(".md"):
-                    relative_path = os.path.relpath(os.path.join(root, file), output_dir)
-                    processed_files.add(relative_path)
-
-    unprocessed_relative_paths = sorted(list(source_files - processed_files))
-    return unprocessed_relative_paths
+    """增量刷新输入和输出目录的清单，返回尚未处理的文件列表。
+
+    清单保存在 progress.db 中，只有 mtime 变化过的日期目录才会被重新列出。
+    """
+    refresh_stage(STAGE_SOURCE, input_dir)
+    refresh_stage(STAGE_OPTIMIZED, output_dir)
+    return [path.replace('/', os.sep) for path in pending_paths(STAGE_SOURCE, STAGE_OPTIMIZED)]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hexo Front Matter AI 优化")
+    parser.add_argument('--shard', type=parse_shard, default=parse_shard(SHARD),
+                        help="只处理任务队列中的第 i 个分片（共 N 个，i 从 0 开始），如 0/4")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="把已超过重试上限而放弃的文章重新放回队列")
+    return parser.parse_args()
 
 def main():
     """主执行函数"""
+    args = parse_args()
     print("="*60)
     print("Hexo Front Matter AI 优化脚本 v2.2 启动")
-    print(f"批次大小: {BATCH_SIZE} 篇")
+    print(f"批次大小: {BATCH_SIZE} 篇 | 并发数: {GEMINI_CONCURRENCY} | 批量模式: {'开启' if GEMINI_BATCH_MODE else '关闭'} | 分片: {args.shard[0]}/{args.shard[1]}")
     print("="*60)
 
     configure_gemini()
+    register_stats('gemini', gemini_client.stats)
+    register_stats('metadata_cache', cache_stats)
+    register_stats('ai_usage', usage_stats)
+    register_stats('body_compaction', compaction_stats)
 
     if not os.path.exists(INPUT_FOLDER):
         print(f"[严重错误] 输入文件夹 '{INPUT_FOLDER}' 不存在。")
@@ -215,18 +589,52 @@ def main():
         return
 
     print(f"[信息] 发现 {len(unprocessed_paths)} 篇未处理的文章。")
-    
-    files_to_process_this_run = unprocessed_paths[:BATCH_SIZE]
+
+    # 未处理的文章全部登记进持久化任务队列，本次只从自己的分片中领取一个批次
+    if args.retry_failed:
+        print(f"[信息] 已将 {retry_failed_jobs(KIND_OPTIMIZE, args.shard)} 篇放弃的文章重新放回队列。")
+    enqueue_jobs(KIND_OPTIMIZE, [(relative_path.replace(os.sep, '/'), None, None) for relative_path in unprocessed_paths])
+    pending = set(unprocessed_paths)
+    files_to_process_this_run = []
+    for job_key, _ in claim_jobs(KIND_OPTIMIZE, args.shard, BATCH_SIZE):
+        relative_path = job_key.replace('/', os.sep)
+        if relative_path in pending:
+            files_to_process_this_run.append(relative_path)
+        else:
+            complete_job(KIND_OPTIMIZE, job_key)  # 输出文件已由其它途径生成
     print(f"[信息] 本次运行将处理 {len(files_to_process_this_run)} 篇文章（一个批次）。")
     
-    for relative_path in files_to_process_this_run:
-        full_input_path = os.path.join(INPUT_FOLDER, relative_path)
-        process_file(full_input_path, relative_path, OUTPUT_FOLDER)
-        time.sleep(2)
-
-    remaining_count = len(unprocessed_paths) - len(files_to_process_this_run)
+    failures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY) as executor:
+            for wave in split_near_duplicate_waves(files_to_process_this_run):
+                failures.update(process_wave(wave, executor))
+
+        for relative_path in files_to_process_this_run:
+            job_key = relative_path.replace(os.sep, '/')
+            if relative_path in failures:
+                # 近似重复的文章直接放弃（--retry-failed 可重新处理），其它失败按重试上限重试
+                duplicate = failures[relative_path].startswith(DUPLICATE_REASON)
+                fail_job(KIND_OPTIMIZE, job_key, failures[relative_path], max_attempts=1 if duplicate else JOB_MAX_ATTEMPTS)
+                mark_processed_failed(relative_path, failures[relative_path])
+            else:
+                complete_job(KIND_OPTIMIZE, job_key)
+    finally:
+        release_jobs(KIND_OPTIMIZE)
+
+    queue_counts = count_jobs(KIND_OPTIMIZE, args.shard)
+    remaining_count = queue_counts.get('pending', 0) + queue_counts.get('leased', 0)
     print("\n" + "="*60)
     print("本批次任务已完成！")
+    print(gemini_client.summary())
+    print(usage_report())
+    if compaction_stats['articles']:
+        print(f"正文压缩: {compaction_stats['articles']} 篇, 输入 token 估算 {compaction_stats['raw_tokens']} -> "
+              f"{compaction_stats['sent_tokens']} (减少 {1 - compaction_stats['sent_tokens'] / compaction_stats['raw_tokens']:.0%})")
+    print(f"元数据缓存: 命中 {cache_stats['hits']} 次 (节省 {cache_stats['hits']} 次 API 调用), 未命中 {cache_stats['misses']} 次")
+    if usage_stats['near_duplicates']:
+        print(f"近似重复: {usage_stats['near_duplicates']} 篇 (策略: {NEAR_DUP_POLICY})")
+    print(f"任务队列（分片 {args.shard[0]}/{args.shard[1]}）: {describe_counts(queue_counts)}")
     if remaining_count > 0:
         print(f"仍有 {remaining_count} 篇文章等待处理。请在合并此 PR 后，再次运行工作流以处理下一批。")
     else:
@@ -234,4 +642,4 @@ def main():
     print("="*60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_instrumented('optimizer', main)
@@ -0,0 +1,309 @@
+# =================================================================================
+# South-Plus 本地图片优化脚本
+# 为 South-Plus-Raw-Data/<日期>/<文章>/images/ 中的原图生成限制尺寸与体积的 WebP（或 AVIF）版本
+# 和缩略图，并改写 data.json 正文中 <img> 的 src/srcset，之后由 build_articles.py 重新构建文章。
+#
+# - 并行：解码、缩放、编码是 CPU 密集操作，放在进程池中执行。
+# - 增量：生成的版本按原图 SHA-256 记录在 image_variants 表中，同一张图片（包括不同文章共用的图片）
+#   只编码一次；data.json 的内容哈希与上次处理后相同的文章直接跳过。
+# - 生成的文件同样存进内容寻址的图片仓库，文章目录中只是硬链接。
+# =================================================================================
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install pillow")
+    exit()
+
+from database import get_store
+from image_store import IMAGE_STORE_FOLDER, blob_path, link_file
+from manifest import STAGE_RAW, RAW_DATA_FILENAME, file_sha256, refresh_stage, record_entry
+from metrics import stage_timer, increment, run_instrumented
+from page_parser import make_soup, release_tree
+
+RAW_FOLDER = "South-Plus-Raw-Data"
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', str(os.cpu_count() or 2)))
+# webp 或 avif；当前 Pillow 不支持 AVIF 时退回 WebP
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp').lower()
+IMAGE_MAX_WIDTH = int(os.getenv('IMAGE_MAX_WIDTH', '1600'))
+IMAGE_THUMB_WIDTH = int(os.getenv('IMAGE_THUMB_WIDTH', '480'))
+# 单张图片的体积上限：依次降低质量，仍然超出时再逐步缩小尺寸
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_KB', '300')) * 1024
+IMAGE_QUALITY_STEPS = (82, 72, 62, 50)
+IMAGE_SIZES_ATTR = "(max-width: 800px) 100vw, 800px"
+IMAGE_PAGE_SIZE = 50
+
+FORMAT_EXTENSIONS = {'webp': '.webp', 'avif': '.avif'}
+FORMAT_OPTIONS = {'webp': {'method': 4}, 'avif': {'speed': 6}}
+
+
+def output_format():
+    if IMAGE_FORMAT == 'avif' and not features.check('avif'):
+        print("[警告] 当前 Pillow 不支持 AVIF 编码，改用 WebP。")
+        return 'webp'
+    return IMAGE_FORMAT if IMAGE_FORMAT in FORMAT_EXTENSIONS else 'webp'
+
+
+def variant_targets(fmt):
+    """(版本名, 最大宽度)；版本名包含格式与宽度，改变配置后会重新生成。"""
+    return [(f"{fmt}-{IMAGE_MAX_WIDTH}", IMAGE_MAX_WIDTH), (f"{fmt}-{IMAGE_THUMB_WIDTH}", IMAGE_THUMB_WIDTH)]
+
+
+def encode_capped(image, fmt):
+    """按质量阶梯编码，直到不超过 IMAGE_MAX_BYTES；最低质量仍超出时每次缩小到 80% 再试。"""
+    while True:
+        for quality in IMAGE_QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt.upper(), quality=quality, **FORMAT_OPTIONS[fmt])
+            if buffer.tell() <= IMAGE_MAX_BYTES:
+                return buffer.getvalue(), image.size
+        if image.width <= IMAGE_THUMB_WIDTH:
+            return buffer.getvalue(), image.size
+        image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+
+
+def write_blob(store_root, data, ext):
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_path(store_root, sha256, ext)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    return sha256
+
+
+def encode_variants(source_path, store_root, fmt, targets):
+    """（在工作进程中运行）为一张原图生成各个版本并写入图片仓库，返回 [(版本名, sha256, 宽, 高, 字节数)]。
+    动图原样保留，返回空列表。"""
+    with Image.open(source_path) as original:
+        if getattr(original, 'is_animated', False):
+            return []
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    results = []
+    for variant, max_width in targets:
+        resized = image
+        if image.width > max_width:
+            resized = image.resize((max_width, max(1, round(image.height * max_width / image.width))), Image.LANCZOS)
+        data, (width, height) = encode_capped(resized, fmt)
+        results.append((variant, write_blob(store_root, data, FORMAT_EXTENSIONS[fmt]), width, height, len(data)))
+    return results
+
+
+def load_variants(source_sha256s):
+    """查询已生成过的版本，返回 {原图 sha256: {版本名: (sha256, 宽, 高, 字节数)}}。"""
+    found = {}
+    source_sha256s = list(source_sha256s)
+    # 先提交排队中的写入，前几页刚登记的版本也能查到
+    get_store().flush()
+    for start in range(0, len(source_sha256s), 500):
+        chunk = source_sha256s[start:start + 500]
+        for source, variant, sha256, width, height, size in get_store().query(f'''
+            SELECT source_sha256, variant, sha256, width, height, size FROM image_variants
+            WHERE source_sha256 IN ({",".join("?" * len(chunk))})
+        ''', chunk):
+            found.setdefault(source, {})[variant] = (sha256, width, height, size)
+    return found
+
+
+def record_variants(source_sha256, variants):
+    get_store().write_many('''
+        INSERT INTO image_variants (source_sha256, variant, sha256, width, height, size, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(source_sha256, variant) DO UPDATE SET
+            sha256 = excluded.sha256, width = excluded.width, height = excluded.height, size = excluded.size
+    ''', [(source_sha256, *variant) for variant in variants])
+
+
+def iter_pending_articles(force=False):
+    """按路径分页列出 data.json 在上次图片优化之后有变化（或从未处理过）的文章。"""
+    last_path = ''
+    while True:
+        rows = get_store().query('''
+            SELECT r.path FROM manifest_files r
+            LEFT JOIN image_passes p ON p.raw_path = r.path
+            WHERE r.stage = ? AND r.path > ? AND (? OR p.raw_hash IS NULL OR p.raw_hash != r.content_hash)
+            ORDER BY r.path LIMIT ?
+        ''', (STAGE_RAW, last_path, force, IMAGE_PAGE_SIZE))
+        if rows: yield [row[0] for row in rows]
+        if len(rows) < IMAGE_PAGE_SIZE: return
+        last_path = rows[-1][0]
+
+
+def local_images(article_dir, record):
+    """正文中引用的、尚未优化过（没有 srcset）的本地图片文件名。"""
+    soup = make_soup(record.get('content_html', ''))
+    try:
+        names = {img['src'][len('images/'):] for img in soup.find_all('img', src=True)
+                 if img['src'].startswith('images/') and not img.get('srcset')}
+    finally:
+        release_tree(soup)
+    return [name for name in sorted(names) if os.path.isfile(os.path.join(article_dir, 'images', name))]
+
+
+def rewrite_article(raw_root, raw_path, record, images, variants, targets, store_root):
+    """链接生成的版本并改写正文，返回 (原图总字节, 优化后总字节)。体积没有变小的图片保持原样。"""
+    article_dir = os.path.join(raw_root, *raw_path.split('/'))
+    full_variant, thumb_variant = (variant for variant, _ in targets)
+    ext = FORMAT_EXTENSIONS[full_variant.split('-')[0]]
+    replacements, bytes_before, bytes_after = {}, 0, 0
+    for name, sha256 in images.items():
+        original_size = os.path.getsize(os.path.join(article_dir, 'images', name))
+        bytes_before += original_size
+        found = variants.get(sha256, {})
+        if full_variant not in found or found[full_variant][3] >= original_size:
+            bytes_after += original_size
+            continue
+        stem = os.path.splitext(name)[0]
+        full_sha, width, height, size = found[full_variant]
+        full_name = f"{stem}{ext}"
+        link_file(blob_path(store_root, full_sha, ext), os.path.join(article_dir, 'images', full_name))
+        srcset = [f"images/{full_name} {width}w"]
+        if thumb_variant in found and found[thumb_variant][1] < width:
+            thumb_sha, thumb_width = found[thumb_variant][:2]
+            thumb_name = f"{stem}-{thumb_width}w{ext}"
+            link_file(blob_path(store_root, thumb_sha, ext), os.path.join(article_dir, 'images', thumb_name))
+            srcset.insert(0, f"images/{thumb_name} {thumb_width}w")
+        replacements[f"images/{name}"] = {'src': f"images/{full_name}", 'srcset': ", ".join(srcset),
+                                          'sizes': IMAGE_SIZES_ATTR, 'width': str(width), 'height': str(height), 'loading': 'lazy'}
+        bytes_after += size
+
+    if replacements:
+        soup = make_soup(record['content_html'])
+        try:
+            for img in soup.find_all('img', src=True):
+                if attrs := replacements.get(img['src']):
+                    img.attrs.update(attrs)
+            record['content_html'] = str(soup.find('div', id='read_tpc') or soup.body or soup)
+        finally:
+            release_tree(soup)
+        record_path = os.path.join(article_dir, RAW_DATA_FILENAME)
+        tmp_path = record_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, record_path)
+        # 原地改写不会改变日期目录的 mtime，需要手动登记
+        record_entry(STAGE_RAW, raw_root, raw_path, leaf_dirs=True)
+    return bytes_before, bytes_after
+
+
+def record_pass(raw_root, raw_path, bytes_before, bytes_after):
+    raw_hash = file_sha256(os.path.join(raw_root, *raw_path.split('/'), RAW_DATA_FILENAME))
+    get_store().write('''
+        INSERT INTO image_passes (raw_path, raw_hash, bytes_before, bytes_after, updated_at) VALUES (?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(raw_path) DO UPDATE SET raw_hash = excluded.raw_hash, bytes_before = excluded.bytes_before,
+            bytes_after = excluded.bytes_after, updated_at = excluded.updated_at
+    ''', (raw_path, raw_hash, bytes_before, bytes_after))
+
+
+def submit_page(executor, page, raw_root, store_root, fmt, targets, in_flight):
+    """读取一页文章并哈希其中的图片，把还没有生成版本的图片去重后交给进程池，返回 (文章列表, 已知版本, 本页等待的任务)。
+    前一页已提交、仍在编码的图片（in_flight）直接等待同一个任务，不重复提交。"""
+    pending = []
+    for raw_path in page:
+        article_dir = os.path.join(raw_root, *raw_path.split('/'))
+        try:
+            with open(os.path.join(article_dir, RAW_DATA_FILENAME), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  [错误] 无法读取 {raw_path}: {e}")
+            continue
+        names = local_images(article_dir, record)
+        pending.append((raw_path, record, {name: file_sha256(os.path.join(article_dir, 'images', name)) for name in names}))
+    known = load_variants({sha256 for _, _, images in pending for sha256 in images.values()})
+    wanted = {variant for variant, _ in targets}
+    jobs = {}
+    for raw_path, _, images in pending:
+        for name, sha256 in images.items():
+            if sha256 in jobs or wanted <= known.get(sha256, {}).keys():
+                continue
+            if sha256 not in in_flight:
+                source = os.path.join(raw_root, *raw_path.split('/'), 'images', name)
+                in_flight[sha256] = executor.submit(encode_variants, source, store_root, fmt, targets)
+            jobs[sha256] = in_flight[sha256]
+    return pending, known, jobs
+
+
+def finish_page(page_state, raw_root, store_root, targets, in_flight):
+    """等待一页的编码任务并改写其中的文章，返回 (文章数, 新编码的图片数, 原图总字节, 优化后总字节)。"""
+    pending, known, jobs = page_state
+    articles = encoded = total_before = total_after = 0
+    for sha256, future in jobs.items():
+        try:
+            variants = future.result()
+        except Exception as e:
+            print(f"  [警告] 图片 {sha256[:12]} 无法处理，保留原图: {e.__class__.__name__}: {e}")
+            variants = []
+        # 多页共用的任务只由最先完成的一页登记
+        if in_flight.pop(sha256, None) is future:
+            record_variants(sha256, variants)
+            encoded += bool(variants)
+        known[sha256] = {variant: tuple(rest) for variant, *rest in variants}
+
+    for raw_path, record, images in pending:
+        before, after = rewrite_article(raw_root, raw_path, record, images, known, targets, store_root)
+        record_pass(raw_root, raw_path, before, after)
+        articles += 1
+        total_before += before
+        total_after += after
+        increment('image_bytes_saved', before - after)
+        if images:
+            print(f"  √ {raw_path}: {len(images)} 张图片, {before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+                  f"(节省 {(before - after) / before if before else 0:.0%})")
+    return articles, encoded, total_before, total_after
+
+
+def optimize(raw_root=RAW_FOLDER, store_root=IMAGE_STORE_FOLDER, workers=IMAGE_WORKERS, force=False):
+    """增量处理全部待优化的文章，返回 (文章数, 新编码的图片数, 原图总字节, 优化后总字节)。
+
+    流水线：先提交下一页的编码任务，再等待并改写当前页，父进程哈希与改写文章时进程池不会闲着。
+    """
+    with stage_timer('manifest_refresh'):
+        refresh_stage(STAGE_RAW, raw_root, leaf_dirs=True)
+    fmt = output_format()
+    targets = variant_targets(fmt)
+    totals, in_flight, previous = [0, 0, 0, 0], {}, None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for page in iter_pending_articles(force):
+            current = submit_page(executor, page, raw_root, store_root, fmt, targets, in_flight)
+            if previous is not None:
+                totals = [a + b for a, b in zip(totals, finish_page(previous, raw_root, store_root, targets, in_flight))]
+            previous = current
+        if previous is not None:
+            totals = [a + b for a, b in zip(totals, finish_page(previous, raw_root, store_root, targets, in_flight))]
+    get_store().flush()
+    return tuple(totals)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="为抓取的本地图片生成限制尺寸的 WebP/AVIF 版本并改写正文")
+    parser.add_argument('--workers', type=int, default=IMAGE_WORKERS, help="编码进程数")
+    parser.add_argument('--force', action='store_true', help="忽略处理记录，重新检查全部文章")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(RAW_FOLDER):
+        print(f"[严重错误] 原始数据文件夹 '{RAW_FOLDER}' 不存在。")
+        exit(1)
+    start = time.time()
+    articles, encoded, before, after = optimize(workers=args.workers, force=args.force)
+    print(f"图片优化完成：处理 {articles} 篇文章，新编码 {encoded} 张图片，"
+          f"{before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB，耗时 {time.time() - start:.2f} 秒。")
+
+
+if __name__ == "__main__":
+    run_instrumented('images', main)
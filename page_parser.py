@@ -0,0 +1,58 @@
+# page_parser.py
+# HTML 解析后端选择：安装了 lxml 时使用 BeautifulSoup 的 lxml 树构建器（比 html.parser 快数倍），
+# 否则回退到标准库的 html.parser。可通过 HTML_PARSER 环境变量强制指定后端。
+import importlib.util
+import os
+import re
+
+try:
+    from bs4 import BeautifulSoup, SoupStrainer
+except ImportError as e:
+    print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install beautifulsoup4")
+    exit()
+
+# 按优先级排列的可选后端：(BeautifulSoup 特性名, 提供它的模块)
+_BACKENDS = (('lxml', 'lxml'), ('html.parser', None))
+
+
+def available_backends():
+    return [name for name, module in _BACKENDS if module is None or importlib.util.find_spec(module) is not None]
+
+
+def _resolve_backend(requested):
+    backends = available_backends()
+    if requested in (None, '', 'auto'):
+        return backends[0]
+    if requested not in backends:
+        print(f"[警告] HTML 解析后端 '{requested}' 不可用，改用 {backends[0]}。")
+        return backends[0]
+    return requested
+
+
+PARSER_BACKEND = _resolve_backend(os.getenv('HTML_PARSER', 'auto'))
+
+# 索引页只需要帖子表格的行与分页信息，其余节点（导航、侧栏、脚本）不建树
+INDEX_PAGE_STRAINER = SoupStrainer(['tr', 'li'])
+
+
+def make_soup(markup, parse_only=None, backend=None):
+    """用选定的后端解析 HTML；parse_only 为 SoupStrainer 时只构建匹配的节点。"""
+    return BeautifulSoup(markup, backend or PARSER_BACKEND, parse_only=parse_only)
+
+
+def make_index_soup(markup, backend=None):
+    return make_soup(markup, INDEX_PAGE_STRAINER, backend)
+
+
+def release_tree(node):
+    """拆除节点所在的整棵解析树。bs4 节点之间互相引用，decompose() 打断这些循环引用，内存可立即归还而不必等待垃圾回收。"""
+    root = node
+    while root.parent is not None:
+        root = root.parent
+    root.decompose()
+
+
+def extract_thread_id(href):
+    """从 read.php?tid-12345.html / read.php?tid=12345 形式的链接中提取帖子ID。"""
+    match = re.search(r'tid[-=](\d+)', href or '')
+    return int(match.group(1)) if match else None
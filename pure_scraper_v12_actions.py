@@ -2,25 +2,46 @@
 # South-Plus to JSON Data Scraper v12.0 (GitHub Actions, Stateful)
 # v12.0 更新：集成SQLite；强化Headers和增加随机延迟以应对403错误。
 # =================================================================================
-import os, re, time, json, random
-from datetime import datetime, timezone
-from urllib.parse import urljoin, urlparse
-from database import initialize_database, add_scraped_article, get_scraped_articles
+import os, re, time, argparse
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from database import (initialize_database, mark_article_failed, find_scraped_articles,
+                      count_articles, get_forum_high_water_mark, set_forum_high_water_mark)
+from manifest import STAGE_RAW, refresh_stage, find_keys
+from metrics import stage_timer, increment, register_stats, run_instrumented
+from raw_archive import read_raw_record, write_raw_record
+from job_queue import (KIND_SCRAPE, KIND_IMAGE, SHARD, parse_shard, in_shard, enqueue_jobs, claim_jobs, complete_job,
+                       fail_job, release_jobs, retry_failed_jobs, count_jobs, unfinished_sort_keys, describe_counts)
 try:
-    import requests
-    from bs4 import BeautifulSoup
     import concurrent.futures
+    from page_parser import make_soup, make_index_soup, release_tree, extract_thread_id
+    from scrape_common import (BASE_URL, DETAIL_RETRY_DELAY, sanitize_filename, collect_image_jobs, find_buy_url, parse_article_details,
+                               article_source_url, build_article_record, check_duplicate_post, save_article_record)
+    from rate_limiter import RateLimiter
+    from http_cache import HttpCache, CachingSession
+    from image_store import ImageStore
+    from notifier import send_pushplus_notification
 except ImportError as e:
     print(f"[严重错误] 缺少必要的库: {e.name}\n请运行: pip install {e.name}")
     exit()
 
-PUSHPLUS_TOKEN = os.getenv('PUSHPLUS_TOKEN')
 SPLUS_COOKIE = os.getenv('SPLUS_COOKIE')
 FID = os.getenv('FID', '221')
 MAX_THREADS = int(os.getenv('MAX_THREADS', '5'))
+SCAN_THREADS = int(os.getenv('SCAN_THREADS', '3'))
+# 全局请求预算：索引页、详情页、图片下载共用，每秒最多 REQUESTS_PER_SECOND 个请求
+REQUESTS_PER_SECOND = float(os.getenv('REQUESTS_PER_SECOND', '1.5'))
+REQUEST_BURST = int(os.getenv('REQUEST_BURST', '3'))
+REQUEST_JITTER = float(os.getenv('REQUEST_JITTER', '0.5'))
+FULL_RESCAN = os.getenv('FULL_RESCAN', '').lower() in ('1', 'true', 'yes')
+# 抓取引擎：threads（requests + 线程池）或 async（httpx + asyncio，见 async_scraper.py）
+SCRAPER_ENGINE = os.getenv('SCRAPER_ENGINE', 'threads')
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', '20'))
+PER_HOST_CONCURRENCY = int(os.getenv('PER_HOST_CONCURRENCY', '8'))
+# 每次从任务队列补抓的失败图片数上限
+IMAGE_RETRY_LIMIT = int(os.getenv('IMAGE_RETRY_LIMIT', '200'))
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE', '1') != '0'
 OUTPUT_PARENT_FOLDER = "South-Plus-Raw-Data"
-BASE_URL = "https://www.south-plus.net/"
-PUSHPLUS_URL = 'http://www.pushplus.plus/send'
 REPORTING_BATCH_SIZE = 50
 
 # 【核心改动】强化请求头
@@ -38,31 +59,6 @@ HEADERS = {
     'Priority': 'u=0, i',
 }
 
-def send_pushplus_notification(title, content):
-    if not PUSHPLUS_TOKEN:
-        print(f"[通知] PushPlus Token未配置...\n--- {title} ---\n{content}\n---")
-        return
-    try:
-        data = {"token": PUSHPLUS_TOKEN, "title": title, "content": content.replace('\n', '<br>'), "template": "html"}
-        response = requests.post(PUSHPLUS_URL, json=data, timeout=10)
-        if response.json()['code'] == 200: print(f"[通知] 成功发送到PushPlus: {title}")
-        else: print(f"[通知错误] PushPlus发送失败: {response.text}")
-    except Exception as e:
-        print(f"[通知错误] 发送PushPlus通知时出现异常: {e}")
-
-def sanitize_filename(filename):
-    safe_name = re.sub(r'[\\/*?:"<>|]', "", filename).strip()
-    return safe_name[:150]
-
-def get_existing_article_folders(parent_folder):
-    existing_folders = set()
-    if not os.path.exists(parent_folder): return existing_folders
-    for date_folder in os.listdir(parent_folder):
-        date_path = os.path.join(parent_folder, date_folder)
-        if os.path.isdir(date_path):
-            for article_folder in os.listdir(date_path): existing_folders.add(article_folder)
-    return existing_folders
-
 def parse_raw_cookie_string(cookie_string):
     cookies = {}
     if not cookie_string: return cookies
@@ -76,113 +72,204 @@ def parse_raw_cookie_string(cookie_string):
         print(f"[错误] 解析Cookie字符串失败: {e}")
     return cookies
 
-def download_images_and_update_html(html_content, asset_folder, session, article_title):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    img_tags = soup.find_all('img')
-    if not img_tags: return html_content, []
-    print(f"      - {article_title[:15]}...: 本地化 {len(img_tags)} 张图片...")
+def download_images_and_update_html(content_node, asset_folder, session, article_title, image_store):
+    """在详情页已解析好的正文节点上直接改写图片地址，返回 (正文HTML, 失败列表)，不再二次解析。"""
+    image_jobs = collect_image_jobs(content_node)
+    if not image_jobs: return str(content_node), []
+    print(f"      - {article_title[:15]}...: 本地化 {len(image_jobs)} 张图片...")
     os.makedirs(asset_folder, exist_ok=True)
+    # 先把整篇文章的图片一次性交给共享下载池，再逐个等待结果并链接到文章目录
+    futures = [image_store.submit(full_url, os.path.splitext(safe_filename)[1], session) for _, full_url, safe_filename in image_jobs]
     failed_images = []
-    for i, img in enumerate(img_tags, 1):
-        original_url = img.get('src')
-        if not original_url: continue
-        full_url = urljoin(BASE_URL, original_url) if not original_url.startswith(('http://', 'https://')) else original_url
+    for (img, full_url, safe_filename), future in zip(image_jobs, futures):
         try:
-            _, ext = os.path.splitext(os.path.basename(urlparse(full_url).path))
-            if not ext: ext = ".jpg"
-            safe_filename = f"image_{i}{ext}"
-            local_filepath = os.path.join(asset_folder, safe_filename)
-            img_response = session.get(full_url, timeout=30, stream=True)
-            img_response.raise_for_status()
-            with open(local_filepath, 'wb') as f:
-                for chunk in img_response.iter_content(chunk_size=8192): f.write(chunk)
+            sha256, ext = future.result()
+            image_store.link_into(sha256, ext, os.path.join(asset_folder, safe_filename))
             img['src'] = f"images/{safe_filename}"
         except Exception as e:
-            failed_images.append({'url': full_url, 'reason': f"下载失败: {e.__class__.__name__}"})
-    return str(soup), failed_images
+            failed_images.append({'url': full_url, 'src': img.get('src'), 'filename': safe_filename,
+                                  'reason': f"下载失败: {e.__class__.__name__}"})
+    return str(content_node), failed_images
 
 def get_full_article_details(session, url):
     for attempt in range(3):
         try:
-            response = session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
-            if buy_button := soup.select_one("input[onclick*='job.php?action=buytopic']"):
-                buy_url_full = urljoin(BASE_URL, buy_button['onclick'].split("'")[1])
-                send_pushplus_notification("Debug: 购买文章", f"正在尝试购买文章：{url}")
-                session.get(buy_url_full, timeout=30).raise_for_status()
-                time.sleep(2) # 购买后等待一下
+            with stage_timer('detail_fetch'):
                 response = session.get(url, timeout=30)
                 response.raise_for_status()
                 response.encoding = 'utf-8'
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-            content_div = soup.find('div', id='read_tpc')
-            if not content_div or not content_div.get_text(strip=True):
-                return {'error': "帖子内容为空或无法解析"}
-
-            content_html = str(content_div)
-            author = (tag.get_text(strip=True) if (tag := soup.select_one('th.r_two strong')) else '未知作者')
-            post_date_str = (tag.get_text(strip=True) if (tag := soup.select_one('div.tiptop span.fl.gray')) else datetime.now().strftime('%Y-%m-%d %H:%M'))
-            cover_image_url = urljoin(url, tag['src']) if (tag := content_div.find('img')) and tag.get('src') else None
-            return {'content_html': content_html, 'author': author, 'post_date': post_date_str, 'cover_image_url': cover_image_url}
+                soup = make_soup(response.text)
+            if buy_url_full := find_buy_url(soup):
+                with stage_timer('purchase'):
+                    send_pushplus_notification("Debug: 购买文章", f"正在尝试购买文章：{url}")
+                    session.get(buy_url_full, timeout=30).raise_for_status()
+                    time.sleep(2) # 购买后等待一下
+                    response = session.get(url, timeout=30)
+                    response.raise_for_status()
+                    response.encoding = 'utf-8'
+                    soup = make_soup(response.text)
+            return parse_article_details(soup, url)
         except Exception as e:
             if attempt < 2:
-                print(f"  [警告] 访问详情页失败 ({e.__class__.__name__})，将在30秒后重试...")
-                time.sleep(30)
+                increment('retries', stage='detail_fetch')
+                print(f"  [警告] 访问详情页失败 ({e.__class__.__name__})，将在{DETAIL_RETRY_DELAY}秒后重试...")
+                time.sleep(DETAIL_RETRY_DELAY)
             else:
                 return {'error': f"访问详情页失败: {e.__class__.__name__}"}
     return {'error': "访问详情页在多次重试后仍然失败"}
 
-def process_single_article(article_info, session, output_today_folder):
-    original_title = article_info['title']
+def process_single_article(article_info, session, output_today_folder, image_store):
+    original_title = article_info.title
     safe_foldername = sanitize_filename(original_title)
     print(f"-> 开始处理: {original_title[:50]}...")
     
-    full_url = urljoin(BASE_URL, article_info['row'].select_one('a[id^="a_ajax_"]')['href'])
+    full_url = article_source_url(article_info)
     details = get_full_article_details(session, full_url)
     
     if details and 'error' not in details:
+        if skipped := check_duplicate_post(article_info, details, f"{os.path.basename(output_today_folder)}/{safe_foldername}"):
+            return skipped
         article_output_path = os.path.join(output_today_folder, safe_foldername)
         os.makedirs(article_output_path, exist_ok=True)
-        content_html, failed_images = download_images_and_update_html(details['content_html'], os.path.join(article_output_path, 'images'), session, original_title)
-        
-        hexo_date_str = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}:00"
-        try:
-            if article_info.get('date_str'):
-                hexo_date_str = datetime.strptime(article_info['date_str'], '%Y-%m-%d %H:%M').strftime('%Y-%m-%d %H:%M:%S')
-        except (ValueError, TypeError):
-            pass
-
-        data_to_save = {
-            "original_title": original_title, "source_url": full_url, "author": details['author'], 
-            "publish_date": details['post_date'], "scrape_date_utc": datetime.now(timezone.utc).isoformat(), 
-            "cover_image_url": details['cover_image_url'], "content_html": content_html, "hexo_date": hexo_date_str
-        }
+        content_html, failed_images = download_images_and_update_html(details['content_node'], os.path.join(article_output_path, 'images'), session, original_title, image_store)
+        release_tree(details['content_node'])
         
-        try:
-            with open(os.path.join(article_output_path, 'data.json'), 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-            add_scraped_article(safe_foldername)
-            print(f"  √ 数据已保存并记录: {safe_foldername[:30]}...")
-        except IOError as e:
-            return {'status': 'error', 'title': original_title, 'reason': f"保存JSON失败: {e}"}
+        data_to_save = build_article_record(article_info, full_url, details, content_html)
+        if save_error := save_article_record(article_output_path, data_to_save, safe_foldername, details['fingerprint']):
+            return {'status': 'error', 'title': original_title, 'reason': save_error}
         
-        return {'status': 'partial_success' if failed_images else 'success', 'title': original_title}
+        return {'status': 'partial_success' if failed_images else 'success', 'title': original_title,
+                'article_path': article_output_path, 'failed_images': failed_images}
     
     return {'status': 'error', 'title': original_title, 'reason': details.get('error', '未知详情页错误')}
 
+@dataclass(slots=True, frozen=True)
+class ArticleItem:
+    """索引页扫描出的一篇待抓取帖子。只保存抓取所需的字段，不引用索引页的解析树，页面解析完即可释放。"""
+    thread_id: int | None
+    href: str
+    title: str
+    date_str: str | None
+
+def parse_index_page(soup, high_water_mark=0):
+    """从索引页中解析出普通主题。帖子ID不超过高水位线的视为已知，直接略过。
+
+    页面中一行帖子都没有时（登录页、验证页或页面结构变化）抛出 ValueError，按加载失败处理：
+    否则它会被当成“整页都是已知帖子”而停止翻页并推进高水位线。
+    """
+    new_articles, thread_rows = [], 0
+    separator_td = soup.find('td', string=re.compile(r'普通主题'))
+    normal_thread_rows = separator_td.find_parent('tr').find_next_siblings('tr') if separator_td else soup.select('tr.tr3.t_one')
+    for row in normal_thread_rows:
+        if (link_tag := row.select_one('a[id^="a_ajax_"]')):
+            thread_rows += 1
+            title = link_tag.get_text(strip=True)
+            thread_id = extract_thread_id(link_tag.get('href'))
+            if thread_id and thread_id <= high_water_mark: continue
+            date_tag = row.select_one('td.author em span') or row.select_one('td.author em')
+            date_str = date_tag.get_text(strip=True) if date_tag else None
+            new_articles.append(ArticleItem(thread_id, link_tag['href'], title, date_str))
+    if not thread_rows:
+        raise ValueError("页面中没有任何帖子（可能是登录页、验证页或页面结构已变化）")
+    return new_articles
+
+def scan_index_page(session, page_num, high_water_mark=0):
+    """抓取并解析一页索引页，限速由 session 的共享令牌桶负责。"""
+    page_url = f"{BASE_URL}thread.php?fid-{FID}-page-{page_num}.html"
+    with stage_timer('index_scan'):
+        response = session.get(page_url, timeout=30)
+        response.raise_for_status()
+        soup = make_index_soup(response.text)
+        try:
+            return parse_index_page(soup, high_water_mark)
+        finally:
+            soup.decompose()
+
+def compute_high_water_mark(outcomes, failed_pages=()):
+    """根据本次抓取结果计算新的高水位线。
+
+    outcomes 为 (thread_id, status) 列表。高水位线只推进到最早一篇失败文章之前，
+    保证失败的文章在下次增量运行时仍会被重新扫描到。有索引页加载失败时返回 None：
+    只出现在那一页上的帖子从未入队，不会出现在 outcomes 中，推进高水位线会让它们永远被跳过。
+    """
+    if failed_pages: return None
+    failed = [tid for tid, status in outcomes if tid and status == 'error']
+    limit = min(failed) if failed else float('inf')
+    succeeded = [tid for tid, status in outcomes if tid and status != 'error' and tid < limit]
+    return max(succeeded) if succeeded else None
+
+def forum_state_key(shard):
+    """高水位线按分片分别记录：每个分片只推进自己负责的帖子，单分片时沿用版块ID本身。"""
+    index, count = shard
+    return FID if count == 1 else f"{FID}@{index}/{count}"
+
+def relink_image_in_record(article_path, src, filename):
+    """补抓成功后，把 data.json 正文中仍指向原始地址的 <img> 改为本地路径。"""
+    record = read_raw_record(article_path)
+    soup = make_soup(record['content_html'])
+    try:
+        for img in soup.find_all('img', src=src):
+            img['src'] = f"images/{filename}"
+        record['content_html'] = str(soup.find('div', id='read_tpc') or soup.body or soup)
+    finally:
+        soup.decompose()
+    write_raw_record(article_path, record, extract_thread_id(record.get('source_url')))
+
+def retry_image_jobs(session, image_store, shard):
+    """从任务队列中领取之前下载失败的图片重新下载，返回 (成功数, 失败数)。"""
+    jobs = claim_jobs(KIND_IMAGE, shard, IMAGE_RETRY_LIMIT)
+    if not jobs: return 0, 0
+    print(f"正在补抓 {len(jobs)} 张之前下载失败的图片...")
+    futures = {image_store.submit(job['url'], os.path.splitext(job['filename'])[1], session): (job_key, job) for job_key, job in jobs}
+    fixed = 0
+    # 同一篇文章的多张图片会改写同一个 data.json，因此在当前线程中逐个完成
+    for future in concurrent.futures.as_completed(futures):
+        job_key, job = futures[future]
+        try:
+            sha256, ext = future.result()
+            os.makedirs(os.path.join(job['article_path'], 'images'), exist_ok=True)
+            image_store.link_into(sha256, ext, os.path.join(job['article_path'], 'images', job['filename']))
+            relink_image_in_record(job['article_path'], job['src'], job['filename'])
+            complete_job(KIND_IMAGE, job_key)
+            fixed += 1
+        except Exception as e:
+            fail_job(KIND_IMAGE, job_key, f"补抓失败: {e.__class__.__name__}")
+    return fixed, len(jobs) - fixed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="South-Plus 数据抓取")
+    parser.add_argument('--full-rescan', action='store_true', default=FULL_RESCAN,
+                        help="忽略高水位线，重新扫描全部索引页")
+    parser.add_argument('--engine', choices=('threads', 'async'), default=SCRAPER_ENGINE,
+                        help="详情页与图片的抓取引擎")
+    parser.add_argument('--shard', type=parse_shard, default=parse_shard(SHARD),
+                        help="只处理任务队列中的第 i 个分片（共 N 个，i 从 0 开始），如 0/4；更改 N 后首次运行相当于全量扫描")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="把已超过重试上限而放弃的任务重新放回队列")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     start_time_total = time.time()
     send_pushplus_notification("South-Plus爬虫任务开始", f"任务于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 启动。")
     if not SPLUS_COOKIE:
         send_pushplus_notification("爬虫任务严重错误", "SPLUS_COOKIE 未配置！"); exit(1)
 
     initialize_database()
-    already_scraped = get_scraped_articles()
+    incremental = not args.full_rescan
+    high_water_mark = get_forum_high_water_mark(forum_state_key(args.shard)) if incremental else 0
+    if incremental and not high_water_mark:
+        # progress.db 不在仓库中，首次运行或数据库丢失（例如 Actions 缓存被清除）时没有高水位线；
+        # 已抓取的帖子仍可从本地原始数据清单中识别，但翻页不能依赖缺失的状态提前停止
+        print(f"[提示] progress.db 中没有版块 {FID} 的高水位线（首次运行或数据库已丢失），本次改为全量扫描。")
+        incremental = False
+    if args.retry_failed:
+        print(f"已将 {retry_failed_jobs(KIND_SCRAPE, args.shard) + retry_failed_jobs(KIND_IMAGE, args.shard)} 个放弃的任务重新放回队列。")
+    print(f"任务队列（分片 {args.shard[0]}/{args.shard[1]}）: {describe_counts(count_jobs(KIND_SCRAPE, args.shard))}")
     
-    session = requests.Session()
+    http_cache = HttpCache() if HTTP_CACHE_ENABLED else None
+    if http_cache: register_stats('http_cache', http_cache.stats)
+    session = CachingSession(RateLimiter(REQUESTS_PER_SECOND, capacity=REQUEST_BURST, jitter=REQUEST_JITTER), http_cache)
     session.headers.update(HEADERS)
     session.cookies.update(parse_raw_cookie_string(SPLUS_COOKIE))
     
@@ -190,73 +277,171 @@ def main():
     output_today_folder = os.path.join(OUTPUT_PARENT_FOLDER, today_str)
     os.makedirs(output_today_folder, exist_ok=True)
     
-    existing_folders = get_existing_article_folders(OUTPUT_PARENT_FOLDER)
+    # 增量刷新本地原始数据清单，只列出 mtime 变化过的日期目录
+    changed, removed = refresh_stage(STAGE_RAW, OUTPUT_PARENT_FOLDER, leaf_dirs=True)
+    print(f"本地数据清单已刷新：{changed} 个条目有变化，{removed} 个条目已删除。")
 
     try:
         print("正在检测总页数...")
         first_page_url = f"{BASE_URL}thread.php?fid-{FID}.html"
-        response = session.get(first_page_url, timeout=30)
-        response.raise_for_status()
-        pages_tag = BeautifulSoup(response.text, 'html.parser').select_one('li.pagesone')
+        with stage_timer('index_scan'):
+            response = session.get(first_page_url, timeout=30)
+            response.raise_for_status()
+            first_page_soup = make_index_soup(response.text)
+        pages_tag = first_page_soup.select_one('li.pagesone')
         match = re.search(r'(\d+)/(\d+)', pages_tag.text if pages_tag else "1/1")
         total_pages = int(match.group(2))
-        print(f"检测到共 {total_pages} 页。已在数据库记录 {len(already_scraped)} 篇。")
+        print(f"检测到共 {total_pages} 页。已在数据库记录 {count_articles('scraped')} 篇。")
+        if incremental: print(f"增量模式：版块 {FID} 的高水位线为帖子ID {high_water_mark}，遇到整页已知帖子即停止翻页。")
     except Exception as e:
         send_pushplus_notification("爬虫任务错误", f"检测总页数失败: {e}\n错误详情: {response.status_code} {response.reason}")
         exit(1)
 
-    all_new_articles = []
-    for page_num in range(1, total_pages + 1):
-        print(f"扫描第 {page_num}/{total_pages} 页...")
-        # 【核心改动】增加随机延迟
-        time.sleep(random.uniform(1.5, 4.0))
-        try:
-            page_url = f"{BASE_URL}thread.php?fid-{FID}-page-{page_num}.html" if page_num > 1 else first_page_url
-            response = session.get(page_url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            separator_td = soup.find('td', string=re.compile(r'普通主题'))
-            normal_thread_rows = separator_td.find_parent('tr').find_next_siblings('tr') if separator_td else soup.select('tr.tr3.t_one')
-            for row in normal_thread_rows:
-                if (link_tag := row.select_one('a[id^="a_ajax_"]')):
-                    title = link_tag.get_text(strip=True)
-                    safe_folder = sanitize_filename(title)
-                    if safe_folder not in existing_folders and safe_folder not in already_scraped:
-                        date_tag = row.select_one('td.author em span') or row.select_one('td.author em')
-                        date_str = date_tag.get_text(strip=True) if date_tag else None
-                        all_new_articles.append({'title': title, 'row': row, 'date_str': date_str})
-        except Exception as e:
-            print(f"  [错误] 访问页面 {page_num} 失败: {e}")
-    
-    if not all_new_articles:
-        send_pushplus_notification("爬虫任务完成", "没有发现任何需要处理的新文章。")
-        return
+    results, batch_results, processed_count, total_tasks = [], [], 0, None
+    outcomes, failed_pages = [], []
+    queued_folders, detail_futures, claimed = set(), {}, {}
+    image_store = ImageStore()
+    register_stats('images', image_store.stats)
+    if args.engine == 'async':
+        from async_scraper import AsyncScrapeEngine
+        detail_executor = AsyncScrapeEngine(session.limiter, HEADERS, session.cookies, ASYNC_CONCURRENCY, PER_HOST_CONCURRENCY, image_store, http_cache)
+        submit_article = lambda info: detail_executor.submit(info, output_today_folder)
+        in_flight_limit = ASYNC_CONCURRENCY * 2
+    else:
+        detail_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS)
+        submit_article = lambda info: detail_executor.submit(process_single_article, info, session, output_today_folder, image_store)
+        in_flight_limit = MAX_THREADS * 2
 
-    send_pushplus_notification("Debug: 发现新文章", f"扫描完成，共发现 {len(all_new_articles)} 篇新文章待抓取。")
-    
-    results, batch_results, processed_count = [], [], 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = [executor.submit(process_single_article, info, session, output_today_folder) for info in all_new_articles]
-        for future in concurrent.futures.as_completed(futures):
+    def finish(done):
+        # 登记已完成的详情页任务，并把它们从 detail_futures 中移除，腾出在途名额
+        nonlocal processed_count
+        for future in done:
+            job_key = detail_futures.pop(future)
+            info = claimed[job_key]
             processed_count += 1
             if result := future.result():
                 results.append(result)
                 batch_results.append(result)
-            
-            if processed_count % REPORTING_BATCH_SIZE == 0 or processed_count == len(all_new_articles):
-                success = sum(1 for r in batch_results if r['status'] == 'success')
-                partial = sum(1 for r in batch_results if r['status'] == 'partial_success')
-                error = sum(1 for r in batch_results if r['status'] == 'error')
-                summary = f"批次进度 ({processed_count}/{len(all_new_articles)}):\n- 成功: {success}\n- 部分成功: {partial}\n- 失败: {error}"
-                send_pushplus_notification(f"爬虫进度报告 ({processed_count}/{len(all_new_articles)})", summary)
-                batch_results = []
-    
+                outcomes.append((info.thread_id, result['status']))
+                if result['status'] == 'error':
+                    mark_article_failed(job_key, result.get('reason'), article_source_url(info), info.thread_id)
+                    fail_job(KIND_SCRAPE, job_key, result.get('reason'))
+                else:
+                    complete_job(KIND_SCRAPE, job_key)
+                    # 下载失败的图片作为独立任务入队，由之后的补抓步骤（或下一次运行）重试
+                    enqueue_jobs(KIND_IMAGE, [(f"{job_key}/{image['filename']}", {**image, 'article_path': result['article_path']}, None)
+                                              for image in result.get('failed_images', [])])
+
+            if processed_count % REPORTING_BATCH_SIZE == 0: report_batch()
+
+    def dispatch():
+        # 先收下已完成的任务再领取，扫描索引页期间详情页也能持续补充，而不是等扫描结束才腾出名额。
+        # 只从队列领取能马上开工的数量，其余任务留在 progress.db 中；进程中断后由下一次运行接着处理
+        finish(concurrent.futures.wait(detail_futures, timeout=0).done)
+        for job_key, payload in claim_jobs(KIND_SCRAPE, args.shard, in_flight_limit - len(detail_futures)):
+            info = claimed[job_key] = ArticleItem(**payload)
+            detail_futures[submit_article(info)] = job_key
+
+    def enqueue(articles):
+        # 边扫描边入队：每解析完一页就把本分片的新文章写入任务队列并投递，返回 (本页未知的篇数, 本分片入队的篇数)。
+        # 是否停止翻页要看分片过滤之前的未知篇数：一页新帖可能全部属于其它分片，这并不说明已翻到已知区域
+        folder_names = [sanitize_filename(info.title) for info in articles]
+        known = find_scraped_articles(folder_names) | find_keys(STAGE_RAW, folder_names)
+        unknown, new_jobs = 0, []
+        for info, safe_folder in zip(articles, folder_names):
+            if safe_folder in known: continue
+            unknown += 1
+            if safe_folder in queued_folders or not in_shard(safe_folder, args.shard): continue
+            queued_folders.add(safe_folder)
+            new_jobs.append((safe_folder, asdict(info), info.thread_id))
+        enqueue_jobs(KIND_SCRAPE, new_jobs)
+        dispatch()
+        return unknown, len(new_jobs)
+
+    def report_batch():
+        success = sum(1 for r in batch_results if r['status'] == 'success')
+        partial = sum(1 for r in batch_results if r['status'] == 'partial_success')
+        error = sum(1 for r in batch_results if r['status'] == 'error')
+        progress = f"{processed_count}/{total_tasks}" if total_tasks else f"{processed_count}，索引页仍在扫描"
+        summary = f"批次进度 ({progress}):\n- 成功: {success}\n- 部分成功: {partial}\n- 失败: {error}"
+        send_pushplus_notification(f"爬虫进度报告 ({progress})", summary)
+        batch_results.clear()
+
+    try:
+        with detail_executor:
+            # 先接手上次运行遗留的待处理任务与租约已过期的任务
+            dispatch()
+            try:
+                first_page_unknown, _ = enqueue(parse_index_page(first_page_soup, high_water_mark))
+            except ValueError as e:
+                failed_pages.append(1)
+                first_page_unknown = 0
+                print(f"  [错误] 解析页面 1 失败: {e}")
+            first_page_soup.decompose()
+            # 增量模式下按 SCAN_THREADS 一波一波地翻页，某一页全部是已知帖子时停止；全量模式一次性提交全部页面
+            remaining_pages = list(range(2, total_pages + 1))
+            wave_size = SCAN_THREADS if incremental else max(1, len(remaining_pages))
+            stop_paging = incremental and not first_page_unknown and not failed_pages
+            with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN_THREADS) as scan_executor:
+                for wave_start in range(0, len(remaining_pages), wave_size):
+                    if stop_paging:
+                        print(f"已出现整页已知帖子，跳过第 {remaining_pages[wave_start]} 页及之后的索引页。")
+                        break
+                    page_futures = {scan_executor.submit(scan_index_page, session, page_num, high_water_mark): page_num
+                                    for page_num in remaining_pages[wave_start:wave_start + wave_size]}
+                    # 同时等待索引页与详情页：任何一篇文章完成都立即补充新任务，不必等到下一页扫描完
+                    pending_pages = set(page_futures)
+                    while pending_pages:
+                        done, _ = concurrent.futures.wait(pending_pages | set(detail_futures), return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done & pending_pages:
+                            pending_pages.discard(future)
+                            page_num = page_futures[future]
+                            try:
+                                unknown, _ = enqueue(future.result())
+                                if incremental and not unknown: stop_paging = True
+                                print(f"扫描第 {page_num}/{total_pages} 页完成，本次新入队 {len(queued_folders)} 篇。")
+                            except Exception as e:
+                                failed_pages.append(page_num)
+                                print(f"  [错误] 访问页面 {page_num} 失败: {e}")
+                        dispatch()
+
+            total_tasks = len(claimed) + count_jobs(KIND_SCRAPE, args.shard).get('pending', 0)
+            if not total_tasks:
+                fixed, still_failed = retry_image_jobs(session, image_store, args.shard)
+                image_store.shutdown()
+                send_pushplus_notification("爬虫任务完成", f"没有发现任何需要处理的新文章。\n图片补抓: 成功 {fixed} 张, 失败 {still_failed} 张")
+                return
+
+            send_pushplus_notification("Debug: 发现新文章", f"扫描完成，共有 {total_tasks} 篇文章待抓取（含上次运行遗留的任务）。")
+
+            while detail_futures:
+                finish(concurrent.futures.wait(detail_futures, return_when=concurrent.futures.FIRST_COMPLETED).done)
+                dispatch()
+            if batch_results: report_batch()
+    finally:
+        release_jobs(KIND_SCRAPE)
+
+    fixed, still_failed = retry_image_jobs(session, image_store, args.shard)
+    image_store.shutdown()
+    # 队列中仍未完成的帖子（本次失败待重试、尚未来得及处理的、或之前已放弃的）同样阻止高水位线越过它们
+    outcomes += [(tid, 'error') for tid in unfinished_sort_keys(KIND_SCRAPE, args.shard)]
+    if failed_pages:
+        print(f"索引页 {sorted(failed_pages)} 加载失败，本次不更新版块 {FID} 的高水位线。")
+    if (new_high_water_mark := compute_high_water_mark(outcomes, failed_pages)) and new_high_water_mark > high_water_mark:
+        newest_date = next((info.date_str for info in claimed.values() if info.thread_id == new_high_water_mark), None)
+        set_forum_high_water_mark(forum_state_key(args.shard), new_high_water_mark, newest_date)
+        print(f"版块 {FID} 的高水位线已更新为帖子ID {new_high_water_mark}。")
+
     total_success = sum(1 for r in results if r['status'] == 'success')
     total_partial = sum(1 for r in results if r['status'] == 'partial_success')
     total_error = sum(1 for r in results if r['status'] == 'error')
+    total_duplicate = sum(1 for r in results if r['status'] == 'duplicate')
     elapsed = time.time() - start_time_total
-    final_summary = f"所有爬取任务已完成。\n\n总耗时: {elapsed:.2f} 秒\n任务总数: {len(all_new_articles)}\n- ✅ 完全成功: {total_success}\n- ⚠️ 部分成功: {total_partial}\n- ❌ 完全失败: {total_error}"
+    final_summary = f"所有爬取任务已完成。\n\n总耗时: {elapsed:.2f} 秒\n任务总数: {total_tasks}\n- ✅ 完全成功: {total_success}\n- ⚠️ 部分成功: {total_partial}\n- ❌ 完全失败: {total_error}\n- ♻️ 近似重复跳过: {total_duplicate}\n{image_store.summary()}\n图片补抓: 成功 {fixed} 张, 失败 {still_failed} 张\n任务队列: {describe_counts(count_jobs(KIND_SCRAPE, args.shard))}"
+    if http_cache:
+        final_summary += f"\n{http_cache.summary()}"
+        http_cache.close()
     send_pushplus_notification("爬虫任务最终总结", final_summary)
     
 if __name__ == "__main__":
-    main()
+    run_instrumented('scraper', main)
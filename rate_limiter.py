@@ -0,0 +1,121 @@
+# rate_limiter.py
+# 全局令牌桶限速器：索引页、详情页、图片下载共用同一个每秒请求预算。
+import asyncio
+import random
+import threading
+import time
+
+from metrics import observe_http
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器。
+
+    rate 为每秒补充的令牌数，capacity 为桶容量（允许的瞬时突发数）。
+    jitter 为每次放行后额外随机等待的秒数上限，用来打散请求节奏。
+    """
+
+    def __init__(self, rate, capacity=None, jitter=0.0):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.jitter = float(jitter)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def reserve(self, tokens=1):
+        """预订令牌，返回调用方需要等待的秒数（不阻塞）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if self.jitter > 0:
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    def acquire(self, tokens=1):
+        """阻塞直到获得指定数量的令牌。"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """acquire 的协程版本，与同步调用方共享同一个令牌桶。"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+if requests is not None:
+    class RateLimitedSession(requests.Session):
+        """每次发出请求前都先向共享限速器申请令牌的 Session。"""
+
+        def __init__(self, limiter=None):
+            super().__init__()
+            self.limiter = limiter
+
+        def request(self, method, url, *args, **kwargs):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            # 计时从拿到令牌开始，不包含限速等待；流式请求只计到响应头返回为止
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except Exception:
+                observe_http('error', time.perf_counter() - started)
+                raise
+            observe_http(response.status_code, time.perf_counter() - started,
+                         None if kwargs.get('stream') else len(response.content))
+            return response
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """可根据服务端配额反馈自动调速的令牌桶（加性增、乘性减）。
+
+    遇到配额错误时调用 throttle()：速率减半（不低于 min_rate）并清空桶内令牌，
+    cooldown 秒内的多次配额错误只减速一次，避免并发失败把速率压到谷底。
+    每次成功调用 recover()，速率按 max_rate 的 step 比例缓慢回升。
+    """
+
+    def __init__(self, rate, capacity=None, jitter=0.0, min_rate=None, step=0.05, cooldown=10.0):
+        super().__init__(rate, capacity, jitter)
+        self.max_rate = self.rate
+        self.min_rate = float(min_rate if min_rate is not None else self.max_rate / 16)
+        self.step = step
+        self.cooldown = cooldown
+        self._last_throttle = float('-inf')
+
+    def throttle(self):
+        """记录一次配额错误；返回本次是否真的降低了速率。"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_throttle < self.cooldown:
+                return False
+            self._last_throttle = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            return True
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.step)
+
+    def refund(self, tokens):
+        """归还预订多了的令牌（例如实际消耗的 token 少于估算值）。"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
@@ -0,0 +1,301 @@
+# raw_archive.py
+# 原始数据的归档存储（可选）：RAW_STORAGE=archive 时，抓取结果不再写成每篇一个的 data.json，
+# 而是追加到按大小轮转的压缩段文件 South-Plus-Raw-Archive/segment-NNNNNN.jsonl.zst（或 .jsonl.gz）中，
+# progress.db 的 archive_records 表记录每篇文章所在的段、偏移与长度。
+#
+# - 每条记录单独压缩成一个 zstd 帧 / gzip 成员，可以按偏移直接解压，段文件本身仍是合法的压缩 JSONL，
+#   用 zstdcat / zcat 就能整体查看。
+# - 读取时把段文件 mmap 到内存，按偏移切片后直接交给解压器，不经过额外的 read() 拷贝。
+#   段文件追加后需要重新映射，被替换的旧映射等正在使用它的读取结束后才关闭。
+# - 同一篇文章再次写入时追加新版本并更新索引，旧版本留在段文件中不再被引用。
+# - 归档只替代 data.json：图片仍下载到文章文件夹的 images/ 中（硬链接到图片仓库），
+#   因此每篇文章仍有一个文件夹；build_articles.py 等后续脚本读取的是文件夹布局，
+#   运行前先用 `python raw_archive.py export` 导出（只写出内容有变化的 data.json）。
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from database import get_store
+from manifest import STAGE_RAW, RAW_DATA_FILENAME, get_entry_hash, record_entry
+from page_parser import extract_thread_id
+
+# folders：每篇文章一个 data.json（默认）；archive：追加到压缩段文件
+RAW_STORAGE = os.getenv('RAW_STORAGE', 'folders').lower()
+RAW_ARCHIVE_FOLDER = os.getenv('RAW_ARCHIVE_FOLDER', "South-Plus-Raw-Archive")
+RAW_ARCHIVE_CODEC = os.getenv('RAW_ARCHIVE_CODEC', 'zstd' if zstandard else 'gzip').lower()
+RAW_ARCHIVE_LEVEL = int(os.getenv('RAW_ARCHIVE_LEVEL', '6'))
+RAW_ARCHIVE_SEGMENT_BYTES = int(os.getenv('RAW_ARCHIVE_SEGMENT_MB', '64')) * 1024 * 1024
+RAW_FOLDER = "South-Plus-Raw-Data"
+
+CODEC_EXTENSIONS = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz'}
+
+
+def serialize_record(record):
+    """与文件夹布局完全相同的 data.json 字节（导出时可按哈希判断是否需要重写）。"""
+    return json.dumps(record, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def raw_key_of(article_path):
+    """文章文件夹对应的原始数据键 '<日期>/<文件夹>'，与 raw 清单的路径一致。"""
+    article_path = os.path.normpath(article_path)
+    return f"{os.path.basename(os.path.dirname(article_path))}/{os.path.basename(article_path)}"
+
+
+class _Mapping:
+    """一个段文件的只读 mmap，以及正在从中读取的线程数。"""
+    __slots__ = ('map', 'readers', 'retired')
+
+    def __init__(self, mapped):
+        self.map = mapped
+        self.readers = 0
+        self.retired = False
+
+
+class RawArchive:
+    """追加写入的压缩段文件 + SQLite 偏移索引（线程安全）。"""
+
+    def __init__(self, root=RAW_ARCHIVE_FOLDER, codec=RAW_ARCHIVE_CODEC, segment_bytes=RAW_ARCHIVE_SEGMENT_BYTES):
+        if codec == 'zstd' and zstandard is None:
+            print("[警告] 未安装 zstandard（pip install zstandard），原始数据归档改用 gzip 压缩。")
+            codec = 'gzip'
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"不支持的压缩格式: {codec}")
+        self.root = root
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._segment = None
+        os.makedirs(root, exist_ok=True)
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=RAW_ARCHIVE_LEVEL).compress(data)
+        compressor = zlib.compressobj(RAW_ARCHIVE_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    @staticmethod
+    def _decompress(segment, data):
+        if segment.endswith(CODEC_EXTENSIONS['zstd']):
+            if zstandard is None:
+                raise RuntimeError(f"读取 {segment} 需要 zstandard 库，请运行: pip install zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data, 31)
+
+    def _current_segment(self, incoming):
+        """返回可以继续追加的段文件名，当前段写满 segment_bytes 时开始一个新段。"""
+        if self._segment is None:
+            existing = sorted(name for name in os.listdir(self.root) if name.startswith('segment-'))
+            # 压缩格式改变后从新段开始写，旧段仍可读取
+            if existing and existing[-1].endswith(CODEC_EXTENSIONS[self.codec]):
+                self._segment = existing[-1]
+            else:
+                self._segment = self._segment_name(self._segment_number(existing[-1]) + 1 if existing else 1)
+        path = os.path.join(self.root, self._segment)
+        if os.path.exists(path) and 0 < os.path.getsize(path) and os.path.getsize(path) + incoming > self.segment_bytes:
+            self._segment = self._segment_name(self._segment_number(self._segment) + 1)
+        return self._segment
+
+    @staticmethod
+    def _segment_number(name):
+        return int(name.split('-')[1].split('.')[0])
+
+    def _segment_name(self, number):
+        return f"segment-{number:06d}{CODEC_EXTENSIONS[self.codec]}"
+
+    def append(self, key, record, thread_id=None):
+        """追加一篇文章的记录并更新索引，返回 data.json 内容的哈希。"""
+        payload = serialize_record(record)
+        frame = self._compress(json.dumps({'key': key, 'record': record}, ensure_ascii=False).encode('utf-8') + b'\n')
+        with self._lock:
+            if not os.path.isdir(self.root):
+                # 归档目录在运行期间被删除（或工作目录改变）时重新创建
+                os.makedirs(self.root, exist_ok=True)
+                self._segment = None
+            segment = self._current_segment(len(frame))
+            with open(os.path.join(self.root, segment), 'ab') as f:
+                offset = f.tell()
+                f.write(frame)
+        record_hash = hashlib.sha256(payload).hexdigest()
+        get_store().write('''
+            INSERT INTO archive_records (item_key, thread_id, segment, offset, length, record_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(item_key) DO UPDATE SET thread_id = excluded.thread_id, segment = excluded.segment,
+                offset = excluded.offset, length = excluded.length, record_hash = excluded.record_hash, updated_at = excluded.updated_at
+        ''', (key, thread_id, segment, offset, len(frame), record_hash))
+        return record_hash
+
+    def _acquire(self, segment, end):
+        """取得段文件的映射并登记一个读者；段在映射之后又有追加、长度不够时重新映射。
+        被替换下来的旧映射不立即关闭，其它线程可能仍在对它切片或解压。"""
+        with self._lock:
+            mapping = self._maps.get(segment)
+            if mapping is None or len(mapping.map) < end:
+                if mapping is not None: self._retire(mapping)
+                with open(os.path.join(self.root, segment), 'rb') as f:
+                    mapping = self._maps[segment] = _Mapping(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            mapping.readers += 1
+            return mapping
+
+    @staticmethod
+    def _retire(mapping):
+        mapping.retired = True
+        if not mapping.readers: mapping.map.close()
+
+    def _release(self, mapping):
+        with self._lock:
+            mapping.readers -= 1
+            if mapping.retired and not mapping.readers: mapping.map.close()
+
+    def read_at(self, segment, offset, length):
+        mapping = self._acquire(segment, offset + length)
+        try:
+            with memoryview(mapping.map) as view, view[offset:offset + length] as frame:
+                return json.loads(self._decompress(segment, frame))['record']
+        finally:
+            self._release(mapping)
+
+    def get(self, key):
+        """按原始数据键 '<日期>/<文件夹>' 读取记录，不存在时返回 None。"""
+        get_store().flush()
+        row = get_store().query_one("SELECT segment, offset, length FROM archive_records WHERE item_key = ?", (key,))
+        return self.read_at(*row) if row else None
+
+    def get_by_thread(self, thread_id):
+        """按帖子 ID 读取最近写入的记录，不存在时返回 None。"""
+        get_store().flush()
+        row = get_store().query_one('''
+            SELECT segment, offset, length FROM archive_records WHERE thread_id = ? ORDER BY updated_at DESC LIMIT 1
+        ''', (thread_id,))
+        return self.read_at(*row) if row else None
+
+    def close(self):
+        with self._lock:
+            for mapping in self._maps.values():
+                self._retire(mapping)
+            self._maps.clear()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = RawArchive()
+        return _archive
+
+
+def write_raw_record(article_path, record, thread_id=None):
+    """按 RAW_STORAGE 保存一篇文章的原始数据：写出 data.json 并登记到 raw 清单，或追加到归档。"""
+    key = raw_key_of(article_path)
+    if RAW_STORAGE == 'archive':
+        get_archive().append(key, record, thread_id)
+        return
+    with open(os.path.join(article_path, RAW_DATA_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=4)
+    # 原地改写不会改变日期目录的 mtime，需要手动登记，清单中的内容哈希才会随之更新
+    record_entry(STAGE_RAW, os.path.dirname(os.path.dirname(os.path.normpath(article_path))), key, leaf_dirs=True)
+
+
+def read_raw_record(article_path):
+    """按 RAW_STORAGE 读取一篇文章的原始数据，归档中没有时退回文件夹中的 data.json。"""
+    if RAW_STORAGE == 'archive' and (record := get_archive().get(raw_key_of(article_path))) is not None:
+        return record
+    with open(os.path.join(article_path, RAW_DATA_FILENAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def export_archive(archive, raw_root=RAW_FOLDER):
+    """把归档导出为文件夹布局，只写出 raw 清单中哈希不同（或不存在）的 data.json，返回 (写出数, 跳过数)。"""
+    archive_rows = get_store().query("SELECT item_key, segment, offset, length, record_hash FROM archive_records ORDER BY segment, offset")
+    written = skipped = 0
+    for key, segment, offset, length, record_hash in archive_rows:
+        target = os.path.join(raw_root, *key.split('/'), RAW_DATA_FILENAME)
+        if get_entry_hash(STAGE_RAW, key) == record_hash and os.path.exists(target):
+            skipped += 1
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(serialize_record(archive.read_at(segment, offset, length)))
+        os.replace(tmp_path, target)
+        record_entry(STAGE_RAW, raw_root, key, leaf_dirs=True)
+        written += 1
+    get_store().flush()
+    return written, skipped
+
+
+def import_folders(archive, raw_root=RAW_FOLDER):
+    """把现有文件夹布局中的 data.json 导入归档（已导入且内容相同的跳过），返回 (导入数, 跳过数)。"""
+    known = dict(get_store().query("SELECT item_key, record_hash FROM archive_records"))
+    imported = skipped = 0
+    for date_dir in sorted(os.listdir(raw_root)):
+        if not os.path.isdir(os.path.join(raw_root, date_dir)): continue
+        for name in sorted(os.listdir(os.path.join(raw_root, date_dir))):
+            path = os.path.join(raw_root, date_dir, name, RAW_DATA_FILENAME)
+            if not os.path.isfile(path): continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            if known.get(f"{date_dir}/{name}") == hashlib.sha256(data).hexdigest():
+                skipped += 1
+                continue
+            record = json.loads(data)
+            archive.append(f"{date_dir}/{name}", record, extract_thread_id(record.get('source_url')))
+            imported += 1
+    get_store().flush()
+    return imported, skipped
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="原始数据归档：导入、导出与读取")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('export', help="把归档导出为 South-Plus-Raw-Data 文件夹布局")
+    sub.add_parser('import', help="把现有的 data.json 导入归档")
+    sub.add_parser('stats', help="显示归档的段文件与记录数")
+    get = sub.add_parser('get', help="按 '<日期>/<文件夹>' 或帖子 ID 打印一条记录")
+    get.add_argument('key')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    archive = get_archive()
+    try:
+        if args.command == 'export':
+            written, skipped = export_archive(archive)
+            print(f"导出完成：写出 {written} 个 data.json，{skipped} 个未变化。")
+        elif args.command == 'import':
+            if not os.path.isdir(RAW_FOLDER):
+                print(f"[严重错误] 原始数据文件夹 '{RAW_FOLDER}' 不存在。")
+                exit(1)
+            imported, skipped = import_folders(archive)
+            print(f"导入完成：{imported} 篇写入归档，{skipped} 篇已存在。")
+        elif args.command == 'stats':
+            count, = get_store().query_one("SELECT COUNT(*) FROM archive_records")
+            segments = sorted(name for name in os.listdir(archive.root) if name.startswith('segment-'))
+            size = sum(os.path.getsize(os.path.join(archive.root, name)) for name in segments)
+            print(f"归档共 {count} 篇文章，{len(segments)} 个段文件，{size / 1024 / 1024:.2f} MB。")
+        else:
+            record = archive.get_by_thread(int(args.key)) if args.key.isdigit() else archive.get(args.key)
+            if record is None:
+                print(f"[错误] 归档中没有 {args.key}")
+                exit(1)
+            print(json.dumps(record, ensure_ascii=False, indent=4))
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# scrape_common.py
+# 线程池引擎（pure_scraper_v12_actions.py）与异步引擎（async_scraper.py）共用的详情页解析与保存逻辑。
+# 两个引擎都从这里导入，而不是由 async_scraper 反向导入抓取脚本：脚本作为 __main__ 运行时，
+# 那样会把它再加载一份，得到第二套全局状态（限速器、数据库与通知句柄等）。
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+
+from database import add_scraped_article, mark_article_duplicate
+from manifest import STAGE_RAW
+from metrics import stage_timer, increment
+from near_duplicates import NEAR_DUP_POLICY, check_post, record_fingerprint
+from page_parser import release_tree, extract_thread_id
+from raw_archive import raw_key_of, write_raw_record
+
+BASE_URL = os.getenv('SPLUS_BASE_URL', "https://www.south-plus.net/")
+DETAIL_RETRY_DELAY = int(os.getenv('DETAIL_RETRY_DELAY', '30'))
+
+
+def sanitize_filename(filename):
+    safe_name = re.sub(r'[\\/*?:"<>|]', "", filename).strip()
+    return safe_name[:150]
+
+
+def collect_image_jobs(soup):
+    """列出需要本地化的图片：(img标签, 完整URL, 本地文件名)。线程引擎与异步引擎共用同一套命名规则。"""
+    jobs = []
+    for i, img in enumerate(soup.find_all('img'), 1):
+        original_url = img.get('src')
+        if not original_url: continue
+        full_url = urljoin(BASE_URL, original_url) if not original_url.startswith(('http://', 'https://')) else original_url
+        _, ext = os.path.splitext(os.path.basename(urlparse(full_url).path))
+        if not ext: ext = ".jpg"
+        jobs.append((img, full_url, f"image_{i}{ext}"))
+    return jobs
+
+
+def find_buy_url(soup):
+    """如果帖子需要购买，返回购买链接，否则返回 None。"""
+    if buy_button := soup.select_one("input[onclick*='job.php?action=buytopic']"):
+        return urljoin(BASE_URL, buy_button['onclick'].split("'")[1])
+    return None
+
+
+def parse_article_details(soup, url):
+    """从详情页中提取正文节点与元信息。content_node 是 soup 中的节点，图片改写直接在其上进行。"""
+    content_div = soup.find('div', id='read_tpc')
+    if not content_div or not content_div.get_text(strip=True):
+        return {'error': "帖子内容为空或无法解析"}
+
+    author = (tag.get_text(strip=True) if (tag := soup.select_one('th.r_two strong')) else '未知作者')
+    post_date_str = (tag.get_text(strip=True) if (tag := soup.select_one('div.tiptop span.fl.gray')) else datetime.now().strftime('%Y-%m-%d %H:%M'))
+    cover_image_url = urljoin(url, tag['src']) if (tag := content_div.find('img')) and tag.get('src') else None
+    return {'content_node': content_div, 'author': author, 'post_date': post_date_str, 'cover_image_url': cover_image_url}
+
+
+def article_source_url(article_info):
+    return urljoin(BASE_URL, article_info.href)
+
+
+def build_article_record(article_info, full_url, details, content_html):
+    """组装写入 data.json 的记录，两种抓取引擎必须产出完全相同的结构。"""
+    hexo_date_str = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}:00"
+    try:
+        if article_info.date_str:
+            hexo_date_str = datetime.strptime(article_info.date_str, '%Y-%m-%d %H:%M').strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        pass
+
+    return {
+        "original_title": article_info.title, "source_url": full_url, "author": details['author'],
+        "publish_date": details['post_date'], "scrape_date_utc": datetime.now(timezone.utc).isoformat(),
+        "cover_image_url": details['cover_image_url'], "content_html": content_html, "hexo_date": hexo_date_str,
+        **({"duplicate_of": details['duplicate_of']} if details.get('duplicate_of') else {})
+    }
+
+
+def check_duplicate_post(article_info, details, raw_key):
+    """下载图片之前的近似重复检测。skip 策略下释放解析树并返回跳过结果；否则在 details 中记下指纹与重复来源。"""
+    fingerprint, match = check_post(raw_key, details['content_node'].get_text(' '))
+    details['fingerprint'] = fingerprint
+    if not match: return None
+    other_key, distance, _ = match
+    increment('near_duplicates', stage='scrape')
+    print(f"  [近似重复] {article_info.title[:30]}... 与 {other_key} 相似（海明距离 {distance}）")
+    if NEAR_DUP_POLICY != 'skip':
+        details['duplicate_of'] = other_key
+        return None
+    release_tree(details['content_node'])
+    reason = f"近似重复: {other_key}"
+    mark_article_duplicate(sanitize_filename(article_info.title), reason, article_source_url(article_info), article_info.thread_id)
+    return {'status': 'duplicate', 'title': article_info.title, 'reason': reason}
+
+
+def save_article_record(article_output_path, data_to_save, safe_foldername, fingerprint=None):
+    """写出 data.json（或追加到原始数据归档，见 raw_archive.py）并在数据库中登记（包括近似重复检测用的指纹），失败时返回错误信息。"""
+    try:
+        thread_id = extract_thread_id(data_to_save['source_url'])
+        with stage_timer('json_write'):
+            write_raw_record(article_output_path, data_to_save, thread_id)
+        add_scraped_article(safe_foldername, data_to_save['source_url'], thread_id,
+                            hashlib.sha256(data_to_save['content_html'].encode('utf-8')).hexdigest())
+        record_fingerprint(STAGE_RAW, raw_key_of(article_output_path), fingerprint)
+        print(f"  √ 数据已保存并记录: {safe_foldername[:30]}...")
+        return None
+    except IOError as e:
+        return f"保存JSON失败: {e}"
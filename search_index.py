@@ -0,0 +1,240 @@
+# =================================================================================
+# 站内搜索索引构建脚本
+# 把 ai-optimized-articles 中的文章（标题、标签、分类、描述、正文）编入一个按词项前缀分片的倒排索引，
+# 输出为静态 JSON 文件，浏览器搜索时只需下载查询词所在的分片，而不是一次加载全部文章。
+#
+# - 分词：先做 NFKC 规范化并转小写；连续的中日韩文字切成相邻两字的组合（只有一个字时保留单字），
+#   其余按字母数字串切分。前端对查询词做同样的处理后取各词项的交集即可。
+# - 分片：词项按首字符的码位对 SEARCH_SHARDS 取余分到 terms/<两位十六进制>.json，
+#   内容为 {词项: [文章编号, 权重, 编号差, 权重, ...]}，编号按差值编码以减小体积。
+# - 文章信息按编号每 SEARCH_DOCS_PER_CHUNK 篇一个文件 docs/<序号>.json：{编号: [标题, 链接, 描述]}。
+# - index.json 记录分片参数与每个文件的内容哈希，前端可用它拼接带版本号的地址以利用浏览器缓存。
+# - 增量：倒排表保存在 progress.db 中，只重新分词内容哈希有变化（来自 manifest.py 的 optimized 清单）
+#   或已删除的文章，并且只重写受影响的分片文件。
+# =================================================================================
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+
+from database import get_store
+from manifest import STAGE_OPTIMIZED, refresh_stage
+from metrics import stage_timer, increment, run_instrumented
+
+OPTIMIZED_FOLDER = "ai-optimized-articles"
+SEARCH_INDEX_FOLDER = os.getenv('SEARCH_INDEX_FOLDER', "search-index")
+SEARCH_SHARDS = int(os.getenv('SEARCH_SHARDS', '64'))
+SEARCH_DOCS_PER_CHUNK = int(os.getenv('SEARCH_DOCS_PER_CHUNK', '500'))
+# 只索引正文的前这么多个字符：资源帖开头是简介，后面大多是文件列表与下载说明
+SEARCH_BODY_CHARS = int(os.getenv('SEARCH_BODY_CHARS', '3000'))
+# 文章链接模板，可用 {date}（日期文件夹）与 {name}（文件名去掉 .md）
+SEARCH_URL_TEMPLATE = os.getenv('SEARCH_URL_TEMPLATE', '/{date}/{name}/')
+SEARCH_DESCRIPTION_CHARS = 80
+INDEX_FORMAT_VERSION = 1
+# 各字段中词项出现一次的权重；单篇文章中一个词项的权重上限为 MAX_WEIGHT
+FIELD_WEIGHTS = {'title': 8, 'tags': 5, 'categories': 3, 'description': 3, 'body': 1}
+MAX_WEIGHT = 255
+
+_CJK_RUN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+')
+_WORD = re.compile(r'[a-z0-9]+')
+_FRONT_MATTER = re.compile(r'^---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+# 正文中的图片与链接地址只会产生无意义的字母数字词项
+_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_LINK_TARGET = re.compile(r'\]\([^)]*\)')
+_URL = re.compile(r'(?:https?|ftp)://\S+|magnet:\?\S+')
+
+
+def tokenize(text):
+    """返回文本中的词项列表（可重复）：中日韩文字切成二元组，其余为小写字母数字串。"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    terms = []
+    for run in _CJK_RUN.findall(text):
+        terms.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+    terms.extend(_WORD.findall(_CJK_RUN.sub(' ', text)))
+    return terms
+
+
+def shard_of(term):
+    return ord(term[0]) % SEARCH_SHARDS
+
+
+def parse_article(text):
+    """拆出 front matter 中的 title、description、tags、categories 与正文。"""
+    fields = {'tags': [], 'categories': []}
+    match = _FRONT_MATTER.match(text)
+    current_list = None
+    for line in match.group(1).split('\n') if match else []:
+        if item := re.match(r'^\s+-\s*"?(.*?)"?\s*$', line):
+            if current_list is not None and item.group(1): fields[current_list].append(item.group(1))
+            continue
+        current_list = None
+        if field := re.match(r'^(\w+):\s*"?(.*?)"?\s*$', line):
+            name, value = field.groups()
+            if name in ('tags', 'categories'):
+                current_list = name
+                if value.startswith('['):
+                    fields[name] = [part.strip(' "\'') for part in value.strip('[]').split(',') if part.strip(' "\'')]
+            elif value:
+                fields[name] = value.replace('\\"', '"')
+    body = text[match.end():] if match else text
+    fields['body'] = _URL.sub(' ', _LINK_TARGET.sub(']', _IMAGE.sub(' ', body)))[:SEARCH_BODY_CHARS]
+    return fields
+
+
+def term_weights(fields):
+    weights = {}
+    for field, boost in FIELD_WEIGHTS.items():
+        value = fields.get(field, '')
+        for term in tokenize(" ".join(value) if isinstance(value, list) else value):
+            weights[term] = min(MAX_WEIGHT, weights.get(term, 0) + boost)
+    return weights
+
+
+def article_url(relative_path):
+    date, name = relative_path.split('/', 1)
+    return SEARCH_URL_TEMPLATE.format(date=date, name=name[:-3] if name.endswith('.md') else name)
+
+
+def write_json(path, data):
+    """原子写入紧凑 JSON，返回内容哈希的前 12 位。"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+def load_index_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, 'index.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def index_settings():
+    return {'version': INDEX_FORMAT_VERSION, 'shards': SEARCH_SHARDS, 'docs_per_chunk': SEARCH_DOCS_PER_CHUNK,
+            'body_chars': SEARCH_BODY_CHARS, 'url_template': SEARCH_URL_TEMPLATE, 'field_weights': FIELD_WEIGHTS}
+
+
+def remove_documents(rows, dirty_shards, dirty_chunks):
+    """删除文章原有的倒排记录，并标记它们所在的分片与文章信息文件需要重写。"""
+    store = get_store()
+    for _, doc_id in rows:
+        dirty_shards.update(row[0] for row in store.query("SELECT DISTINCT shard FROM search_postings WHERE doc_id = ?", (doc_id,)))
+        dirty_chunks.add(doc_id // SEARCH_DOCS_PER_CHUNK)
+    store.write_many("DELETE FROM search_postings WHERE doc_id = ?", [(doc_id,) for _, doc_id in rows])
+
+
+def update_index(input_folder=OPTIMIZED_FOLDER, output_folder=SEARCH_INDEX_FOLDER, force=False):
+    """增量更新索引，返回 (重新索引的文章数, 删除的文章数, 重写的文件数)。"""
+    with stage_timer('manifest_refresh'):
+        refresh_stage(STAGE_OPTIMIZED, input_folder)
+    store = get_store()
+    previous = load_index_manifest(output_folder)
+    # 分片参数变化或输出目录丢失时，整个索引都要重新生成
+    rebuild = force or previous is None or previous.get('settings') != json.loads(json.dumps(index_settings()))
+    if rebuild:
+        store.write("DELETE FROM search_postings")
+        store.write("DELETE FROM search_docs")
+        store.flush()
+
+    changed = store.query('''
+        SELECT m.path, m.content_hash, d.doc_id FROM manifest_files m
+        LEFT JOIN search_docs d ON d.path = m.path
+        WHERE m.stage = ? AND (d.path IS NULL OR d.content_hash != m.content_hash)
+        ORDER BY m.path
+    ''', (STAGE_OPTIMIZED,))
+    removed = store.query('''
+        SELECT d.path, d.doc_id FROM search_docs d
+        LEFT JOIN manifest_files m ON m.stage = ? AND m.path = d.path
+        WHERE m.path IS NULL
+    ''', (STAGE_OPTIMIZED,))
+
+    dirty_shards = set(range(SEARCH_SHARDS)) if rebuild else set()
+    dirty_chunks = set()
+    remove_documents(removed + [(path, doc_id) for path, _, doc_id in changed if doc_id is not None], dirty_shards, dirty_chunks)
+    store.write_many("DELETE FROM search_docs WHERE path = ?", [(path,) for path, _ in removed])
+
+    next_id = store.query_one("SELECT COALESCE(MAX(doc_id) + 1, 0) FROM search_docs")[0]
+    indexed = 0
+    with stage_timer('search_tokenize'):
+        for path, content_hash, doc_id in changed:
+            try:
+                with open(os.path.join(input_folder, *path.split('/')), 'r', encoding='utf-8') as f:
+                    fields = parse_article(f.read())
+            except OSError as e:
+                print(f"  [错误] 无法读取 {path}: {e}")
+                if doc_id is not None:
+                    # 旧的倒排记录已在上面删除，文章信息也一并删除；下次运行时作为新文章重新索引
+                    store.write("DELETE FROM search_docs WHERE path = ?", (path,))
+                continue
+            if doc_id is None:
+                doc_id, next_id = next_id, next_id + 1
+            weights = term_weights(fields)
+            store.write_many("INSERT INTO search_postings (term, doc_id, weight, shard) VALUES (?, ?, ?, ?)",
+                             [(term, doc_id, weight, shard_of(term)) for term, weight in weights.items()])
+            store.write('''
+                INSERT INTO search_docs (path, doc_id, content_hash, title, url, description, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+                ON CONFLICT(path) DO UPDATE SET content_hash = excluded.content_hash, title = excluded.title,
+                    url = excluded.url, description = excluded.description, indexed_at = excluded.indexed_at
+            ''', (path, doc_id, content_hash, fields.get('title', path), article_url(path),
+                  fields.get('description', '')[:SEARCH_DESCRIPTION_CHARS]))
+            dirty_shards.update(shard_of(term) for term in weights)
+            dirty_chunks.add(doc_id // SEARCH_DOCS_PER_CHUNK)
+            indexed += 1
+    store.flush()
+
+    files = {} if rebuild else dict(previous.get('files', {}))
+    with stage_timer('search_write'):
+        for shard in sorted(dirty_shards):
+            postings = {}
+            last = {}
+            for term, doc_id, weight in store.query(
+                    "SELECT term, doc_id, weight FROM search_postings WHERE shard = ? ORDER BY term, doc_id", (shard,)):
+                postings.setdefault(term, []).extend((doc_id - last.get(term, 0), weight))
+                last[term] = doc_id
+            name = f"terms/{shard:02x}.json"
+            files[name] = write_json(os.path.join(output_folder, *name.split('/')), postings)
+        if rebuild:
+            dirty_chunks.update(range(next_id // SEARCH_DOCS_PER_CHUNK + 1))
+        for chunk in sorted(dirty_chunks):
+            start = chunk * SEARCH_DOCS_PER_CHUNK
+            docs = {str(doc_id): [title, url, description] for doc_id, title, url, description in store.query(
+                "SELECT doc_id, title, url, description FROM search_docs WHERE doc_id >= ? AND doc_id < ? ORDER BY doc_id",
+                (start, start + SEARCH_DOCS_PER_CHUNK))}
+            name = f"docs/{chunk}.json"
+            files[name] = write_json(os.path.join(output_folder, *name.split('/')), docs)
+        doc_count = store.query_one("SELECT COUNT(*) FROM search_docs")[0]
+        write_json(os.path.join(output_folder, 'index.json'),
+                   {'settings': index_settings(), 'documents': doc_count, 'files': dict(sorted(files.items()))})
+
+    increment('search_documents_indexed', indexed)
+    return indexed, len(removed), len(dirty_shards) + len(dirty_chunks)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="为已优化的文章增量构建分片的站内搜索索引")
+    parser.add_argument('--output', default=SEARCH_INDEX_FOLDER, help="索引输出目录")
+    parser.add_argument('--force', action='store_true', help="丢弃已有索引并完整重建")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(OPTIMIZED_FOLDER):
+        print(f"[严重错误] 文章文件夹 '{OPTIMIZED_FOLDER}' 不存在。")
+        exit(1)
+    start = time.time()
+    indexed, removed, rewritten = update_index(output_folder=args.output, force=args.force)
+    print(f"搜索索引更新完成：重新索引 {indexed} 篇，删除 {removed} 篇，重写 {rewritten} 个文件，耗时 {time.time() - start:.2f} 秒。")
+
+
+if __name__ == "__main__":
+    run_instrumented('search_index', main)
@@ -0,0 +1,22 @@
+# tests/conftest.py
+# 让测试可以直接导入仓库根目录的脚本模块与 benchmarks/ 中的模拟服务器；run_scraper() 在子进程中对模拟论坛运行抓取脚本。
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (REPO_DIR, os.path.join(REPO_DIR, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+FID = '221'
+
+
+def run_scraper(workdir, base_url, *args, **extra_env):
+    env = {k: v for k, v in os.environ.items() if k not in ('PUSHPLUS_TOKEN', 'SHARD')}
+    env.update(**extra_env)
+    env.update(PYTHONPATH=REPO_DIR, SPLUS_BASE_URL=base_url, SPLUS_COOKIE='test=1', FID=FID, REQUESTS_PER_SECOND='100000',
+               REQUEST_BURST='1000', REQUEST_JITTER='0', DETAIL_RETRY_DELAY='0', HTTP_CACHE='0',
+               METRICS_FOLDER=os.path.join(workdir, 'metrics'))
+    code = f"import sys; sys.argv = ['scraper', *{list(args)!r}]; import pure_scraper_v12_actions as s; s.main()"
+    return subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, capture_output=True, text=True, timeout=120)
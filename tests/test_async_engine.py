@@ -0,0 +1,26 @@
+# tests/test_async_engine.py
+# 异步引擎与线程池引擎共用 scrape_common.py，不能反向导入抓取脚本（脚本作为 __main__ 运行时会被再加载一份）。
+import os
+import subprocess
+import sys
+
+from conftest import REPO_DIR
+from mock_forum import MockForumServer
+
+
+def test_async_engine_does_not_import_scraper_script():
+    code = "import sys, async_scraper; print('pure_scraper_v12_actions' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+
+def test_async_engine_run_as_main_script(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k not in ('PUSHPLUS_TOKEN', 'SHARD')}
+    with MockForumServer(total_pages=2, threads_per_page=3, images_per_article=1) as server:
+        env.update(SPLUS_BASE_URL=server.base_url, SPLUS_COOKIE='test=1', REQUESTS_PER_SECOND='100000', REQUEST_BURST='1000',
+                   REQUEST_JITTER='0', DETAIL_RETRY_DELAY='0', HTTP_CACHE='0', METRICS_FOLDER=str(tmp_path / 'metrics'))
+        result = subprocess.run([sys.executable, os.path.join(REPO_DIR, 'pure_scraper_v12_actions.py'), '--engine', 'async', '--full-rescan'],
+                                cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == 6
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/images/image_1.jpg'))) == 6
@@ -0,0 +1,46 @@
+# tests/test_body_compactor.py
+# 正文压缩：去掉链接、图片与重复行，结果不超出 token 预算。
+import pytest
+
+from body_compactor import compact_body, split_sections
+from gemini_client import estimate_tokens
+
+POST = """# [Lass] 11eyes 汉化硬盘版
+作者：作者甲
+
+![cover](images/image_1.jpg)
+
+> 引用：萤之光汉化组出品
+VNDB介紹頁：[https://vndb.org/v123](https://vndb.org/v123)
+
+## 游戏简介
+""" + "\n".join(f"第{n}段：少年与少女被卷入名为赤夜的异界，为了活下去而与黑骑士战斗，第{n}次轮回的故事。" for n in range(60)) + """
+
+## 下载
+| 网盘 | 地址 | 提取码 |
+| --- | --- | --- |
+| 百度 | [点击下载](https://pan.example.com/s/abc) | 提取码：abcd |
+解压密码：south-plus
+作者：作者甲
+"""
+
+
+def test_split_sections_strips_links_images_and_repeated_lines():
+    text = "\n\n".join(split_sections(POST))
+    for noise in ('images/image_1.jpg', 'vndb.org', 'pan.example.com', '提取码', '解压密码', '|', '>'):
+        assert noise not in text
+    assert text.count("作者：作者甲") == 1
+    assert "引用：萤之光汉化组出品" in text
+
+
+@pytest.mark.parametrize('budget', [40, 120, 400, 1000])
+def test_compact_body_stays_within_budget(budget):
+    excerpt = compact_body(POST, budget)
+    assert excerpt and estimate_tokens(excerpt) <= budget
+    # 第一个段落（标题与作者）总是保留
+    assert excerpt.startswith("[Lass] 11eyes 汉化硬盘版")
+
+
+def test_compact_body_keeps_short_posts_whole():
+    post = "# 标题\n\n简介：一部短小的作品。\n\n[下载](https://example.com/file)"
+    assert compact_body(post, 2000) == "标题\n\n简介：一部短小的作品。\n\n下载"
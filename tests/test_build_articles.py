@@ -0,0 +1,69 @@
+# tests/test_build_articles.py
+# 原始 JSON -> Hexo Markdown：增量跳过未变化的文章，不覆盖手工整理的文件。
+import pytest
+
+import database
+from build_articles import build, title_tags
+from raw_archive import write_raw_record
+
+
+@pytest.fixture
+def raw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    yield tmp_path / 'raw'
+    database.close_database()
+
+
+def write_record(raw, name, title, body="<p>第一段正文。</p>", images=()):
+    article_dir = raw / '2025-08-31' / name
+    (article_dir / 'images').mkdir(parents=True, exist_ok=True)
+    for image in images:
+        (article_dir / 'images' / image).write_bytes(b'\xff\xd8' + image.encode())
+    record = {'original_title': title, 'author': '作者甲', 'publish_date': '2024-07-13 00:43', 'hexo_date': '2024-07-13 00:43:00',
+              'source_url': 'https://www.south-plus.net/read.php?tid-1.html', 'cover_image_url': None,
+              'content_html': '<div id="read_tpc">' + body + ''.join(f'<img src="images/{image}">' for image in images) + '</div>'}
+    # 与抓取脚本相同的写入方式：原地改写时登记到 raw 清单
+    write_raw_record(str(article_dir), record)
+
+
+def run_build(raw, **kwargs):
+    return build(str(raw), str(raw.parent / 'articles'), workers=2, **kwargs)
+
+
+def test_build_writes_post_and_links_images(raw):
+    write_record(raw, 'a', "[Lass] 11eyes 汉化硬盘版 [4.50GB]", images=('image_1.jpg',))
+    assert run_build(raw) == (1, 0, 0)
+    post = (raw.parent / 'articles' / '2025-08-31' / 'a.md').read_text(encoding='utf-8')
+    assert 'title: "[Lass] 11eyes 汉化硬盘版 [4.50GB]"' in post
+    assert 'description: "第一段正文。"' in post
+    assert '](image_1.jpg)' in post and 'images/image_1.jpg' not in post
+    asset = raw.parent / 'articles' / '2025-08-31' / 'a' / 'image_1.jpg'
+    assert asset.read_bytes() == (raw / '2025-08-31' / 'a' / 'images' / 'image_1.jpg').read_bytes()
+
+
+def test_title_tags_skip_sizes_and_keep_order():
+    assert title_tags("[Lass] 11eyes 汉化硬盘版 [4.50GB]", '作者甲') == ['GALGAME', 'Lass', '汉化', '作者甲']
+
+
+def test_incremental_build_skips_unchanged_articles(raw):
+    write_record(raw, 'a', "文章甲")
+    write_record(raw, 'b', "文章乙")
+    assert run_build(raw) == (2, 0, 0)
+    assert run_build(raw) == (0, 0, 0)
+
+    write_record(raw, 'b', "文章乙", body="<p>改写后的正文，长度也不同。</p>")
+    assert run_build(raw) == (1, 0, 0)
+    assert '改写后的正文' in (raw.parent / 'articles' / '2025-08-31' / 'b.md').read_text(encoding='utf-8')
+    assert run_build(raw) == (0, 0, 0)
+
+
+def test_build_does_not_overwrite_foreign_files(raw):
+    write_record(raw, 'a', "文章甲")
+    target = raw.parent / 'articles' / '2025-08-31' / 'a.md'
+    target.parent.mkdir(parents=True)
+    target.write_text("手工整理的文章", encoding='utf-8')
+    assert run_build(raw) == (0, 1, 0)
+    assert target.read_text(encoding='utf-8') == "手工整理的文章"
+    assert run_build(raw, force=True) == (1, 0, 0)
+    assert target.read_text(encoding='utf-8') != "手工整理的文章"
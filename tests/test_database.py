@@ -0,0 +1,20 @@
+# tests/test_database.py
+import threading
+
+from database import ProgressStore
+
+
+def test_writer_survives_bad_parameters(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.db'), flush_interval=0.01)
+    try:
+        store.execute_now("CREATE TABLE items (name TEXT)")
+        # 超出 64 位的整数抛出的是 OverflowError，而不是 sqlite3.Error
+        store.write("INSERT INTO items (name) VALUES (?)", (2 ** 64,))
+        store.write_many("INSERT INTO items (name) VALUES (?)", [("a",), ("b",)])
+        done = threading.Event()
+        threading.Thread(target=lambda: (store.flush(), store.execute_now("INSERT INTO items (name) VALUES ('c')"), done.set()),
+                         daemon=True).start()
+        assert done.wait(5), "写线程退出后 flush()/execute_now() 被永远阻塞"
+        assert [row[0] for row in store.query("SELECT name FROM items ORDER BY name")] == ['a', 'b', 'c']
+    finally:
+        store.close()
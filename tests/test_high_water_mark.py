@@ -0,0 +1,95 @@
+# tests/test_high_water_mark.py
+# 增量抓取的高水位线：索引页加载失败（或返回的页面中没有帖子）时不得推进，否则只出现在那一页上的帖子会被永远跳过。
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import REPO_DIR, FID, run_scraper
+from job_queue import in_shard
+from mock_forum import MockForumServer
+
+THREADS_PER_PAGE = 3
+
+
+def high_water_mark(workdir, key=FID):
+    with sqlite3.connect(os.path.join(workdir, 'progress.db')) as conn:
+        row = conn.execute("SELECT max_thread_id FROM forum_state WHERE fid = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_high_water_mark(workdir, thread_id, key=FID):
+    code = ("from database import initialize_database, set_forum_high_water_mark, close_database; "
+            f"initialize_database(); set_forum_high_water_mark({key!r}, {thread_id}); close_database()")
+    subprocess.run([sys.executable, '-c', code], cwd=workdir, env={**os.environ, 'PYTHONPATH': REPO_DIR}, check=True)
+
+
+def test_failed_index_page_keeps_high_water_mark(tmp_path):
+    workdir = str(tmp_path)
+    # 已知帖子从第 3 页的最后一篇开始，第 1-3 页其余帖子都是新帖
+    mark = 1_000_000 - 3 * THREADS_PER_PAGE + 1
+    set_high_water_mark(workdir, mark)
+    with MockForumServer(total_pages=3, threads_per_page=THREADS_PER_PAGE, images_per_article=0, failing_pages={2}) as server:
+        result = run_scraper(workdir, server.base_url)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "访问页面 2 失败" in result.stdout
+    # 第 1、3 页的帖子照常抓取，但高水位线保持不变，第 2 页的帖子下次仍会被扫描到
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == 2 * THREADS_PER_PAGE - 1
+    assert high_water_mark(workdir) == mark
+
+
+def test_index_page_without_threads_counts_as_failed(tmp_path):
+    workdir = str(tmp_path)
+    mark = 1_000_000 - 3 * THREADS_PER_PAGE + 1
+    set_high_water_mark(workdir, mark)
+    # 第 2 页返回 200 但是登录页：不能当作“整页已知”而停止翻页，也不能推进高水位线
+    with MockForumServer(total_pages=3, threads_per_page=THREADS_PER_PAGE, images_per_article=0, empty_pages={2}) as server:
+        result = run_scraper(workdir, server.base_url, SCAN_THREADS='1')
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "访问页面 2 失败" in result.stdout
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == 2 * THREADS_PER_PAGE - 1
+    assert high_water_mark(workdir) == mark
+
+
+def test_high_water_mark_advances_when_all_pages_load(tmp_path):
+    workdir = str(tmp_path)
+    mark = 1_000_000 - 3 * THREADS_PER_PAGE + 1
+    set_high_water_mark(workdir, mark)
+    with MockForumServer(total_pages=3, threads_per_page=THREADS_PER_PAGE, images_per_article=0) as server:
+        result = run_scraper(workdir, server.base_url)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert high_water_mark(workdir) == 1_000_000
+
+
+def test_shard_keeps_paging_past_pages_of_other_shards(tmp_path):
+    workdir = str(tmp_path)
+    shard = (1, 2)
+    key = f"{FID}@{shard[0]}/{shard[1]}"
+    # 每页一篇帖子，第 6 页的帖子已知，第 1-5 页是新帖
+    new_tids = [1_000_000 - i for i in range(5)]
+    set_high_water_mark(workdir, new_tids[-1] - 1, key)
+    mine = [tid for tid in new_tids if in_shard(f"[测试] 模拟帖子 {tid} 汉化硬盘版", shard)]
+    # 前提：本分片的帖子之间隔着整页只属于其它分片的新帖
+    assert mine[0] == new_tids[0] and len(mine) > 1 and mine[1] != new_tids[1]
+    with MockForumServer(total_pages=6, threads_per_page=1, images_per_article=0) as server:
+        result = run_scraper(workdir, server.base_url, '--shard', f"{shard[0]}/{shard[1]}", SCAN_THREADS='1')
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == len(mine)
+    assert high_water_mark(workdir, key) == new_tids[0]
+
+
+def test_missing_high_water_mark_falls_back_to_full_rescan(tmp_path):
+    workdir = str(tmp_path)
+    with MockForumServer(total_pages=1, threads_per_page=THREADS_PER_PAGE, images_per_article=0) as server:
+        first = run_scraper(workdir, server.base_url, '--full-rescan')
+    assert first.returncode == 0, first.stdout + first.stderr
+    # 模拟 progress.db 丢失：第 1 页的帖子都已在本地，之后论坛又多了两页（更早的帖子）没有抓过
+    os.remove(os.path.join(workdir, 'progress.db'))
+    with MockForumServer(total_pages=3, threads_per_page=THREADS_PER_PAGE, images_per_article=0) as server:
+        result = run_scraper(workdir, server.base_url)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "本次改为全量扫描" in result.stdout
+    # 没有高水位线时按“整页已知即停止”翻页会在第 1 页就停下，漏掉第 2、3 页
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == 3 * THREADS_PER_PAGE
+    # 高水位线重新建立在本次抓取的最新帖子上
+    assert high_water_mark(workdir) == 1_000_000 - THREADS_PER_PAGE
@@ -0,0 +1,63 @@
+# tests/test_http_cache.py
+# 条件请求缓存：带校验器的响应保存到磁盘，服务器返回 304 时直接使用缓存正文。
+import random
+
+from http_cache import HttpCache, CachingSession
+from mock_forum import MockForumServer
+
+
+def test_conditional_get_uses_cached_body_on_304(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    with MockForumServer(total_pages=2, threads_per_page=3) as server:
+        session = CachingSession(cache=cache)
+        url = f"{server.base_url}thread.php?fid-221-page-2.html"
+        first = session.get(url, timeout=10)
+        second = session.get(url, timeout=10)
+        not_modified = server.not_modified_count
+    assert first.status_code == second.status_code == 200
+    assert second.text == first.text and '模拟帖子' in second.text
+    assert getattr(second, 'from_cache', False) and not getattr(first, 'from_cache', False)
+    assert not_modified == 1
+    assert (cache.stats['hits'], cache.stats['misses'], cache.stats['stored']) == (1, 1, 1)
+    assert cache.stats['bytes_saved'] == len(first.content)
+    cache.close()
+
+
+def test_responses_without_validators_are_not_cached(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    with MockForumServer(total_pages=1, threads_per_page=3, etags=False) as server:
+        session = CachingSession(cache=cache)
+        url = f"{server.base_url}thread.php?fid-221.html"
+        session.get(url, timeout=10)
+        second = session.get(url, timeout=10)
+    assert not getattr(second, 'from_cache', False)
+    assert cache.lookup(url) == (None, {})
+    assert (cache.stats['hits'], cache.stats['misses'], cache.stats['stored']) == (0, 2, 0)
+    cache.close()
+
+
+def test_lookup_sends_validators_and_respects_no_store(tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    cache.store('http://a/', {'ETag': '"v1"', 'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT'}, b'body')
+    entry, conditional = cache.lookup('http://a/')
+    assert conditional == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 01 Jan 2025 00:00:00 GMT'}
+    assert cache.load_body('http://a/', entry) == b'body'
+    cache.store('http://b/', {'ETag': '"v1"', 'Cache-Control': 'no-store'}, b'secret')
+    assert cache.lookup('http://b/') == (None, {})
+    cache.close()
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    # 随机字节几乎不可压缩，每条约 1000 字节，上限只容得下两条
+    cache = HttpCache(str(tmp_path / 'cache'), max_bytes=2500)
+    rng = random.Random(0)
+    bodies = {url: rng.randbytes(1000) for url in ('http://a/', 'http://b/', 'http://c/')}
+    cache.store('http://a/', {'ETag': '"a"'}, bodies['http://a/'])
+    cache.store('http://b/', {'ETag': '"b"'}, bodies['http://b/'])
+    # 读取 a 之后 b 成为最久未使用的条目
+    cache.load_body('http://a/', cache.lookup('http://a/')[0])
+    cache.store('http://c/', {'ETag': '"c"'}, bodies['http://c/'])
+    assert cache.lookup('http://b/') == (None, {})
+    assert cache.lookup('http://a/')[0] is not None and cache.lookup('http://c/')[0] is not None
+    assert cache.stats['evicted'] == 1
+    cache.close()
@@ -0,0 +1,22 @@
+# tests/test_job_queue.py
+import pytest
+
+import database
+from job_queue import KIND_SCRAPE, enqueue_jobs, claim_jobs, complete_job, fail_job, unfinished_sort_keys
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    yield database.get_store()
+    database.close_database()
+
+
+def test_unfinished_sort_keys_include_failed_jobs(store):
+    enqueue_jobs(KIND_SCRAPE, [('tid-10', {}, 10), ('tid-20', {}, 20), ('tid-30', {}, 30)])
+    assert [key for key, _ in claim_jobs(KIND_SCRAPE, limit=2)] == ['tid-10', 'tid-20']
+    complete_job(KIND_SCRAPE, 'tid-10')
+    fail_job(KIND_SCRAPE, 'tid-20', "测试失败", max_attempts=1)
+    # tid-20 已放弃、本次不会再被领取，但仍要阻止高水位线越过它；tid-30 仍待处理
+    assert sorted(unfinished_sort_keys(KIND_SCRAPE)) == [20, 30]
@@ -0,0 +1,59 @@
+# tests/test_manifest.py
+# 文件清单的增量刷新：git checkout 只重置 mtime 时不应重新计算哈希。
+import os
+
+import pytest
+
+import database
+import manifest
+from manifest import STAGE_SOURCE, get_entry_hash, refresh_stage
+
+
+@pytest.fixture
+def articles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    root = tmp_path / 'articles'
+    (root / '2025-08-31').mkdir(parents=True)
+    for name in ('a.md', 'b.md'):
+        (root / '2025-08-31' / name).write_text(f"# {name}\n正文", encoding='utf-8')
+    assert refresh_stage(STAGE_SOURCE, str(root)) == (2, 0)
+    yield root
+    database.close_database()
+
+
+def touch_all(root, shift_ns):
+    for path in [root, *root.rglob('*')]:
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + shift_ns))
+
+
+def count_hashes(monkeypatch):
+    calls = []
+    original = manifest.file_sha256
+    monkeypatch.setattr(manifest, 'file_sha256', lambda path: calls.append(path) or original(path))
+    return calls
+
+
+def test_mtime_only_change_skips_rehash(articles, monkeypatch):
+    calls = count_hashes(monkeypatch)
+    before = get_entry_hash(STAGE_SOURCE, '2025-08-31/a.md')
+    touch_all(articles, 10**9)
+    assert refresh_stage(STAGE_SOURCE, str(articles)) == (0, 0)
+    assert calls == []
+    assert get_entry_hash(STAGE_SOURCE, '2025-08-31/a.md') == before
+    # 记录的 mtime 已更新，下一次刷新直接走快速路径
+    touch_all(articles, 0)
+    assert refresh_stage(STAGE_SOURCE, str(articles)) == (0, 0)
+    assert calls == []
+
+
+def test_size_change_and_verify_rehash(articles, monkeypatch):
+    calls = count_hashes(monkeypatch)
+    (articles / '2025-08-31' / 'a.md').write_text("# a.md\n更长的正文内容", encoding='utf-8')
+    touch_all(articles, 10**9)
+    assert refresh_stage(STAGE_SOURCE, str(articles)) == (1, 0)
+    assert [os.path.basename(path) for path in calls] == ['a.md']
+    # MANIFEST_VERIFY 时 mtime 变化的文件即使大小不变也重新计算哈希
+    touch_all(articles, 10**9)
+    assert refresh_stage(STAGE_SOURCE, str(articles), verify=True) == (2, 0)
@@ -0,0 +1,69 @@
+# tests/test_near_duplicates.py
+# SimHash 指纹与分段索引查询。
+import importlib
+
+import pytest
+
+import database
+import near_duplicates
+from near_duplicates import SIMHASH_BANDS, find_near_duplicate, hamming_distance, record_fingerprint, simhash
+
+ARTICLE = "".join(f"第{n}段：本作是经典视觉小说的汉化硬盘版，包含全部剧情语音与CG，解压后即可运行。" for n in range(12))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    yield database.get_store()
+    database.close_database()
+
+
+def test_simhash_ignores_markup_and_links():
+    html = f'<div id="read_tpc">{ARTICLE}<br><a href="https://example.com/a">https://example.com/a</a></div>'
+    assert simhash(html) == simhash(ARTICLE)
+
+
+def test_simhash_similar_texts_are_close():
+    edited = ARTICLE.replace("第3段", "第三段")
+    assert hamming_distance(simhash(ARTICLE), simhash(edited)) <= 3
+    unrelated = "".join(f"Chapter {n}: release notes for the English patch, with a full list of fixed typos." for n in range(12))
+    assert hamming_distance(simhash(ARTICLE), simhash(unrelated)) > 10
+
+
+def test_simhash_skips_short_text():
+    assert simhash("短正文") is None
+
+
+def test_find_near_duplicate_uses_any_matching_band(store):
+    fingerprint = simhash(ARTICLE)
+    # 每段各翻转一位：任何一段都不完全相同，距离为 SIMHASH_BANDS，超出能保证找全的范围
+    spread = fingerprint ^ sum(1 << (16 * i) for i in range(SIMHASH_BANDS))
+    # 同一段内翻转 3 位：其余各段完全相同
+    close = fingerprint ^ 0b111
+    record_fingerprint('raw', '2025-08-31/spread', spread)
+    record_fingerprint('raw', '2025-08-31/close', close, ref='cache-key')
+    assert find_near_duplicate('raw', '2025-08-31/new', fingerprint) == ('2025-08-31/close', 3, 'cache-key')
+    # 自身不算重复，其它命名空间互不影响
+    assert find_near_duplicate('raw', '2025-08-31/close', close) is None
+    assert find_near_duplicate('source', '2025-08-31/new', fingerprint) is None
+    assert find_near_duplicate('raw', '2025-08-31/new', None) is None
+
+
+def test_find_near_duplicate_handles_high_bit_fingerprints(store):
+    fingerprint = (1 << 63) | 0xABCDEF
+    record_fingerprint('raw', '2025-08-31/high', fingerprint)
+    assert find_near_duplicate('raw', '2025-08-31/new', fingerprint ^ 1) == ('2025-08-31/high', 1, None)
+
+
+def test_defaults_and_distance_clamp(monkeypatch):
+    monkeypatch.delenv('NEAR_DUP_POLICY', raising=False)
+    monkeypatch.setenv('NEAR_DUP_DISTANCE', '10')
+    try:
+        module = importlib.reload(near_duplicates)
+        assert module.NEAR_DUP_POLICY == 'off'
+        assert module.NEAR_DUP_DISTANCE == SIMHASH_BANDS - 1
+        assert module.check_post('2025-08-31/a', ARTICLE) == (None, None)
+    finally:
+        monkeypatch.delenv('NEAR_DUP_DISTANCE')
+        importlib.reload(near_duplicates)
@@ -0,0 +1,83 @@
+# tests/test_notifier.py
+# PushPlus 后台发送器：窗口内的消息合并为一条摘要，退出时发完队列中剩余的消息。
+import threading
+import time
+
+import notifier
+from notifier import NotificationDispatcher, merge_messages
+
+
+class FakeResponse:
+    def __init__(self, code):
+        self.code = code
+        self.text = f'{{"code": {code}}}'
+
+    def json(self):
+        return {'code': self.code}
+
+
+class FakeSession:
+    """记录每次 POST 的请求体；codes 中的状态码依次返回，用完后一律返回 200。"""
+
+    def __init__(self, codes=()):
+        self.codes = list(codes)
+        self.posts = []
+        self.posted = threading.Event()
+
+    def post(self, url, json, timeout):
+        self.posts.append(json)
+        self.posted.set()
+        return FakeResponse(self.codes.pop(0) if self.codes else 200)
+
+
+def make_dispatcher(window, codes=()):
+    dispatcher = NotificationDispatcher('token', window=window, max_retries=2)
+    dispatcher._session = session = FakeSession(codes)
+    return dispatcher, session
+
+
+def test_merge_messages_groups_by_title():
+    assert merge_messages([("完成", "一篇")]) == ("完成", "一篇")
+    title, content = merge_messages([("失败", "甲"), ("完成", "乙"), ("失败", "丙")])
+    assert title == "失败 等 3 条通知"
+    assert content == "【失败】×2\n甲\n丙\n\n【完成】\n乙"
+
+
+def test_messages_within_window_are_sent_as_one_digest():
+    dispatcher, session = make_dispatcher(window=0.3)
+    started = time.monotonic()
+    for n in range(3):
+        dispatcher.notify("抓取失败", f"第{n}篇")
+    assert session.posted.wait(5)
+    # notify() 只入队，合并窗口结束后才发送
+    assert time.monotonic() - started >= 0.25
+    dispatcher.close(timeout=5)
+    assert len(session.posts) == 1
+    assert session.posts[0]['title'] == "抓取失败 等 3 条通知"
+    assert session.posts[0]['content'] == "【抓取失败】×3<br>第0篇<br>第1篇<br>第2篇"
+    assert dispatcher.stats == {'queued': 3, 'sent': 3, 'digests': 1, 'retried': 0, 'failed': 0}
+
+
+def test_close_flushes_queue_without_waiting_for_window():
+    dispatcher, session = make_dispatcher(window=60)
+    for n in range(notifier.NOTIFY_DIGEST_MAX + 5):
+        dispatcher.notify("新文章", f"第{n}篇")
+    started = time.monotonic()
+    dispatcher.close(timeout=5)
+    assert time.monotonic() - started < 5
+    # 摘要最多 NOTIFY_DIGEST_MAX 条，剩余的消息另发一条
+    assert [post['title'] for post in session.posts] == ["新文章 等 20 条通知", "新文章 等 5 条通知"]
+    assert dispatcher.stats['sent'] == notifier.NOTIFY_DIGEST_MAX + 5
+    # 关闭之后的通知直接丢弃
+    dispatcher.notify("新文章", "迟到的")
+    assert dispatcher.stats['queued'] == notifier.NOTIFY_DIGEST_MAX + 5
+
+
+def test_failed_delivery_is_retried(monkeypatch):
+    monkeypatch.setattr(notifier, 'NOTIFY_BACKOFF_BASE', 0)
+    dispatcher, session = make_dispatcher(window=0, codes=(500, 500))
+    dispatcher.notify("完成", "一篇")
+    dispatcher.flush(timeout=5)
+    dispatcher.close(timeout=5)
+    assert len(session.posts) == 3
+    assert dispatcher.stats['sent'] == 1 and dispatcher.stats['retried'] == 2 and dispatcher.stats['failed'] == 0
@@ -0,0 +1,128 @@
+# tests/test_optimize_images.py
+# 图片优化：体积上限、正文改写，以及优化后没有变小的图片保持原样。
+import json
+import os
+import random
+
+import pytest
+from PIL import Image
+
+import database
+import optimize_images
+from manifest import file_sha256
+from optimize_images import encode_capped, rewrite_article, variant_targets, write_blob
+
+TARGETS = variant_targets('webp')
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    yield database.get_store()
+    database.close_database()
+
+
+def noise_image(width, height, seed=0):
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * 3)))
+
+
+def gradient_image(width, height):
+    return Image.linear_gradient('L').resize((width, height)).convert('RGB')
+
+
+def make_article(raw_root, raw_path, images):
+    article_dir = os.path.join(raw_root, *raw_path.split('/'))
+    os.makedirs(os.path.join(article_dir, 'images'))
+    for name, image in images.items():
+        image.save(os.path.join(article_dir, 'images', name))
+    record = {'content_html': '<div id="read_tpc">' + ''.join(f'<img src="images/{name}"><br>' for name in images) + '</div>'}
+    with open(os.path.join(article_dir, 'data.json'), 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=4)
+    return article_dir, record
+
+
+def test_encode_capped_stays_under_limit(monkeypatch):
+    monkeypatch.setattr(optimize_images, 'IMAGE_MAX_BYTES', 80 * 1024)
+    data, (width, height) = encode_capped(noise_image(800, 600), 'webp')
+    assert len(data) <= 80 * 1024
+    # 噪点图在最低质量下仍然超出，只能缩小尺寸
+    assert optimize_images.IMAGE_THUMB_WIDTH < width < 800 and height < 600
+
+
+def test_encode_capped_stops_shrinking_at_thumbnail_width(monkeypatch):
+    monkeypatch.setattr(optimize_images, 'IMAGE_MAX_BYTES', 1024)
+    data, (width, _) = encode_capped(noise_image(800, 600), 'webp')
+    assert width <= optimize_images.IMAGE_THUMB_WIDTH and len(data) > 1024
+
+
+def test_encode_capped_keeps_size_when_quality_is_enough():
+    data, size = encode_capped(gradient_image(640, 480), 'webp')
+    assert size == (640, 480) and len(data) <= optimize_images.IMAGE_MAX_BYTES
+
+
+def test_rewrite_article_links_smaller_variants_only(store, tmp_path):
+    raw_root, store_root = str(tmp_path / 'raw'), str(tmp_path / 'store')
+    article_dir, record = make_article(raw_root, '2025-08-31/a', {'image_1.png': noise_image(64, 48, 1), 'image_2.png': noise_image(64, 48, 2)})
+    images = {name: file_sha256(os.path.join(article_dir, 'images', name)) for name in ('image_1.png', 'image_2.png')}
+    small, thumb = b'small-webp', b'thumb'
+    bigger = b'x' * (os.path.getsize(os.path.join(article_dir, 'images', 'image_2.png')) + 1)
+    (full_variant, _), (thumb_variant, _) = TARGETS
+    variants = {
+        images['image_1.png']: {full_variant: (write_blob(store_root, small, '.webp'), 64, 48, len(small)),
+                                thumb_variant: (write_blob(store_root, thumb, '.webp'), 32, 24, len(thumb))},
+        images['image_2.png']: {full_variant: (write_blob(store_root, bigger, '.webp'), 64, 48, len(bigger))},
+    }
+    before, after = rewrite_article(raw_root, '2025-08-31/a', record, images, variants, TARGETS, store_root)
+
+    sizes = [os.path.getsize(os.path.join(article_dir, 'images', name)) for name in ('image_1.png', 'image_2.png')]
+    assert before == sum(sizes)
+    assert after == len(small) + sizes[1]
+    with open(os.path.join(article_dir, 'data.json'), 'r', encoding='utf-8') as f:
+        html = json.load(f)['content_html']
+    assert 'src="images/image_1.webp"' in html
+    assert 'srcset="images/image_1-32w.webp 32w, images/image_1.webp 64w"' in html
+    assert 'width="64"' in html and 'loading="lazy"' in html
+    # 生成的版本不比原图小：正文保持原样，也不链接到文章目录
+    assert 'src="images/image_2.png"' in html
+    assert not os.path.exists(os.path.join(article_dir, 'images', 'image_2.webp'))
+    with open(os.path.join(article_dir, 'images', 'image_1.webp'), 'rb') as f:
+        assert f.read() == small
+
+
+def test_optimize_is_incremental_and_encodes_shared_images_once(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(optimize_images, 'IMAGE_PAGE_SIZE', 1)
+    raw_root, store_root = str(tmp_path / 'raw'), str(tmp_path / 'store')
+    for name in ('a', 'b', 'c'):
+        make_article(raw_root, f'2025-08-31/{name}', {'image_1.png': gradient_image(1000, 800)})
+    articles, encoded, before, after = optimize_images.optimize(raw_root, store_root, workers=2)
+    # 每页一篇文章、三篇共用同一张图片：跨页流水线也只编码一次
+    assert (articles, encoded) == (3, 1)
+    assert after < before
+    for name in ('a', 'b', 'c'):
+        with open(os.path.join(raw_root, '2025-08-31', name, 'data.json'), 'r', encoding='utf-8') as f:
+            assert 'images/image_1.webp' in json.load(f)['content_html']
+    assert optimize_images.optimize(raw_root, store_root, workers=2) == (0, 0, 0, 0)
+
+
+def test_optimize_submits_next_page_before_finishing_current(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(optimize_images, 'IMAGE_PAGE_SIZE', 1)
+    raw_root = str(tmp_path / 'raw')
+    for name in ('a', 'b', 'c'):
+        make_article(raw_root, f'2025-08-31/{name}', {'image_1.png': gradient_image(64 + ord(name), 48)})
+    calls, submit_page, finish_page = [], optimize_images.submit_page, optimize_images.finish_page
+
+    def record_submit(executor, page, *args):
+        calls.append(('submit', page[0]))
+        return submit_page(executor, page, *args)
+
+    def record_finish(page_state, *args):
+        calls.append(('finish', page_state[0][0][0]))
+        return finish_page(page_state, *args)
+
+    monkeypatch.setattr(optimize_images, 'submit_page', record_submit)
+    monkeypatch.setattr(optimize_images, 'finish_page', record_finish)
+    optimize_images.optimize(raw_root, str(tmp_path / 'store'), workers=1)
+    a, b, c = (f'2025-08-31/{name}' for name in 'abc')
+    assert calls == [('submit', a), ('submit', b), ('finish', a), ('submit', c), ('finish', b), ('finish', c)]
@@ -0,0 +1,19 @@
+# tests/test_prompt_excerpt.py
+# 发送给 Gemini 的正文摘录与元数据缓存键。
+import optimize_front_matter as optimizer
+from body_compactor import compact_body
+
+COVER_AND_LINKS = "![cover](images/image_1.jpg)\n\n[https://vndb.org/v123](https://vndb.org/v123)\n"
+
+
+def test_empty_compacted_excerpt_falls_back_to_raw_body():
+    assert compact_body(COVER_AND_LINKS, 2000) == ''
+    assert optimizer.prompt_excerpt(COVER_AND_LINKS) == COVER_AND_LINKS.strip()
+
+
+def test_fallback_keeps_different_link_only_posts_apart():
+    # 两篇只有封面与链接的帖子压缩后都是空的；退回原文后摘录（以及以它为键的元数据缓存）不会相同
+    other = COVER_AND_LINKS.replace('v123', 'v456')
+    assert compact_body(other, 2000) == ''
+    assert optimizer.prompt_excerpt(COVER_AND_LINKS) != optimizer.prompt_excerpt(other)
+    assert optimizer.metadata_cache_key(optimizer.prompt_excerpt(COVER_AND_LINKS)) != optimizer.metadata_cache_key(optimizer.prompt_excerpt(other))
@@ -0,0 +1,74 @@
+# tests/test_raw_archive.py
+# 原始数据归档：按键 / 帖子ID 读回写入的记录，段文件追加后重新映射不影响正在进行的读取。
+import pytest
+
+import database
+import raw_archive
+from raw_archive import RawArchive
+
+
+def make_record(tid, text="正文"):
+    return {'original_title': f"帖子 {tid}", 'source_url': f"https://www.south-plus.net/read.php?tid-{tid}.html",
+            'content_html': f"<div id=\"read_tpc\">{text}</div>"}
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    archive = RawArchive(str(tmp_path / 'archive'), codec='gzip')
+    yield archive
+    archive.close()
+    database.close_database()
+
+
+def test_round_trip_by_key_and_thread(archive):
+    archive.append('2025-08-31/a', make_record(101), 101)
+    archive.append('2025-08-31/b', make_record(102, "另一篇"), 102)
+    assert archive.get('2025-08-31/a') == make_record(101)
+    assert archive.get_by_thread(102) == make_record(102, "另一篇")
+    assert archive.get('2025-08-31/missing') is None
+    assert archive.get_by_thread(999) is None
+
+
+def test_rewrite_returns_latest_version(archive):
+    archive.append('2025-08-31/a', make_record(101), 101)
+    archive.append('2025-08-31/a', make_record(101, "改写后的正文"), 101)
+    assert archive.get('2025-08-31/a') == make_record(101, "改写后的正文")
+    assert archive.get_by_thread(101) == make_record(101, "改写后的正文")
+
+
+def test_read_after_append_remaps_segment(archive):
+    archive.append('2025-08-31/a', make_record(101), 101)
+    assert archive.get('2025-08-31/a') == make_record(101)
+    # 已映射的段在追加之后长度不够，读取新记录时需要重新映射
+    archive.append('2025-08-31/b', make_record(102, "追加" * 100), 102)
+    assert archive.get('2025-08-31/b') == make_record(102, "追加" * 100)
+    assert archive.get('2025-08-31/a') == make_record(101)
+
+
+def test_remap_while_another_read_is_decompressing(archive, monkeypatch):
+    archive.append('2025-08-31/a', make_record(101), 101)
+    archive.get('2025-08-31/a')
+    decompress, nested = RawArchive._decompress, []
+
+    def remap_during_read(segment, data):
+        # 模拟另一个线程：在这次解压进行中追加并读取新记录，触发同一个段的重新映射
+        if not nested:
+            nested.append(None)
+            archive.append('2025-08-31/b', make_record(102, "追加" * 100), 102)
+            nested.append(archive.get('2025-08-31/b'))
+        return decompress(segment, data)
+
+    monkeypatch.setattr(RawArchive, '_decompress', staticmethod(remap_during_read))
+    assert archive.get('2025-08-31/a') == make_record(101)
+    assert nested[1] == make_record(102, "追加" * 100)
+
+
+def test_write_and_read_raw_record_in_archive_mode(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_archive, 'RAW_STORAGE', 'archive')
+    monkeypatch.setattr(raw_archive, '_archive', archive)
+    article_path = tmp_path / 'South-Plus-Raw-Data' / '2025-08-31' / 'a'
+    raw_archive.write_raw_record(str(article_path), make_record(101), 101)
+    assert raw_archive.read_raw_record(str(article_path)) == make_record(101)
+    assert not (article_path / 'data.json').exists()
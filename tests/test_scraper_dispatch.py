@@ -0,0 +1,20 @@
+# tests/test_scraper_dispatch.py
+# 扫描索引页与抓取详情页同时进行：已完成的文章要及时让出在途名额，不能等整个索引扫描结束才继续投递。
+from conftest import run_scraper
+from mock_forum import MockForumServer
+
+MAX_THREADS = 2
+TOTAL_PAGES = 8
+
+
+def test_articles_keep_starting_while_index_pages_are_scanned(tmp_path):
+    # 每个请求都有延迟，单线程翻页时 8 页索引需要一段时间，足够详情页完成多轮
+    with MockForumServer(total_pages=TOTAL_PAGES, threads_per_page=5, images_per_article=0, latency=0.05) as server:
+        result = run_scraper(str(tmp_path), server.base_url, '--full-rescan', SCAN_THREADS='1', MAX_THREADS=str(MAX_THREADS))
+        log = list(server.request_log)
+    assert result.returncode == 0, result.stdout + result.stderr
+    last_index = max(i for i, path in enumerate(log) if path.startswith(f'/thread.php?fid-221-page-{TOTAL_PAGES}.html'))
+    started_during_scan = sum(1 for path in log[:last_index] if path.startswith('/read.php'))
+    # 在途上限是 MAX_THREADS * 2；名额只在扫描结束后才释放时，扫描期间最多只能开始这么多篇
+    assert started_during_scan > MAX_THREADS * 2
+    assert len(list(tmp_path.glob('South-Plus-Raw-Data/*/*/data.json'))) == TOTAL_PAGES * 5
@@ -0,0 +1,125 @@
+# tests/test_search_index.py
+# 站内搜索索引：分词、front matter 解析与增量更新。
+import builtins
+import json
+import os
+
+import pytest
+
+import database
+import search_index
+from search_index import parse_article, shard_of, tokenize, update_index
+
+ARTICLE = '''---
+title: "[Lass] 11eyes 汉化硬盘版"
+description: "萤之光汉化组的汉化版本"
+categories:
+  - 游戏资源
+tags: [11eyes, "视觉小说"]
+---
+
+# 正文标题
+
+![cover](images/image_1.jpg) 下载地址 [链接](https://example.com/file) magnet:?xt=urn:btih:abc
+'''
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.initialize_database()
+    (tmp_path / 'articles' / '2025-08-31').mkdir(parents=True)
+    yield tmp_path
+    database.close_database()
+
+
+def write_article(site, name, title, body="正文"):
+    # 与优化脚本一样先写临时文件再替换，日期目录的 mtime 随之改变，清单刷新能发现改动
+    path = site / 'articles' / '2025-08-31' / name
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(f'---\ntitle: "{title}"\n---\n\n{body}\n', encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
+
+
+def search(output, term):
+    """按前端的方式查询：读取词项所在的分片，解码编号差，返回标题列表。"""
+    with open(output / 'terms' / f"{shard_of(term):02x}.json", encoding='utf-8') as f:
+        postings = json.load(f).get(term, [])
+    doc_ids, doc_id = [], 0
+    for delta in postings[::2]:
+        doc_id += delta
+        doc_ids.append(doc_id)
+    titles = []
+    for doc_id in doc_ids:
+        with open(output / 'docs' / f"{doc_id // search_index.SEARCH_DOCS_PER_CHUNK}.json", encoding='utf-8') as f:
+            titles.append(json.load(f)[str(doc_id)][0])
+    return sorted(titles)
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize("汉化硬盘版 11eyes") == ['汉化', '化硬', '硬盘', '盘版', '11eyes']
+    assert tokenize("Ｒｅｓｏｎａ 萌") == ['萌', 'resona']
+    assert tokenize("ゲーム") == ['ゲー', 'ーム']
+
+
+def test_parse_article_reads_front_matter_and_strips_links():
+    fields = parse_article(ARTICLE)
+    assert fields['title'] == "[Lass] 11eyes 汉化硬盘版"
+    assert fields['description'] == "萤之光汉化组的汉化版本"
+    assert fields['categories'] == ['游戏资源']
+    assert fields['tags'] == ['11eyes', '视觉小说']
+    assert 'example.com' not in fields['body'] and 'image_1' not in fields['body'] and 'magnet' not in fields['body']
+    assert '下载地址' in fields['body']
+
+
+def test_incremental_update_reindexes_only_changes(site):
+    articles, output = str(site / 'articles'), site / 'index'
+    write_article(site, 'a.md', "苹果汉化版")
+    write_article(site, 'b.md', "香蕉汉化版")
+    assert update_index(articles, str(output))[:2] == (2, 0)
+    assert search(output, '汉化') == ["苹果汉化版", "香蕉汉化版"]
+
+    # 没有变化时不重新索引，也不重写任何文件
+    assert update_index(articles, str(output)) == (0, 0, 0)
+
+    write_article(site, 'a.md', "葡萄汉化版", body="改写后的正文内容")
+    os.remove(site / 'articles' / '2025-08-31' / 'b.md')
+    indexed, removed, _ = update_index(articles, str(output))
+    assert (indexed, removed) == (1, 1)
+    assert search(output, '汉化') == ["葡萄汉化版"]
+    assert search(output, '苹果') == [] and search(output, '香蕉') == []
+
+
+def test_unreadable_changed_article_is_dropped_until_it_can_be_read(site, monkeypatch):
+    articles, output = str(site / 'articles'), site / 'index'
+    path = write_article(site, 'a.md', "苹果汉化版")
+    update_index(articles, str(output))
+    write_article(site, 'a.md', "葡萄汉化版", body="改写后的正文内容")
+
+    def broken_open(file, *args, **kwargs):
+        if os.path.abspath(file) == str(path): raise PermissionError(13, "Permission denied", file)
+        return builtins.open(file, *args, **kwargs)
+
+    monkeypatch.setattr(search_index, 'open', broken_open, raising=False)
+    assert update_index(articles, str(output))[0] == 0
+    # 旧的倒排记录已删除：文章信息也不能留在 docs/ 中
+    with open(output / 'docs' / '0.json', encoding='utf-8') as f:
+        assert json.load(f) == {}
+    monkeypatch.delattr(search_index, 'open')
+    assert update_index(articles, str(output))[0] == 1
+    assert search(output, '葡萄') == ["葡萄汉化版"]
+
+
+def test_new_output_folder_gets_a_full_build(site):
+    articles = str(site / 'articles')
+    write_article(site, 'a.md', "苹果汉化版")
+    write_article(site, 'b.md', "香蕉汉化版")
+    update_index(articles, str(site / 'index'))
+    # 倒排表在 progress.db 中共用；另一个输出目录没有 index.json，必须写出全部分片与文章信息
+    other = site / 'other-index'
+    update_index(articles, str(other))
+    with open(other / 'index.json', encoding='utf-8') as f:
+        files = json.load(f)['files']
+    assert len([name for name in files if name.startswith('terms/')]) == search_index.SEARCH_SHARDS
+    assert search(other, '汉化') == ["苹果汉化版", "香蕉汉化版"]